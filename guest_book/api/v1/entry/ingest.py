@@ -0,0 +1,258 @@
+"""
+Write-behind ingestion of entries.
+
+With ``ENTRY_INGEST_MODE = "buffered"`` a POST only validates the entry and appends it to a queue, then answers
+202. The ``flush_entries`` command drains the queue in batches, creating each batch with one user upsert and one
+bulk insert.
+
+Delivery is at-least-once: a message is acknowledged only after the transaction inserting its batch commits, so
+a flusher crashing in between leaves the batch pending and another flusher inserts it again. An entry the database
+keeps refusing is moved to a dead letter stream after ``ENTRY_INGEST_MAX_DELIVERIES`` deliveries, so it can't hold
+back the others forever.
+"""
+
+import itertools
+import json
+import logging
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+import redis
+from django.conf import settings
+from django.db import InterfaceError, OperationalError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from api.v1.entry.serializers import EntryCreateSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueueFull(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many entries are waiting to be saved, retry later."
+    default_code = "ingest_queue_full"
+
+    def __init__(self):
+        super().__init__()
+        # Rendered as the Retry-After header by DRF's exception handler.
+        self.wait = settings.ENTRY_INGEST_RETRY_AFTER
+
+
+class LocalEntryQueue:
+    """In-process stand-in for RedisStreamEntryQueue, for tests and single-process development. Not durable."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._ids = itertools.count(1)
+        self._messages = OrderedDict()
+        self._pending = OrderedDict()
+        self._deliveries = {}
+        self.dead_letters = OrderedDict()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._messages) + len(self._pending)
+
+    def push(self, item):
+        with self._condition:
+            message_id = str(next(self._ids))
+            self._messages[message_id] = item
+            self._condition.notify()
+            return message_id
+
+    def read(self, count, block_ms=0):
+        with self._condition:
+            if not self._messages and block_ms:
+                self._condition.wait(block_ms / 1000)
+
+            messages = []
+            while self._messages and len(messages) < count:
+                message_id, item = self._messages.popitem(last=False)
+                self._pending[message_id] = item
+                self._deliveries[message_id] = 1
+                messages.append((message_id, item))
+            return messages
+
+    def ack(self, message_ids):
+        with self._condition:
+            for message_id in message_ids:
+                self._pending.pop(message_id, None)
+                self._deliveries.pop(message_id, None)
+
+    def claim_pending(self, count, min_idle_ms=0):
+        with self._condition:
+            messages = list(itertools.islice(self._pending.items(), count))
+            for message_id, _ in messages:
+                self._deliveries[message_id] += 1
+            return messages
+
+    def deliveries(self, message_id):
+        with self._condition:
+            return self._deliveries.get(message_id, 0)
+
+    def dead_letter(self, messages):
+        with self._condition:
+            for message_id, item in messages:
+                self.dead_letters[message_id] = item
+                self._pending.pop(message_id, None)
+                self._deliveries.pop(message_id, None)
+
+    def clear(self):
+        with self._condition:
+            self._messages.clear()
+            self._pending.clear()
+            self._deliveries.clear()
+            self.dead_letters.clear()
+
+
+class RedisStreamEntryQueue:
+    """
+    Queue backed by a Redis stream read through a consumer group.
+
+    Read messages stay pending in the group until acknowledged, ``claim_pending`` takes over the messages of
+    flushers that died before acknowledging them. ``dead_letter`` moves messages to ``dead_letter_stream``, with
+    their original id in an ``id`` field.
+    """
+
+    group = "flushers"
+
+    def __init__(self, url, stream, dead_letter_stream):
+        self.redis = redis.Redis.from_url(url)
+        self.stream = stream
+        self.dead_letter_stream = dead_letter_stream
+        self.consumer = f"{socket.gethostname()}-{threading.get_ident()}"
+        self._group_created = False
+
+    def __len__(self):
+        # Acknowledged messages are deleted, so the stream length is the backlog.
+        return self.redis.xlen(self.stream)
+
+    def push(self, item):
+        return self.redis.xadd(self.stream, {"data": json.dumps(item)}).decode()
+
+    def read(self, count, block_ms=0):
+        self.ensure_group()
+        # BLOCK 0 waits forever, not waiting at all is no BLOCK.
+        response = self.redis.xreadgroup(
+            self.group, self.consumer, {self.stream: ">"}, count=count, block=block_ms or None
+        )
+        return [self.decode(message) for _, messages in response for message in messages]
+
+    def ack(self, message_ids):
+        pipeline = self.redis.pipeline()
+        pipeline.xack(self.stream, self.group, *message_ids)
+        pipeline.xdel(self.stream, *message_ids)
+        pipeline.execute()
+
+    def claim_pending(self, count, min_idle_ms=0):
+        self.ensure_group()
+        _, messages, *_ = self.redis.xautoclaim(
+            self.stream, self.group, self.consumer, min_idle_time=min_idle_ms, start_id="0-0", count=count
+        )
+        return [self.decode(message) for message in messages if message[1]]
+
+    def deliveries(self, message_id):
+        pending = self.redis.xpending_range(self.stream, self.group, min=message_id, max=message_id, count=1)
+        return pending[0]["times_delivered"] if pending else 0
+
+    def dead_letter(self, messages):
+        message_ids = [message_id for message_id, _ in messages]
+        pipeline = self.redis.pipeline()
+        for message_id, item in messages:
+            pipeline.xadd(self.dead_letter_stream, {"id": message_id, "data": json.dumps(item)})
+        pipeline.xack(self.stream, self.group, *message_ids)
+        pipeline.xdel(self.stream, *message_ids)
+        pipeline.execute()
+
+    def ensure_group(self):
+        if self._group_created:
+            return
+        try:
+            self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except redis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+        self._group_created = True
+
+    @staticmethod
+    def decode(message):
+        message_id, fields = message
+        return message_id.decode(), json.loads(fields[b"data"])
+
+
+local_queue = LocalEntryQueue()
+
+
+@lru_cache
+def _redis_queue(url, stream, dead_letter_stream):
+    return RedisStreamEntryQueue(url, stream, dead_letter_stream)
+
+
+def get_entry_queue():
+    if settings.ENTRY_INGEST_QUEUE == "local":
+        return local_queue
+    return _redis_queue(
+        settings.ENTRY_INGEST_REDIS_URL, settings.ENTRY_INGEST_STREAM, settings.ENTRY_INGEST_DEAD_LETTER_STREAM
+    )
+
+
+def is_buffered():
+    return settings.ENTRY_INGEST_MODE == "buffered"
+
+
+def enqueue(item):
+    """Appends a validated entry to the queue and returns its message id, refusing it once the backlog is full."""
+    queue = get_entry_queue()
+    if len(queue) >= settings.ENTRY_INGEST_MAX_BACKLOG:
+        raise IngestQueueFull()
+    return queue.push(item)
+
+
+def collect_batch(queue, size, max_latency):
+    """
+    Reads up to ``size`` messages, waiting at most ``max_latency`` seconds after the first one for the batch to fill.
+    """
+    messages = queue.read(size, block_ms=int(max_latency * 1000))
+    deadline = time.monotonic() + max_latency
+    while messages and len(messages) < size and (remaining := deadline - time.monotonic()) > 0:
+        messages += queue.read(size - len(messages), block_ms=max(int(remaining * 1000), 1))
+    return messages
+
+
+def flush_batch(queue, messages):
+    """
+    Inserts the entries of ``messages`` in a single transaction, then acknowledges them. Returns the number of
+    entries saved.
+
+    A batch failing for another reason than the database being unreachable is retried entry by entry, so a bad entry
+    doesn't take the others down with it. An entry failing on its own stays pending to be claimed again, until its
+    ``ENTRY_INGEST_MAX_DELIVERIES``-th delivery fails and it is moved to the dead letter stream.
+    """
+    if not messages:
+        return 0
+
+    message_ids, items = zip(*messages)
+    try:
+        with transaction.atomic():
+            entries = EntryCreateSerializer(many=True).create(list(items))
+    except (OperationalError, InterfaceError):
+        raise
+    except Exception:
+        if len(messages) > 1:
+            return sum(flush_batch(queue, [message]) for message in messages)
+
+        message_id = message_ids[0]
+        deliveries = queue.deliveries(message_id)
+        if deliveries < settings.ENTRY_INGEST_MAX_DELIVERIES:
+            logger.exception("Entry %s failed to save (delivery %d), left pending for a retry.", message_id, deliveries)
+        else:
+            queue.dead_letter(messages)
+            logger.exception("Entry %s failed to save %d times, moved to the dead letters.", message_id, deliveries)
+        return 0
+
+    queue.ack(message_ids)
+    return len(entries)
@@ -1,8 +1,50 @@
-from django.core.cache import cache
-from rest_framework.pagination import PageNumberPagination
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 import math
 
+from entry.models import EntryCounter
+from libs.cache import get_or_refresh
+from libs.db import estimate_row_count
+
+
+def get_entry_count(queryset):
+    """
+    Returns ``(count, exact)`` for the unfiltered entries ``queryset`` following ``ENTRY_COUNT_STRATEGY``.
+
+    ``exact`` is False when the count is a planner estimate.
+    """
+    strategy = settings.ENTRY_COUNT_STRATEGY
+    if strategy == "counter":
+        return EntryCounter.objects.using(queryset.db).total(), True
+
+    if strategy == "estimate":
+        estimate = estimate_row_count(queryset.model, using=queryset.db)
+        if estimate is not None and estimate >= settings.ENTRY_COUNT_ESTIMATE_THRESHOLD:
+            return estimate, False
+
+    # Tagged with the entry generation, which every entry write bumps. A single request runs the COUNT(*) of a new
+    # generation, the others meanwhile get the count of the previous one.
+    return get_or_refresh("entry_count", ("entry",), queryset.count), True
+
+
+class EntryPaginator(Paginator):
+    """Paginator taking its total from ``get_entry_count`` instead of running a COUNT(*) per request."""
+
+    @cached_property
+    def count(self):
+        count, self.count_exact = get_entry_count(self.object_list)
+        return count
+
 
 class EntryPagination(PageNumberPagination):
     """
@@ -10,27 +52,154 @@ class EntryPagination(PageNumberPagination):
 
     Note:
     PageNumberPagination may slow down on large datasets
-    due to OFFSET cost. CursorPagination is recommended
-    for better performance in production.
+    due to OFFSET cost. Pass ``?cursor=`` to switch to EntryCursorPagination,
+    which keeps deep pages as cheap as the first one.
+    The total is computed as configured by ``ENTRY_COUNT_STRATEGY``, see ``get_entry_count``.
     """
 
     page_size = 3
+    django_paginator_class = EntryPaginator
 
     def get_paginated_response(self, data):
-        cache_key = "entry_count"
-        total_count = cache.get(cache_key)
-        if total_count is None:
-            total_count = self.page.paginator.count
-            cache.set(cache_key, total_count, timeout=30)
-            # Note: Count is cached with a short TTL.
-            # Immediate consistency is not guaranteed; newly added entries may not appear in the count instantly.
+        paginator = self.page.paginator
+        return Response(
+            self.get_paginated_data(
+                paginator.count,
+                self.page.number,
+                self.get_next_link(),
+                self.get_previous_link(),
+                data,
+                count_exact=paginator.count_exact,
+            )
+        )
+
+    def get_paginated_data(self, count, page_number, next_link, previous_link, data, count_exact=True):
+        return {
+            "count": count,
+            "count_exact": count_exact,
+            "page_size": self.get_page_size(self.request),
+            "total_pages": math.ceil(count / self.get_page_size(self.request)),
+            "current_page_number": page_number,
+            "links": {
+                "next": next_link,
+                "previous": previous_link,
+            },
+            "entries": data,
+        }
+
+
+def encode_cursor(*values):
+    """Packs cursor values into an opaque, url-safe token."""
+    raw = "|".join(str(value) for value in values)
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, size):
+    """Unpacks a token made by ``encode_cursor``, raises NotFound when it is malformed."""
+    try:
+        raw = urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+    except (BinasciiError, UnicodeDecodeError, ValueError):
+        raise NotFound("Invalid cursor")
+
+    values = raw.split("|")
+    if len(values) != size:
+        raise NotFound("Invalid cursor")
+    return values
+
+
+class EntryCursorPagination(BasePagination):
+    """
+    Keyset pagination over ``(created_date, id)``, newest first.
+
+    Each page is fetched with ``WHERE (created_date, id) < (cursor) ORDER BY created_date DESC, id DESC LIMIT n``,
+    so the database seeks straight to the position instead of counting past OFFSET rows.
+    No total count is computed; the response only carries the links to the neighbouring pages.
+    Subclasses page over another key by overriding ``ordering``, ``parse_key`` and ``get_key``.
+    """
+
+    page_size = 3
+    cursor_query_param = "cursor"
+    ordering = ("-created_date", "-id")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_page_queryset(self, queryset, request):
+        """Returns the lazy queryset of the requested page, fetching one extra row to tell if another page follows."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_position(request.GET.get(self.cursor_query_param))
+
+        if self.reverse:
+            queryset = queryset.order_by(*[field.lstrip("-") for field in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.position is not None:
+            queryset = queryset.filter(self.get_seek_filter(*self.position))
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        """Keeps the rows of the page fetched with ``get_page_queryset`` and returns them in display order."""
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = self.position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+
+        return self.page
+
+    def get_seek_filter(self, key, pk):
+        # The redundant range bound on the key lets the planner use an index range scan,
+        # the OR part only breaks ties between rows sharing the same key.
+        field = self.ordering[0].lstrip("-")
+        if self.reverse:
+            return Q(**{f"{field}__gte": key}) & (Q(**{f"{field}__gt": key}) | Q(id__gt=pk))
+        return Q(**{f"{field}__lte": key}) & (Q(**{f"{field}__lt": key}) | Q(id__lt=pk))
+
+    def decode_position(self, token):
+        if not token:
+            return None, False
 
+        key, pk, reverse = decode_cursor(token, size=3)
+        key = self.parse_key(key)
+        if key is None or not pk.isdigit() or reverse not in ("0", "1"):
+            raise NotFound("Invalid cursor")
+        return (key, int(pk)), reverse == "1"
+
+    def parse_key(self, value):
+        """Parses the key encoded by ``get_key``, returns None when it is invalid."""
+        try:
+            return parse_datetime(value)
+        except ValueError:
+            return None
+
+    def get_key(self, entry):
+        return entry.created_date.isoformat()
+
+    def get_link(self, entry, reverse):
+        token = encode_cursor(self.get_key(entry), entry.pk, int(reverse))
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.get_link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
         return Response(
             {
-                "count": total_count,
-                "page_size": self.get_page_size(self.request),
-                "total_pages": math.ceil(total_count / self.get_page_size(self.request)),
-                "current_page_number": self.page.number,
+                "page_size": self.page_size,
                 "links": {
                     "next": self.get_next_link(),
                     "previous": self.get_previous_link(),
@@ -38,3 +207,20 @@ class EntryPagination(PageNumberPagination):
                 "entries": data,
             }
         )
+
+
+class EntrySearchPagination(EntryCursorPagination):
+    """Keyset pagination over ``(rank, id)``, most relevant first, for entries found by ``EntryQuerySet.search``."""
+
+    ordering = ("-rank", "-id")
+
+    def parse_key(self, value):
+        try:
+            rank = float(value)
+        except ValueError:
+            return None
+        return rank if math.isfinite(rank) else None
+
+    def get_key(self, entry):
+        # repr round-trips the float exactly, so the seek filter doesn't skip or repeat ties.
+        return repr(entry.rank)
@@ -1,25 +1,47 @@
+from django.db import transaction
 from rest_framework import serializers
 
 from entry.models import Entry
-from libs.normalize import turkish_str
+from entry.signals import entries_bulk_created
+from libs.normalize import normalize_many, turkish_str
+from libs.serializers import ValuesSerializerMixin
 from user.models import User
 
 
+class EntryListCreateSerializer(serializers.ListSerializer):
+    @transaction.atomic
+    def create(self, validated_data):
+        """Creates all entries with one user upsert and one bulk insert, whatever the number of entries."""
+        names = normalize_many(item["name"] for item in validated_data)
+        user_ids = User.objects.upsert_names(names)
+        entries = Entry.objects.bulk_create(
+            [
+                Entry(user_id=user_ids[name], subject=item["subject"], message=item["message"])
+                for name, item in zip(names, validated_data)
+            ]
+        )
+        # bulk_create skips Entry signals, the user summaries are refreshed once for the whole batch instead.
+        entries_bulk_created.send(sender=Entry, user_ids=set(user_ids.values()), count=len(entries))
+        return entries
+
+
 class EntryCreateSerializer(serializers.ModelSerializer):
     name = serializers.CharField(write_only=True)
 
     class Meta:
         model = Entry
         fields = ["name", "subject", "message"]
+        list_serializer_class = EntryListCreateSerializer
 
+    @transaction.atomic
     def create(self, validated_data):
+        # The user's entry summary is updated by entry.signals inside this same transaction.
         name = turkish_str(validated_data.pop("name")).title()
-        user, _ = User.objects.get_or_create(name=name)
-        entry = Entry.objects.create(user=user, **validated_data)
+        entry = Entry.objects.create(user_id=User.objects.resolve_id(name), **validated_data)
         return entry
 
 
-class EntryResponseSerializer(serializers.ModelSerializer):
+class EntryResponseSerializer(ValuesSerializerMixin, serializers.ModelSerializer):
     user = serializers.CharField(source="user.name")
 
     class Meta:
@@ -1,8 +1,18 @@
 from django.urls import path
 
-from api.v1.entry.views import EntryCreateListAPIView
+from api.v1.entry.views import (
+    EntryBatchCreateAPIView,
+    EntryCreateListAPIView,
+    EntryCreateListAsyncView,
+    EntrySearchAPIView,
+)
 
 app_name = "entry"
 
 
-urlpatterns = [path("", EntryCreateListAPIView.as_view(), name="entry-list-create")]
+urlpatterns = [
+    path("entries", EntryCreateListAPIView.as_view(), name="entry-list-create"),
+    path("entries/batch", EntryBatchCreateAPIView.as_view(), name="entry-batch-create"),
+    path("entries/search", EntrySearchAPIView.as_view(), name="entry-search"),
+    path("entries/async", EntryCreateListAsyncView.as_view(), name="entry-list-create-async"),
+]
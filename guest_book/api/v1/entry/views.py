@@ -1,15 +1,247 @@
-from rest_framework.generics import ListCreateAPIView
+import json
+import math
 
-from api.v1.entry.pagination import EntryPagination
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.generics import GenericAPIView, ListAPIView, ListCreateAPIView
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.v1.entry.ingest import enqueue, is_buffered
+from api.v1.entry.pagination import (
+    EntryCursorPagination,
+    EntryPagination,
+    EntrySearchPagination,
+    get_entry_count,
+)
 from api.v1.entry.serializers import EntryCreateSerializer, EntryResponseSerializer
 from entry.models import Entry
+from libs.cache import cache_page_by_generation, condition_by_generation
+from libs.normalize import search_terms
+from libs.renderers import FastJSONRenderer
+from libs.routers import read_from_replica
+
+
+def is_hot_page(request):
+    """Whether the request is for one of the first ``ENTRY_PAGE_CACHE_PAGES`` page-number pages, nothing else."""
+    page = request.GET.get(EntryPagination.page_query_param, "1")
+    if set(request.GET) - {EntryPagination.page_query_param} or not page.isdigit():
+        return False
+    return 1 <= int(page) <= settings.ENTRY_PAGE_CACHE_PAGES
 
 
+# Entries render their user's name, so user writes change the list too.
+@method_decorator(condition_by_generation(namespaces=("entry", "user")), name="get")
+@method_decorator(
+    cache_page_by_generation(
+        namespaces=("entry", "user"),
+        key_prefix="entries",
+        cache_if=is_hot_page,
+        compress=settings.ENTRY_PAGE_CACHE_GZIP,
+    ),
+    name="get",
+)
+@method_decorator(read_from_replica(namespaces=("entry", "user")), name="get")
 class EntryCreateListAPIView(ListCreateAPIView):
-    queryset = Entry.objects.select_related("user").order_by("-created_date")
+    queryset = Entry.objects.select_related("user").order_by("-created_date", "-id")
     pagination_class = EntryPagination
 
     def get_serializer_class(self):
         if self.request.method == "POST":
             return EntryCreateSerializer
         return EntryResponseSerializer
+
+    def list(self, request, *args, **kwargs):
+        if isinstance(self.paginator, EntryCursorPagination):
+            # Cursor links are built from the model instances of the page.
+            return super().list(request, *args, **kwargs)
+
+        # Serializer free read path, see ValuesSerializerMixin.
+        page = self.paginate_queryset(EntryResponseSerializer.values_queryset(self.get_queryset()))
+        return self.get_paginated_response(EntryResponseSerializer.from_values(page))
+
+    def create(self, request, *args, **kwargs):
+        if not is_buffered():
+            return super().create(request, *args, **kwargs)
+
+        # Write-behind: the entry is saved later by the flush_entries command, see api.v1.entry.ingest.
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        message_id = enqueue(serializer.validated_data)
+        return Response({"id": message_id, **serializer.data}, status=status.HTTP_202_ACCEPTED)
+
+    @property
+    def paginator(self):
+        """Uses keyset pagination when the request carries a ``cursor`` parameter, page numbers otherwise."""
+        if not hasattr(self, "_paginator"):
+            if EntryCursorPagination.cursor_query_param in self.request.query_params:
+                self._paginator = EntryCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class EntryBatchCreateAPIView(GenericAPIView):
+    """
+    Creates a list of entries in a fixed number of queries.
+
+    Items are validated one by one: valid items are created even if others fail, and the response holds a result
+    per item in request order. Responds 201 when all items are created, 207 when some failed and 400 when none
+    could be created.
+    """
+
+    serializer_class = EntryCreateSerializer
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of entries."]})
+        if len(request.data) > settings.ENTRY_BATCH_MAX_SIZE:
+            raise ValidationError(
+                {"non_field_errors": [f"A batch can hold at most {settings.ENTRY_BATCH_MAX_SIZE} entries."]}
+            )
+
+        item_serializers = [self.get_serializer(data=item) for item in request.data]
+        validated_data = [serializer.validated_data for serializer in item_serializers if serializer.is_valid()]
+        entries = self.get_serializer(many=True).create(validated_data) if validated_data else []
+
+        created = iter(entries)
+        results = []
+        for index, serializer in enumerate(item_serializers):
+            if serializer.errors:
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST, "errors": serializer.errors})
+            else:
+                entry_data = self.get_serializer(next(created)).data
+                results.append({"index": index, "status": status.HTTP_201_CREATED, "entry": entry_data})
+
+        if not entries and item_serializers:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(entries) < len(item_serializers):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(
+            {"created": len(entries), "failed": len(item_serializers) - len(entries), "results": results},
+            status=response_status,
+        )
+
+
+class EntrySearchAPIView(ListAPIView):
+    """
+    Full-text search over entry subjects and messages, ``?q=`` words are all required.
+
+    Matching is case and Turkish diacritic insensitive (see ``libs.normalize.fold_search``), results are ordered by
+    relevance and paged with a ``?cursor=`` token.
+    """
+
+    serializer_class = EntryResponseSerializer
+    pagination_class = EntrySearchPagination
+
+    def get_queryset(self):
+        terms = search_terms(self.request.query_params.get("q", ""))
+        if not terms:
+            raise ValidationError({"q": ["This query parameter must contain at least one word."]})
+        return Entry.objects.select_related("user").search(terms)
+
+
+class EntryCreateListAsyncView(View):
+    """
+    Async counterpart of EntryCreateListAPIView with the same request and response formats, meant for ASGI workers.
+
+    Reads go through the async ORM and cache API, so a worker keeps serving other requests while one waits on
+    the database or Redis. Creation runs EntryCreateSerializer in a thread, as its transaction can't span awaits.
+    """
+
+    queryset = EntryCreateListAPIView.queryset
+    renderer = FastJSONRenderer()
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Like DRF's APIView, the API does not rely on session authentication and skips CSRF checks.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def get(self, request, *args, **kwargs):
+        try:
+            if EntryCursorPagination.cursor_query_param in request.GET:
+                data = await self.get_cursor_page(request)
+            else:
+                data = await self.get_numbered_page(request)
+        except NotFound as exc:
+            return self.render({"detail": exc.detail}, status_code=exc.status_code)
+        return self.render(data)
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except ValueError as exc:
+            return self.render({"detail": f"JSON parse error - {exc}"}, status_code=status.HTTP_400_BAD_REQUEST)
+
+        serializer = EntryCreateSerializer(data=payload)
+        if not serializer.is_valid():
+            return self.render(serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+
+        if is_buffered():
+            try:
+                message_id = await sync_to_async(enqueue)(serializer.validated_data)
+            except APIException as exc:
+                response = self.render({"detail": exc.detail}, status_code=exc.status_code)
+                response["Retry-After"] = str(exc.wait)
+                return response
+            return self.render({"id": message_id, **serializer.data}, status_code=status.HTTP_202_ACCEPTED)
+
+        await sync_to_async(serializer.save)()
+        return self.render(serializer.data, status_code=status.HTTP_201_CREATED)
+
+    async def get_cursor_page(self, request):
+        paginator = EntryCursorPagination()
+        page = paginator.set_page([entry async for entry in paginator.get_page_queryset(self.queryset, request)])
+        return paginator.get_paginated_response(EntryResponseSerializer(page, many=True).data).data
+
+    async def get_numbered_page(self, request):
+        paginator = EntryPagination()
+        paginator.request = request
+        page_size = paginator.page_size
+
+        count, count_exact = await self.get_count()
+        num_pages = max(math.ceil(count / page_size), 1)
+        page_number = request.GET.get(paginator.page_query_param) or 1
+        if page_number in paginator.last_page_strings:
+            page_number = num_pages
+        try:
+            page_number = int(page_number)
+        except (TypeError, ValueError):
+            raise NotFound("Invalid page.")
+        if not 1 <= page_number <= num_pages:
+            raise NotFound("Invalid page.")
+
+        offset = (page_number - 1) * page_size
+        rows = EntryResponseSerializer.values_queryset(self.queryset)[offset : offset + page_size]
+        entries = EntryResponseSerializer.from_values([row async for row in rows])
+
+        url = request.build_absolute_uri()
+        next_link = replace_query_param(url, paginator.page_query_param, page_number + 1)
+        if page_number == 2:
+            previous_link = remove_query_param(url, paginator.page_query_param)
+        else:
+            previous_link = replace_query_param(url, paginator.page_query_param, page_number - 1)
+
+        return paginator.get_paginated_data(
+            count,
+            page_number,
+            next_link if page_number < num_pages else None,
+            previous_link if page_number > 1 else None,
+            entries,
+            count_exact=count_exact,
+        )
+
+    async def get_count(self):
+        # Shares the cached count and its refresh lock with EntryPagination.
+        return await sync_to_async(get_entry_count)(self.queryset)
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        return HttpResponse(self.renderer.render(data), status=status_code, content_type="application/json")
@@ -4,6 +4,6 @@ app_name = "v1"
 
 
 urlpatterns = [
-    path("entries", include("api.v1.entry.urls")),
-    path("users", include("api.v1.user.urls")),
+    path("", include("api.v1.entry.urls")),
+    path("", include("api.v1.user.urls")),
 ]
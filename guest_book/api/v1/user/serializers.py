@@ -1,7 +1,19 @@
 from rest_framework import serializers
 
+from libs.serializers import ValuesSerializerMixin
 
-class UserSerializer(serializers.Serializer):
+
+class UserSerializer(ValuesSerializerMixin, serializers.Serializer):
     username = serializers.CharField(source="name")
     total_entries = serializers.IntegerField()
     last_entry = serializers.CharField()
+
+
+class UserEntryFilterSerializer(serializers.Serializer):
+    since = serializers.DateTimeField(required=False, input_formats=["iso-8601", "%Y-%m-%d"])
+    until = serializers.DateTimeField(required=False, input_formats=["iso-8601", "%Y-%m-%d"])
+
+    def validate(self, attrs):
+        if "since" in attrs and "until" in attrs and attrs["since"] >= attrs["until"]:
+            raise serializers.ValidationError({"until": ["Must be later than since."]})
+        return attrs
@@ -1,7 +1,11 @@
 from django.urls import path
 
-from api.v1.user.views import UserListAPIView
+from api.v1.user.views import UserEntryListAPIView, UserListAPIView, UserListAsyncView
 
 app_name = "user"
 
-urlpatterns = [path("", UserListAPIView.as_view(), name="list-users")]
+urlpatterns = [
+    path("users", UserListAPIView.as_view(), name="list-users"),
+    path("users/async", UserListAsyncView.as_view(), name="list-users-async"),
+    path("users/<str:name>/entries", UserEntryListAPIView.as_view(), name="list-user-entries"),
+]
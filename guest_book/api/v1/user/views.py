@@ -1,24 +1,135 @@
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from django.views import View
 from rest_framework import status
+from rest_framework.exceptions import NotFound
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 
-from api.v1.user.serializers import UserSerializer
+from api.v1.entry.pagination import EntryCursorPagination
+from api.v1.entry.serializers import EntryResponseSerializer
+from api.v1.user.serializers import UserEntryFilterSerializer, UserSerializer
+from entry.models import Entry
+from libs.cache import cache_page_by_generation, condition_by_generation, generation_key
+from libs.normalize import turkish_str
+from libs.renderers import FastJSONRenderer
+from libs.routers import read_from_replica
 from user.models import User
 
 
-@method_decorator(cache_page(30), name="get")
+@method_decorator(condition_by_generation(namespaces=("user", "entry")), name="get")
+@method_decorator(
+    cache_page_by_generation(namespaces=("user", "entry"), key_prefix="users", single_flight=True), name="get"
+)
+@method_decorator(read_from_replica(namespaces=("user", "entry")), name="get")
 class UserListAPIView(ListAPIView):
     """
-    WARNING: Caching is applied for performance, under the assumption that the data does not require
-    real-time updates. If immediate data freshness is a requirement, pagination should be implemented.
+    The rendered list is cached until a user or entry write bumps its generation. A single request then renders it
+    again while the others get the previous list, so a write doesn't send every concurrent request to the aggregate.
+    Clients sending back the ETag or Last-Modified validators get a 304 until then.
+
+    ``?stream=true`` streams the same document chunk by chunk, keeping memory flat and the first byte early
+    regardless of the number of users.
     """
 
     serializer_class = UserSerializer
-    queryset = User.objects.with_entry_summary()
+    # Ordered as the stream reads them, so both documents are the same.
+    queryset = User.objects.with_entry_summary().order_by("pk")
+    stream_query_param = "stream"
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response({"users": serializer.data}, status=status.HTTP_200_OK)
+        if request.query_params.get(self.stream_query_param) in ("1", "true"):
+            return StreamingHttpResponse(self.stream(queryset), content_type="application/json")
+
+        # Serializer free read path, see ValuesSerializerMixin.
+        return Response({"users": self.serializer_class.serialize_values(queryset)}, status=status.HTTP_200_OK)
+
+    def stream(self, queryset):
+        """
+        Yields the ``{"users": [...]}`` document, reading users through a server-side cursor in chunks.
+
+        Each rendered chunk is cached along with the last pk it holds, so later streams replay chunks from the cache
+        and only go back to the database for the range of a chunk that has been evicted.
+        """
+        cache_key = generation_key("users:stream", "user", "entry")
+        boundaries = cache.get(cache_key)
+
+        rows = self.serializer_class.values_queryset(queryset, "pk")
+        yield b'{"users":['
+        if boundaries is None:
+            yield from self.stream_from_database(rows, cache_key)
+        else:
+            yield from self.stream_from_cache(rows, cache_key, boundaries)
+        yield b"]}"
+
+    def stream_from_database(self, rows, cache_key):
+        chunk_size = settings.USER_STREAM_CHUNK_SIZE
+        boundaries = []
+        rows = rows.iterator(chunk_size=chunk_size)
+
+        while chunk := list(islice(rows, chunk_size)):
+            content = self.render_chunk(chunk)
+            cache.set(f"{cache_key}:{len(boundaries)}", content, settings.CACHE_GENERATION_TIMEOUT)
+            yield content if not boundaries else b"," + content
+            boundaries.append(chunk[-1][0])
+
+        cache.set(cache_key, boundaries, settings.CACHE_GENERATION_TIMEOUT)
+
+    def stream_from_cache(self, rows, cache_key, boundaries):
+        lower = None
+        for index, upper in enumerate(boundaries):
+            content = cache.get(f"{cache_key}:{index}")
+            if content is None:
+                chunk = rows.filter(pk__lte=upper) if lower is None else rows.filter(pk__gt=lower, pk__lte=upper)
+                content = self.render_chunk(chunk)
+                cache.set(f"{cache_key}:{index}", content, settings.CACHE_GENERATION_TIMEOUT)
+            yield content if index == 0 else b"," + content
+            lower = upper
+
+    def render_chunk(self, rows):
+        # Rendered as a list and unwrapped, so chunks are byte-identical to the rows of the non-streamed response.
+        return FastJSONRenderer().render(self.serializer_class.from_values(row[1:] for row in rows))[1:-1]
+
+
+class UserEntryListAPIView(ListAPIView):
+    """
+    Entries of a single guest, newest first, paged with a ``?cursor=`` token.
+
+    ``since`` (inclusive) and ``until`` (exclusive) take a date or an ISO 8601 datetime. Together with the cursor
+    they are all bounds on ``created_date`` within the user's range of ``idx_entry_user_date_desc``.
+    """
+
+    serializer_class = EntryResponseSerializer
+    pagination_class = EntryCursorPagination
+
+    def get_queryset(self):
+        filters = UserEntryFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+
+        # Names are stored Turkish title-cased, as entries are created.
+        user_id = User.objects.find_id(turkish_str(self.kwargs["name"]).title())
+        if user_id is None:
+            raise NotFound("User not found.")
+
+        queryset = Entry.objects.select_related("user").filter(user_id=user_id)
+        if "since" in filters.validated_data:
+            queryset = queryset.filter(created_date__gte=filters.validated_data["since"])
+        if "until" in filters.validated_data:
+            queryset = queryset.filter(created_date__lt=filters.validated_data["until"])
+        return queryset
+
+
+@method_decorator(cache_page_by_generation(namespaces=("user", "entry"), key_prefix="users"), name="get")
+class UserListAsyncView(View):
+    """Async counterpart of UserListAPIView, meant for ASGI workers, reading users through the async ORM."""
+
+    async def get(self, request, *args, **kwargs):
+        users = User.objects.with_entry_summary().order_by("pk")
+        rows = [row async for row in UserSerializer.values_queryset(users)]
+        content = FastJSONRenderer().render({"users": UserSerializer.from_values(rows)})
+        return HttpResponse(content, content_type="application/json")
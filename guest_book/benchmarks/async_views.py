@@ -0,0 +1,92 @@
+"""
+Compares the sync and async entry/user list views under concurrent load.
+
+Start the application under an ASGI worker, so both variants are served by the same processes::
+
+    GUNICORN_APP=guest_book.asgi:application GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker docker compose up -d
+
+then, from the ``guest_book`` directory::
+
+    python -m benchmarks.async_views --base-url http://localhost:8000 --concurrency 200 --requests 5000
+
+Only the standard library is used, requests are sent over keep-alive HTTP/1.1 connections.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+SCENARIOS = [
+    ("entries (sync)", "/api/v1/entries"),
+    ("entries (async)", "/api/v1/entries/async"),
+    ("users (sync)", "/api/v1/users"),
+    ("users (async)", "/api/v1/users/async"),
+]
+
+
+async def fetch(reader, writer, host, path):
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n\r\n".encode())
+    await writer.drain()
+
+    status_line = await reader.readline()
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def worker(base_url, path, queue, latencies, errors):
+    url = urlsplit(base_url)
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    try:
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            started = time.perf_counter()
+            status = await fetch(reader, writer, url.netloc, path)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_scenario(base_url, path, concurrency, requests):
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(base_url, path, queue, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, errors
+
+
+def percentile(values, percent):
+    return statistics.quantiles(values, n=100, method="inclusive")[percent - 1] if len(values) > 1 else values[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=200, help="Number of concurrent connections")
+    parser.add_argument("--requests", type=int, default=5000, help="Number of requests per scenario")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<18}{'req/s':>10}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'errors':>8}")
+    for label, path in SCENARIOS:
+        elapsed, latencies, errors = asyncio.run(run_scenario(args.base_url, path, args.concurrency, args.requests))
+        p50, p95, p99 = (percentile(latencies, percent) * 1000 for percent in (50, 95, 99))
+        print(f"{label:<18}{len(latencies) / elapsed:>10.0f}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{len(errors):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Micro-benchmark of ``libs.normalize`` against the previous ``str.replace`` based implementation.
+
+Usage (from the ``guest_book`` directory)::
+
+    python -m benchmarks.normalize --names 10000 --repeat 5
+"""
+
+import argparse
+import random
+import timeit
+
+from libs.normalize import normalize_many, turkish_str
+
+
+class legacy_turkish_str(str):  # noqa
+    """The implementation replaced by the precomputed replace pairs and the memoized title(), kept as the baseline."""
+
+    CHARMAP = turkish_str.CHARMAP
+
+    def lower(self):
+        for key, value in self.CHARMAP.get("to_lower").items():
+            self = self.replace(key, value)
+
+        return self.lower()
+
+    def upper(self):
+        for key, value in self.CHARMAP.get("to_upper").items():
+            self = self.replace(key, value)
+
+        return self.upper()
+
+    def capitalize(self):
+        first, rest = self[0], self[1:]
+        return legacy_turkish_str(first).upper() + legacy_turkish_str(rest).lower()
+
+    def title(self):
+        return " ".join(map(lambda x: legacy_turkish_str(x).capitalize(), self.split()))
+
+
+WORDS = ["ılık", "irmak", "IŞIK", "İSTANBUL", "çiğdem", "Şule", "ömer", "ıİiI", "john", "DOE", "ayşe", "Gül"]
+
+
+def make_names(count, unique, seed):
+    rng = random.Random(seed)
+    pool = [" ".join(rng.choices(WORDS, k=rng.randint(2, 3))) for _ in range(unique)]
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=10000, help="Number of names normalized per run")
+    parser.add_argument("--unique", type=int, default=1000, help="Number of distinct names among them")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = make_names(args.names, args.unique, args.seed)
+    assert [legacy_turkish_str(name).title() for name in names] == normalize_many(names)
+
+    scenarios = [
+        ("legacy title()", "legacy title()", lambda: [legacy_turkish_str(name).title() for name in names]),
+        ("title()", "legacy title()", lambda: [turkish_str(name).title() for name in names]),
+        ("normalize_many()", "legacy title()", lambda: normalize_many(names)),
+        ("legacy lower()", "legacy lower()", lambda: [legacy_turkish_str(name).lower() for name in names]),
+        ("lower()", "legacy lower()", lambda: [turkish_str(name).lower() for name in names]),
+        ("legacy upper()", "legacy upper()", lambda: [legacy_turkish_str(name).upper() for name in names]),
+        ("upper()", "legacy upper()", lambda: [turkish_str(name).upper() for name in names]),
+    ]
+    timings = {}
+    print(f"{'scenario':<20}{'best (ms)':>12}{'ns/name':>12}{'speedup':>10}")
+    for label, baseline, func in scenarios:
+        timings[label] = best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        speedup = timings[baseline] / best
+        print(f"{label:<20}{best * 1000:>12.2f}{best / len(names) * 1e9:>12.0f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
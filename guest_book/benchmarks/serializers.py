@@ -0,0 +1,83 @@
+"""
+Per-row CPU cost of the list endpoints' serializer path against the ``values_list`` fast path.
+
+Rows are built in memory as the database driver returns them, so only the Python side is measured: model
+instantiation, serialization and JSON rendering. No database is needed.
+
+Usage (from the ``guest_book`` directory)::
+
+    python -m benchmarks.serializers --rows 100000 --repeat 5
+"""
+
+import argparse
+import os
+import random
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "guest_book.settings")
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from api.v1.entry.serializers import EntryResponseSerializer  # noqa: E402
+from api.v1.user.serializers import UserSerializer  # noqa: E402
+from libs.renderers import FastJSONRenderer  # noqa: E402
+from user.models import User  # noqa: E402
+
+WORDS = ["ılık", "ırmak", "çay", "simit", "güzel", "teşekkürler", "hello", "great", "place", "visit"]
+
+
+def make_rows(count, seed):
+    rng = random.Random(seed)
+    return [
+        (
+            pk,
+            f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {pk}",
+            rng.randint(0, 50),
+            " ".join(rng.choices(WORDS, k=6)) + " | " + " ".join(rng.choices(WORDS, k=30)),
+        )
+        for pk in range(1, count + 1)
+    ]
+
+
+def serializer_path(rows):
+    # What UserListAPIView did: model instances, UserSerializer, DRF's JSONRenderer.
+    users = [User.from_db("default", ["id", "name", "total_entries", "last_entry"], row) for row in rows]
+    return JSONRenderer().render({"users": UserSerializer(users, many=True).data})
+
+
+def fast_path(rows):
+    return FastJSONRenderer().render({"users": UserSerializer.from_values(row[1:] for row in rows)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Number of users rendered per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs, the best one is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.seed)
+    assert serializer_path(rows) == fast_path(rows)
+    # Entries go through the same mixin, check that the field mapping holds there too.
+    assert EntryResponseSerializer.get_values_fields() == (
+        ("user", "subject", "message"),
+        ("user__name", "subject", "message"),
+    )
+
+    scenarios = [
+        ("serializers", lambda: serializer_path(rows)),
+        ("values fast path", lambda: fast_path(rows)),
+    ]
+    timings = {}
+    print(f"{'scenario':<20}{'best (ms)':>12}{'us/row':>10}{'speedup':>10}")
+    for label, func in scenarios:
+        timings[label] = best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        speedup = timings["serializers"] / best
+        print(f"{label:<20}{best * 1000:>12.2f}{best / len(rows) * 1e6:>10.2f}{speedup:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
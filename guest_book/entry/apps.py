@@ -6,4 +6,4 @@ class EntryConfig(AppConfig):
     name = "entry"
 
     def ready(self):
-        pass
+        from entry import signals  # noqa
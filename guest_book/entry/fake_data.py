@@ -0,0 +1,41 @@
+"""
+Fake entry rows for the ``generate_fake_data`` command.
+
+Kept free of Django imports so process pool workers can load it whatever their start method.
+"""
+
+import random
+
+from faker import Faker
+
+from libs.normalize import fold_search
+
+_fake = None
+_user_ids = None
+_entries = None
+_chunk_size = None
+_seed = None
+
+
+def init_worker(user_ids, entries, chunk_size, seed):
+    global _fake, _user_ids, _entries, _chunk_size, _seed
+    # Building a Faker loads every provider, so each worker builds one and reseeds it per chunk.
+    _fake = Faker()
+    _user_ids, _entries, _chunk_size, _seed = user_ids, entries, chunk_size, seed
+
+
+def generate_chunk(chunk):
+    """
+    Returns the rows ``(user_id, subject, message, search_text)`` of chunk number ``chunk``.
+
+    With a seed the rows only depend on it and the chunk number, not on the worker or the number of workers.
+    """
+    rng = random.Random(None if _seed is None else f"{_seed}:{chunk}")
+    _fake.seed_instance(rng.getrandbits(64))
+
+    rows = []
+    for _ in range(min(_chunk_size, _entries - chunk * _chunk_size)):
+        subject = _fake.sentence(nb_words=6)
+        message = _fake.paragraph(nb_sentences=5)
+        rows.append((rng.choice(_user_ids), subject, message, fold_search(f"{subject}\n{message}")))
+    return rows
@@ -0,0 +1,203 @@
+import json
+import math
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from api.v1.entry.pagination import EntryPagination, encode_cursor
+from entry.models import Entry
+from entry.signals import entries_bulk_created
+from libs.cache import bump_generation
+from user.models import User
+
+CACHE_NAMESPACES = ("entry", "user")
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def bump_generations():
+    for namespace in CACHE_NAMESPACES:
+        bump_generation(namespace)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a dataset and time the API through the test client: latency percentiles, queries per request and "
+        "rows/s. Runs in a transaction rolled back at the end, unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users",
+            type=int,
+            nargs="+",
+            default=[1000],
+            help="User counts the users summary is timed at, e.g. --users 1000 100000",
+        )
+        parser.add_argument("--entries", type=int, default=10000, help="Number of entries to seed")
+        parser.add_argument("--requests", type=int, default=100, help="Number of timed requests per scenario")
+        parser.add_argument("--batch-size", type=int, default=100, help="Entries per bulk POST")
+        parser.add_argument(
+            "--json", dest="json_path", help="Also write the results as JSON to this file, - for stdout"
+        )
+        parser.add_argument("--keep", action="store_true", help="Keep the seeded data instead of rolling it back")
+
+    def handle(self, *args, **options):
+        user_counts = sorted(options["users"])
+        if user_counts[0] < 1:
+            raise CommandError("--users must be positive.")
+
+        self.client = Client()
+        self.requests = options["requests"]
+        self.results = []
+
+        # Writes must hit the database, and the test client's host must be accepted.
+        with override_settings(ALLOWED_HOSTS=["*"], ENTRY_INGEST_MODE="sync"), transaction.atomic():
+            self.seed_users(user_counts[0])
+            self.seed_entries(options["entries"])
+            self.bench_entries(options["entries"])
+            for count in user_counts:
+                self.seed_users(count)
+                self.bench_users(User.objects.count())
+            self.bench_writes(options["batch_size"])
+            if not options["keep"]:
+                transaction.set_rollback(True)
+
+        # Responses cached during the run may show rolled back rows.
+        bump_generations()
+
+        self.write_table()
+        if options["json_path"]:
+            self.write_json(options, user_counts)
+
+    def seed_users(self, count):
+        # Names already taken are skipped.
+        User.objects.bulk_create(
+            [User(name=f"Bench User {i}") for i in range(count)], batch_size=1000, ignore_conflicts=True
+        )
+
+    def seed_entries(self, count):
+        users = User.objects.filter(name__startswith="Bench User ")
+        user_ids = list(users.values_list("pk", flat=True))
+        Entry.objects.bulk_create(
+            [
+                Entry(user_id=user_ids[i % len(user_ids)], subject=f"Subject {i}", message=f"Benchmark message {i}")
+                for i in range(count)
+            ],
+            batch_size=1000,
+        )
+        entries_bulk_created.send(sender=Entry, user_ids=users.values("pk"), count=count)
+
+    def bench_entries(self, entries_count):
+        url = reverse("api:v1:entry:entry-list-create")
+        last_page = max(math.ceil(entries_count / EntryPagination.page_size), 1)
+
+        def entries(response):
+            return len(response.json()["entries"])
+
+        self.measure("entries page 1 (cold cache)", lambda i: self.client.get(url), entries, before=bump_generations)
+        self.measure("entries page 1 (warm cache)", lambda i: self.client.get(url), entries)
+        self.measure(f"entries page {last_page}", lambda i: self.client.get(url, {"page": last_page}), entries)
+
+        # The cursor of the second oldest page, so the request reads the oldest one.
+        page_size = EntryPagination.page_size
+        for entry in Entry.objects.order_by("created_date", "id")[page_size : page_size + 1]:
+            cursor = encode_cursor(entry.created_date.isoformat(), entry.pk, 0)
+            self.measure("entries last cursor page", lambda i: self.client.get(url, {"cursor": cursor}), entries)
+
+    def bench_writes(self, batch_size):
+        url = reverse("api:v1:entry:entry-list-create")
+        batch_url = reverse("api:v1:entry:entry-batch-create")
+
+        def post(i):
+            data = {"name": f"Bench User {i}", "subject": "Bench", "message": "Single POST"}
+            return self.client.post(url, data, content_type="application/json")
+
+        def post_batch(i):
+            data = [
+                {"name": f"Bench User {j}", "subject": "Bench", "message": "Bulk POST"}
+                for j in range(i * batch_size, (i + 1) * batch_size)
+            ]
+            return self.client.post(batch_url, data, content_type="application/json")
+
+        self.measure("POST entry", post, lambda response: 1)
+        self.measure(f"POST batch of {batch_size}", post_batch, lambda response: response.json()["created"])
+
+    def bench_users(self, count):
+        url = reverse("api:v1:user:list-users")
+
+        def users(response):
+            return len(response.json()["users"])
+
+        self.measure(f"users {count} (cold cache)", lambda i: self.client.get(url), users, before=bump_generations)
+        self.measure(f"users {count} (warm cache)", lambda i: self.client.get(url), users)
+
+    def measure(self, label, send, count_rows, before=None):
+        """Times ``send(i)`` over the configured number of requests, warm scenarios after one untimed request."""
+        if before is None:
+            send(-1)
+
+        timings, queries, rows = [], [], 0
+        for i in range(self.requests):
+            if before is not None:
+                before()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = send(i)
+                timings.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                raise CommandError(f"{label}: HTTP {response.status_code} {response.content[:200]!r}")
+            queries.append(len(captured))
+            rows += count_rows(response)
+
+        self.results.append(
+            {
+                "scenario": label,
+                "requests": len(timings),
+                "p50_ms": percentile(timings, 50) * 1000,
+                "p95_ms": percentile(timings, 95) * 1000,
+                "p99_ms": percentile(timings, 99) * 1000,
+                "queries_per_request": sum(queries) / len(queries),
+                "rows_per_second": rows / sum(timings),
+            }
+        )
+
+    def write_table(self):
+        header = f"{'scenario':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'rows/s':>12}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for result in self.results:
+            self.stdout.write(
+                f"{result['scenario']:<32}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}"
+                f"{result['queries_per_request']:>9.1f}{result['rows_per_second']:>12.0f}"
+            )
+
+    def write_json(self, options, user_counts):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        report = {
+            "commit": commit,
+            "database": connection.vendor,
+            "dataset": {"users": user_counts, "entries": options["entries"], "batch_size": options["batch_size"]},
+            "results": self.results,
+        }
+        content = json.dumps(report, indent=2)
+        if options["json_path"] == "-":
+            self.stdout.write(content)
+        else:
+            with open(options["json_path"], "w") as file:
+                file.write(content + "\n")
@@ -0,0 +1,69 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand
+
+from entry.models import Entry
+from entry.transfer import (
+    FORMATS,
+    chunked,
+    detect_format,
+    encode_header,
+    encode_records,
+    is_gzip,
+    load_checkpoint,
+    save_checkpoint,
+)
+from libs.progress import Progress
+
+
+class Command(BaseCommand):
+    help = (
+        "Export all entries, oldest first, to a JSON lines or CSV file (gzipped when the path ends with .gz). "
+        "Entries are streamed from a server-side cursor, memory use does not grow with the number of entries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to write, e.g. entries.jsonl.gz")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the format named by the file extension")
+        parser.add_argument("--chunk", type=int, default=5000, help="Entries read and written at a time")
+        parser.add_argument("--resume", action="store_true", help="Continue an interrupted export from its checkpoint")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        format = detect_format(path, options["format"])
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        checkpoint = {"last_id": 0, "offset": 0, "rows": 0}
+        if options["resume"]:
+            checkpoint = load_checkpoint(checkpoint_path)
+
+        compress = gzip.compress if is_gzip(path) else bytes
+        entries = (
+            Entry.objects.filter(id__gt=checkpoint["last_id"])
+            .order_by("id")
+            .values_list("id", "user__name", "subject", "message", "created_date")
+            .iterator(chunk_size=options["chunk"])
+        )
+        progress = Progress(self.stdout, "entries")
+        progress.done = checkpoint["rows"]
+
+        with open(path, "r+b" if options["resume"] else "wb") as file:
+            # Drops whatever was written after the last checkpoint.
+            file.truncate(checkpoint["offset"])
+            file.seek(checkpoint["offset"])
+            if not checkpoint["offset"] and (header := encode_header(format)):
+                file.write(compress(header))
+
+            for chunk in chunked(entries, options["chunk"]):
+                # Each chunk is a complete gzip member, the file stays readable when cut after any of them.
+                file.write(compress(encode_records([row[1:] for row in chunk], format)))
+                file.flush()
+                os.fsync(file.fileno())
+                progress.update(len(chunk))
+                checkpoint = {"last_id": chunk[-1][0], "offset": file.tell(), "rows": progress.done}
+                save_checkpoint(checkpoint_path, checkpoint)
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f"{progress.summary()} exported to {path}."))
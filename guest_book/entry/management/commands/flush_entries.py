@@ -0,0 +1,63 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.v1.entry.ingest import collect_batch, flush_batch, get_entry_queue
+
+
+class Command(BaseCommand):
+    help = "Save the entries queued by buffered ingestion (ENTRY_INGEST_MODE=buffered) in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch", type=int, default=settings.ENTRY_INGEST_FLUSH_SIZE, help="Maximum number of entries per batch"
+        )
+        parser.add_argument(
+            "--max-latency",
+            type=int,
+            default=settings.ENTRY_INGEST_MAX_LATENCY_MS,
+            help="Milliseconds to wait for a batch to fill before flushing it",
+        )
+        parser.add_argument(
+            "--claim-idle",
+            type=int,
+            default=60000,
+            help="Milliseconds after which entries read but not saved by another flusher are taken over",
+        )
+        parser.add_argument("--once", action="store_true", help="Exit once the queue is drained")
+
+    def handle(self, *args, **options):
+        queue = get_entry_queue()
+        batch_size = options["batch"]
+        max_latency = options["max_latency"] / 1000
+        claim_idle = options["claim_idle"]
+        flushed = 0
+        started = time.monotonic()
+        next_claim = started
+
+        while True:
+            # Entries left unacknowledged by a flusher that died are taken over, at start and then every claim_idle.
+            if time.monotonic() >= next_claim:
+                while messages := queue.claim_pending(batch_size, min_idle_ms=claim_idle):
+                    saved = flush_batch(queue, messages)
+                    flushed += saved
+                    if saved < len(messages):
+                        # The failed entries are still pending, they wait for the next claim.
+                        break
+                next_claim = time.monotonic() + claim_idle / 1000
+
+            messages = collect_batch(queue, batch_size, max_latency)
+            if not messages:
+                if options["once"]:
+                    break
+                if not max_latency:
+                    # Reads don't wait for entries then, don't poll an empty queue in a busy loop.
+                    time.sleep(0.1)
+                continue
+
+            flushed += flush_batch(queue, messages)
+            rate = flushed / max(time.monotonic() - started, 1e-9)
+            self.stdout.write(f"{len(messages)} entries saved ({flushed} total, {rate:.0f} entries/s).")
+
+        self.stdout.write(self.style.SUCCESS(f"{flushed} entries saved."))
@@ -1,22 +1,44 @@
-from django.core.management.base import BaseCommand
+import math
+import multiprocessing
+import os
+from array import array
 
-from libs.normalize import turkish_str
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from entry.fake_data import generate_chunk, init_worker
+from entry.signals import entries_bulk_created
+from libs.db import copy_rows
+from libs.normalize import normalize_many
+from libs.progress import Progress
 from user.models import User
 from entry.models import Entry
 from faker import Faker
-import random
 
 
 class Command(BaseCommand):
-    help = "Generate fake Users and Entries with bulk_create"
+    help = (
+        "Generate fake Users and Entries. Entry text is generated by a process pool and loaded with COPY on "
+        "PostgreSQL, bulk_create elsewhere."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("--users", type=int, default=1000, help="Number of users to create")
         parser.add_argument("--entries", type=int, default=10000, help="Number of entries to create")
-        parser.add_argument("--batch", type=int, default=1000, help="Batch size for bulk_create")
+        parser.add_argument("--batch", type=int, default=1000, help="Entries generated and inserted per chunk")
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count(), help="Processes generating entries, 1 to generate inline"
+        )
+        parser.add_argument("--seed", type=int, help="Seed making the generated data reproducible")
 
     def handle(self, *args, **options):
+        if options["batch"] < 1 or options["workers"] < 1:
+            raise CommandError("--batch and --workers must be positive.")
+
         fake = Faker()
+        if options["seed"] is not None:
+            fake.seed_instance(options["seed"])
 
         users_count = options["users"]
         entries_count = options["entries"]
@@ -24,28 +46,48 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.WARNING(f"Creating {users_count} users..."))
 
-        users = [User(name=turkish_str(fake.unique.name()).title()) for _ in range(users_count)]
+        users = [User(name=name) for name in normalize_many(fake.unique.name() for _ in range(users_count))]
         User.objects.bulk_create(users, batch_size=batch_size)
 
         self.stdout.write(self.style.SUCCESS(f"{users_count} users created."))
 
-        all_users = list(User.objects.all())
+        # Plain ids are all the workers need, and are much cheaper to build and send than model instances.
+        user_ids = array("q", User.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=10000))
+        if entries_count and not user_ids:
+            raise CommandError("No users to own the entries.")
+
         self.stdout.write(self.style.WARNING(f"Creating {entries_count} entries..."))
 
-        entries = []
-        for i in range(entries_count):
-            entries.append(
-                Entry(
-                    user=random.choice(all_users),
-                    subject=fake.sentence(nb_words=6),
-                    message=fake.paragraph(nb_sentences=5),
-                )
-            )
-            if len(entries) >= batch_size:
-                Entry.objects.bulk_create(entries, batch_size=batch_size)
-                entries = []
-
-        if entries:
-            Entry.objects.bulk_create(entries, batch_size=batch_size)
-
-        self.stdout.write(self.style.SUCCESS(f"{entries_count} entries created."))
+        load = self.copy_entries if connection.vendor == "postgresql" else self.bulk_create_entries
+        chunks = range(math.ceil(entries_count / batch_size))
+        worker_args = (user_ids, entries_count, batch_size, options["seed"])
+        progress = Progress(self.stdout, "entries", total=entries_count)
+
+        if options["workers"] == 1:
+            init_worker(*worker_args)
+            for chunk in chunks:
+                progress.update(load(generate_chunk(chunk)))
+        else:
+            with multiprocessing.Pool(options["workers"], initializer=init_worker, initargs=worker_args) as pool:
+                # Chunks are handed out a window at a time, so generated rows can't pile up while the database is
+                # the bottleneck. imap yields them in order, which keeps seeded runs identical.
+                window = options["workers"] * 4
+                for start in range(0, len(chunks), window):
+                    for rows in pool.imap(generate_chunk, chunks[start : start + window]):
+                        progress.update(load(rows))
+
+        entries_bulk_created.send(sender=Entry, user_ids=User.objects.values("pk"), count=progress.done)
+        self.stdout.write(self.style.SUCCESS(f"{progress.summary()} created."))
+
+    def bulk_create_entries(self, rows):
+        entries = [Entry(user_id=user_id, subject=subject, message=message) for user_id, subject, message, _ in rows]
+        Entry.objects.bulk_create(entries, batch_size=len(entries))
+        return len(entries)
+
+    def copy_entries(self, rows):
+        now = timezone.now()
+        return copy_rows(
+            Entry,
+            ("user", "subject", "message", "search_text", "created_date", "updated_date"),
+            (row + (now, now) for row in rows),
+        )
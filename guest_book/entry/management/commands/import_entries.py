@@ -0,0 +1,75 @@
+import itertools
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from entry.models import Entry
+from entry.signals import entries_bulk_created
+from entry.transfer import FORMATS, chunked, detect_format, load_checkpoint, read_records, save_checkpoint
+from libs.db import copy_rows, insert_rows
+from libs.normalize import fold_search, normalize_many
+from libs.progress import Progress
+from user.models import User
+
+ENTRY_FIELDS = ("user", "subject", "message", "search_text", "created_date", "updated_date")
+
+
+class Command(BaseCommand):
+    help = (
+        "Import entries from a file written by export_entries, creating missing users. Each batch is one user upsert "
+        "and one COPY (PostgreSQL) or multi-row INSERT, in its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to read, e.g. entries.jsonl.gz")
+        parser.add_argument("--format", choices=FORMATS, help="Defaults to the format named by the file extension")
+        parser.add_argument("--batch", type=int, default=5000, help="Entries inserted per transaction")
+        parser.add_argument("--resume", action="store_true", help="Skip the entries imported by an interrupted run")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint)")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        skip = load_checkpoint(checkpoint_path)["rows"] if options["resume"] else 0
+
+        records = itertools.islice(read_records(path, detect_format(path, options["format"])), skip, None)
+        load = copy_rows if connection.vendor == "postgresql" else insert_rows
+        progress = Progress(self.stdout, "entries")
+        progress.done = skip
+
+        for batch in chunked(records, options["batch"]):
+            with transaction.atomic():
+                count = self.import_batch(batch, load, first=progress.done + 1)
+            # Saved after the commit: a crash in between imports the batch again on resume.
+            progress.update(count)
+            save_checkpoint(checkpoint_path, {"rows": progress.done})
+
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+        self.stdout.write(self.style.SUCCESS(f"{progress.summary()} imported from {path}."))
+
+    def import_batch(self, records, load, first):
+        try:
+            # Normalized like EntryCreateSerializer names.
+            names = normalize_many(record["user"] for record in records)
+            subjects_messages = [(record["subject"], record["message"]) for record in records]
+            dates = [record.get("created_date") for record in records]
+        except (KeyError, TypeError) as exc:
+            raise CommandError(f"Records {first}-{first + len(records) - 1}: missing field {exc}")
+
+        user_ids = User.objects.upsert_names(names)
+        now = timezone.now()
+        rows = []
+        for number, (name, (subject, message), date) in enumerate(zip(names, subjects_messages, dates), first):
+            created_date = parse_datetime(date) if date else now
+            if created_date is None:
+                raise CommandError(f"Record {number}: invalid created_date {date!r}")
+            rows.append((user_ids[name], subject, message, fold_search(f"{subject}\n{message}"), created_date, now))
+
+        count = load(Entry, ENTRY_FIELDS, rows)
+        # The rows skip the ORM, the user summaries, the entry counter and the caches are updated once per batch.
+        entries_bulk_created.send(sender=Entry, user_ids=set(user_ids.values()), count=count)
+        return count
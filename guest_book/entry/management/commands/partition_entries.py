@@ -0,0 +1,77 @@
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from entry.partitions import (
+    DEFAULT_PARTITION,
+    add_months,
+    create_partition,
+    detach_partition,
+    get_partitions,
+    is_partitioned,
+    month_start,
+    months_between,
+    partition_name,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain the monthly partitions of the entry table: create the coming months, move rows out of the default "
+        "partition and detach the months past the retention. Run it daily, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--premake",
+            type=int,
+            default=settings.ENTRY_PARTITION_PREMAKE,
+            help="Months created ahead of the current one (default ENTRY_PARTITION_PREMAKE)",
+        )
+        parser.add_argument(
+            "--retention",
+            type=int,
+            default=settings.ENTRY_PARTITION_RETENTION_MONTHS,
+            help="Months kept, the current one included, 0 keeps everything (default ENTRY_PARTITION_RETENTION_MONTHS)",
+        )
+        parser.add_argument("--drop", action="store_true", help="Drop expired partitions instead of detaching them")
+        parser.add_argument("--dry-run", action="store_true", help="Only print what would be done")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql" or not is_partitioned(connection):
+            raise CommandError("The entry table is not partitioned, see ENTRY_PARTITIONING.")
+
+        current = month_start(datetime.now(timezone.utc))
+        oldest_kept = add_months(current, 1 - options["retention"]) if options["retention"] > 0 else None
+        partitions = get_partitions(connection)
+
+        # Months of rows that landed in the default partition get their own partition too, unless expired.
+        wanted = set(months_between(current, add_months(current, options["premake"]))) | {
+            month for month in self.default_partition_months() if oldest_kept is None or month >= oldest_kept
+        }
+        for month in sorted(wanted - partitions.keys()):
+            if not options["dry_run"]:
+                create_partition(connection, month)
+            self.stdout.write(f"Created {partition_name(month)}")
+
+        if oldest_kept is not None:
+            for month, name in sorted(partitions.items()):
+                if month >= oldest_kept:
+                    break
+                action = "Dropped" if options["drop"] else "Detached"
+                if options["dry_run"]:
+                    self.stdout.write(f"{action} {name}")
+                else:
+                    count = detach_partition(connection, name, drop=options["drop"])
+                    self.stdout.write(f"{action} {name} ({count} entries)")
+
+        self.stdout.write(self.style.SUCCESS("Entry partitions are up to date."))
+
+    def default_partition_months(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', created_date AT TIME ZONE 'UTC') FROM {DEFAULT_PARTITION}"
+            )
+            return [month.replace(tzinfo=timezone.utc) for (month,) in cursor.fetchall()]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from entry.models import EntryCounter
+
+
+class Command(BaseCommand):
+    help = "Reset the entry counter to the number of entries, e.g. when switching ENTRY_COUNT_STRATEGY to counter"
+
+    def handle(self, *args, **options):
+        count = EntryCounter.objects.reset()
+        self.stdout.write(self.style.SUCCESS(f"Entry counter set to {count}."))
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("entry", "0002_entry_idx_entry_user_date_desc"),
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(fields=["-created_date", "-id"], name="idx_entry_date_id_desc"),
+        ),
+    ]
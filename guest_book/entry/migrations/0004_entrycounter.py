@@ -0,0 +1,35 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+# Fixed so the migrated schema doesn't depend on the environment, EntryCounter.objects.add creates the slots missing
+# for a larger ENTRY_COUNTER_SLOTS.
+SLOTS = 8
+
+
+def backfill_entry_counter(apps, schema_editor):
+    Entry = apps.get_model("entry", "Entry")
+    EntryCounter = apps.get_model("entry", "EntryCounter")
+    EntryCounter.objects.bulk_create(
+        [EntryCounter(slot=slot, value=0) for slot in range(1, SLOTS)]
+        + [EntryCounter(slot=0, value=Entry.objects.count())]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("entry", "0003_entry_idx_entry_date_id_desc"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EntryCounter",
+            fields=[
+                ("slot", models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_entry_counter, migrations.RunPython.noop),
+    ]
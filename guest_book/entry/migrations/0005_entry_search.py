@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+from libs.normalize import fold_search
+
+BACKFILL_BATCH_SIZE = 2000
+
+# search_vector is generated by PostgreSQL from search_text, so every write path keeps it current.
+POSTGRESQL_FORWARD = [
+    "ALTER TABLE entry_entry ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS (to_tsvector('simple', search_text)) STORED",
+    "CREATE INDEX idx_entry_search_vector ON entry_entry USING GIN (search_vector)",
+]
+POSTGRESQL_BACKWARD = [
+    "DROP INDEX IF EXISTS idx_entry_search_vector",
+    "ALTER TABLE entry_entry DROP COLUMN IF EXISTS search_vector",
+]
+
+# Local fallback: an external content FTS5 table synced by triggers. SQLite drops the triggers when a later
+# migration remakes entry_entry, such a migration has to run SQLITE_FORWARD again.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE entry_entry_fts USING fts5("
+    "search_text, content='entry_entry', content_rowid='id', tokenize='unicode61 remove_diacritics 0')",
+    "CREATE TRIGGER entry_entry_fts_insert AFTER INSERT ON entry_entry BEGIN "
+    "INSERT INTO entry_entry_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "CREATE TRIGGER entry_entry_fts_delete AFTER DELETE ON entry_entry BEGIN "
+    "INSERT INTO entry_entry_fts(entry_entry_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); END",
+    "CREATE TRIGGER entry_entry_fts_update AFTER UPDATE OF search_text ON entry_entry BEGIN "
+    "INSERT INTO entry_entry_fts(entry_entry_fts, rowid, search_text) VALUES ('delete', old.id, old.search_text); "
+    "INSERT INTO entry_entry_fts(rowid, search_text) VALUES (new.id, new.search_text); END",
+    "INSERT INTO entry_entry_fts(entry_entry_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS entry_entry_fts_insert",
+    "DROP TRIGGER IF EXISTS entry_entry_fts_delete",
+    "DROP TRIGGER IF EXISTS entry_entry_fts_update",
+    "DROP TABLE IF EXISTS entry_entry_fts",
+]
+
+
+def backfill_search_text(apps, schema_editor):
+    Entry = apps.get_model("entry", "Entry")
+
+    batch = []
+    for entry in Entry.objects.only("subject", "message").iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        entry.search_text = fold_search(f"{entry.subject}\n{entry.message}")
+        batch.append(entry)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Entry.objects.bulk_update(batch, ["search_text"])
+            batch = []
+    Entry.objects.bulk_update(batch, ["search_text"])
+
+
+def run_vendor_sql(postgresql, sqlite):
+    def run(apps, schema_editor):
+        statements = {"postgresql": postgresql, "sqlite": sqlite}.get(schema_editor.connection.vendor, [])
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("entry", "0004_entrycounter"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="entry",
+            name="search_text",
+            field=models.TextField(
+                default="",
+                editable=False,
+                help_text="Subject and message folded with libs.normalize.fold_search",
+            ),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(
+            run_vendor_sql(POSTGRESQL_FORWARD, SQLITE_FORWARD),
+            run_vendor_sql(POSTGRESQL_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 21:05
+
+from django.conf import settings
+from django.db import migrations
+
+from entry.partitions import convert_to_heap, convert_to_partitioned, is_partitioned
+
+
+def partition_entries(apps, schema_editor):
+    # Opt-in: only applied on PostgreSQL with ENTRY_PARTITIONING on. To partition later, migrate back to 0005 and
+    # forward again with the setting on.
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql" and settings.ENTRY_PARTITIONING and not is_partitioned(connection):
+        convert_to_partitioned(connection, premake=settings.ENTRY_PARTITION_PREMAKE)
+
+
+def unpartition_entries(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql" and is_partitioned(connection):
+        convert_to_heap(connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("entry", "0005_entry_search"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_entries, unpartition_entries, elidable=False),
+    ]
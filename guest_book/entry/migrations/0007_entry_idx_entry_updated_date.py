@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("entry", "0006_entry_partitioning"),
+        ("user", "0003_usersummarywatermark"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="entry",
+            index=models.Index(fields=["updated_date"], name="idx_entry_updated_date"),
+        ),
+    ]
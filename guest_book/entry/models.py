@@ -1,12 +1,108 @@
-from django.db import models
+import random
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections, models, transaction
+from django.db.models import F, FloatField, QuerySet, Sum
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
 
 from libs.models.abstract import TimestampedModel
+from libs.normalize import fold_search
+
+# FTS5 table indexing Entry.search_text where PostgreSQL is not available, see migration 0005.
+FTS_TABLE = "entry_entry_fts"
+
+
+class EntryQuerySet(QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips pre_save, the search text is filled here instead.
+        objs = list(objs)
+        for entry in objs:
+            entry.set_search_text()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def search(self, terms):
+        """
+        Filters the entries containing all of the folded ``terms`` (see ``libs.normalize.search_terms``) and
+        annotates their ``rank``, higher is more relevant.
+
+        On PostgreSQL this matches the GIN indexed ``search_vector`` column, elsewhere the FTS5 ``FTS_TABLE``,
+        both kept up to date by the database from ``search_text`` (see migration 0005).
+        """
+        if connections[self.db].vendor == "postgresql":
+            query = SearchQuery(" ".join(terms), config="simple")
+            vector = RawSQL(f'"{Entry._meta.db_table}"."search_vector"', [], output_field=SearchVectorField())
+            # ts_rank_cd returns a real, cast so the rank read back in a cursor compares equal to the stored one.
+            rank = Cast(SearchRank(F("search_vector"), query, cover_density=True), FloatField())
+            return self.alias(search_vector=vector).filter(search_vector=query).annotate(rank=rank)
+
+        match = " ".join(f'"{term}"' for term in terms)
+        matches = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        rank = f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = entry_entry.id"
+        return self.filter(id__in=RawSQL(matches, [match])).annotate(
+            rank=RawSQL(rank, [match], output_field=FloatField())
+        )
 
 
 class Entry(TimestampedModel):
     user = models.ForeignKey("user.User", related_name="entries", on_delete=models.CASCADE)
     subject = models.CharField(max_length=255)
     message = models.TextField()
+    search_text = models.TextField(
+        default="", editable=False, help_text="Subject and message folded with libs.normalize.fold_search"
+    )
+
+    objects = EntryQuerySet.as_manager()
+
+    def set_search_text(self):
+        self.search_text = fold_search(f"{self.subject}\n{self.message}")
 
     class Meta:
-        indexes = [models.Index(fields=["user", "-created_date"], name="idx_entry_user_date_desc")]
+        indexes = [
+            models.Index(fields=["user", "-created_date"], name="idx_entry_user_date_desc"),
+            models.Index(fields=["-created_date", "-id"], name="idx_entry_date_id_desc"),
+            # Range scanned by user.summary.refresh_touched_summaries
+            models.Index(fields=["updated_date"], name="idx_entry_updated_date"),
+        ]
+
+
+def is_counter_maintained():
+    """The entry counter is only written while ``ENTRY_COUNT_STRATEGY`` reads it."""
+    return settings.ENTRY_COUNT_STRATEGY == "counter"
+
+
+class EntryCounterQuerySet(QuerySet):
+    def add(self, amount):
+        """Adds ``amount`` to a random slot, so concurrent writers rarely wait on the same row lock."""
+        slot = random.randrange(settings.ENTRY_COUNTER_SLOTS)
+        if not self.filter(slot=slot).update(value=F("value") + amount):
+            self.get_or_create(slot=slot)
+            self.filter(slot=slot).update(value=F("value") + amount)
+
+    def total(self):
+        return self.aggregate(total=Sum("value"))["total"] or 0
+
+    def reset(self):
+        """
+        Sets the counter to the number of entries and returns it. The slots are locked first, so entries written
+        meanwhile are counted either by the COUNT(*) or on top of it, never twice.
+        """
+        with transaction.atomic(using=self.db):
+            list(self.select_for_update())
+            count = Entry.objects.using(self.db).count()
+            self.exclude(slot=0).update(value=0)
+            self.update_or_create(slot=0, defaults={"value": count})
+        return count
+
+
+class EntryCounter(models.Model):
+    """
+    Number of entries, split over ``ENTRY_COUNTER_SLOTS`` rows updated in the same transaction as entry writes while
+    ``ENTRY_COUNT_STRATEGY`` is "counter". Run ``reconcile_entry_counter`` when switching to it.
+    """
+
+    slot = models.PositiveSmallIntegerField(primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    objects = EntryCounterQuerySet.as_manager()
@@ -0,0 +1,208 @@
+"""
+Monthly range partitioning of the entry table on PostgreSQL.
+
+With ``ENTRY_PARTITIONING`` on, migration 0006 turns ``entry_entry`` into a table partitioned by ``created_date``
+with one partition per month, ``entry_entry_pYYYYMM``, and a default partition catching rows outside of them so
+an insert never fails for lack of a partition. The ``partition_entries`` command creates the months ahead and
+detaches (or drops) the months past ``ENTRY_PARTITION_RETENTION_MONTHS``.
+
+PostgreSQL requires the partition key in every unique constraint, so the primary key becomes ``(id, created_date)``;
+ids still come from a single sequence and stay unique.
+"""
+
+import re
+from datetime import datetime, timezone
+
+from django.db import transaction
+from django.db.models.expressions import RawSQL
+
+from entry.models import EntryCounter, is_counter_maintained
+from libs.cache import bump_generation_on_commit
+from user.models import User
+
+TABLE = "entry_entry"
+DEFAULT_PARTITION = f"{TABLE}_default"
+SEQUENCE = f"{TABLE}_id_seq"
+PARTITION_NAME = re.compile(rf"^{TABLE}_p(\d{{4}})(\d{{2}})$")
+
+
+def month_start(value):
+    """Returns the first instant of the UTC month of ``value``."""
+    return value.astimezone(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month, count):
+    year, index = divmod(month.year * 12 + month.month - 1 + count, 12)
+    return month.replace(year=year, month=index + 1)
+
+
+def months_between(first, last):
+    """Yields the starts of the months from the month of ``first`` to the month of ``last``, both included."""
+    month, last = month_start(first), month_start(last)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def is_partitioned(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))", [TABLE])
+        return cursor.fetchone()[0]
+
+
+def get_partitions(connection):
+    """Returns ``{month: name}`` of the monthly partitions currently attached."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(%s)",
+            [TABLE],
+        )
+        names = [name for (name,) in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        if match := PARTITION_NAME.match(name):
+            partitions[datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+def _insert_columns(cursor, table):
+    # Generated columns (search_vector) are computed by PostgreSQL and can't be written.
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s AND is_generated = 'NEVER' "
+        "ORDER BY ordinal_position",
+        [table],
+    )
+    return ", ".join(f'"{column}"' for (column,) in cursor.fetchall())
+
+
+def _index_and_foreign_key_sql(cursor, table):
+    """Returns the statements recreating the secondary indexes and foreign keys of ``table`` under the same names."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = to_regclass(%s) AND NOT indisprimary ORDER BY indexrelid",
+        [table],
+    )
+    # Partitioned indexes are defined ON ONLY the parent, recreated on a plain table they must not be.
+    statements = [definition.replace(" ON ONLY ", " ON ") for (definition,) in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f' ORDER BY oid",
+        [table],
+    )
+    statements += [
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}' for name, definition in cursor.fetchall()
+    ]
+    return statements
+
+
+def convert_to_partitioned(connection, premake):
+    """
+    Rewrites the entry table as a partitioned one, with a partition per month from the oldest entry to ``premake``
+    months after the current one. Runs in the caller's transaction and locks the table for the whole copy.
+    """
+    with connection.cursor() as cursor:
+        recreate = _index_and_foreign_key_sql(cursor, TABLE)
+        columns = _insert_columns(cursor, TABLE)
+        cursor.execute(f"SELECT min(created_date), max(id) FROM {TABLE}")
+        oldest, last_id = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_heap")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {TABLE}_heap INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE) "
+            "PARTITION BY RANGE (created_date)"
+        )
+        now = datetime.now(timezone.utc)
+        for month in months_between(oldest or now, add_months(now, premake)):
+            cursor.execute(
+                f"CREATE TABLE {partition_name(month)} PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)",
+                [month, add_months(month, 1)],
+            )
+        cursor.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT")
+        cursor.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {TABLE}_heap")
+        # Drops the identity sequence of the old table too, ids continue from a plain sequence.
+        cursor.execute(f"DROP TABLE {TABLE}_heap")
+
+        cursor.execute(f"CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+        cursor.execute("SELECT setval(%s, %s, false)", [SEQUENCE, (last_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_date)")
+        for statement in recreate:
+            cursor.execute(statement)
+
+
+def convert_to_heap(connection):
+    """Reverts ``convert_to_partitioned``, copying every partition back into a single table."""
+    with connection.cursor() as cursor:
+        recreate = _index_and_foreign_key_sql(cursor, TABLE)
+        columns = _insert_columns(cursor, TABLE)
+        cursor.execute(f"SELECT max(id) FROM {TABLE}")
+        (last_id,) = cursor.fetchone()
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned")
+        cursor.execute(f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING GENERATED INCLUDING STORAGE)")
+        cursor.execute(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {TABLE}_partitioned")
+        cursor.execute(f"DROP TABLE {TABLE}_partitioned CASCADE")
+
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)", [TABLE, (last_id or 0) + 1])
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)")
+        for statement in recreate:
+            cursor.execute(statement)
+
+
+def create_partition(connection, month):
+    """
+    Creates and attaches the partition of ``month``, moving its rows out of the default partition.
+
+    The partition is filled and given a CHECK matching its bounds before ATTACH, so attaching doesn't scan it and
+    only holds a SHARE UPDATE EXCLUSIVE lock on the entry table. Returns False when it already exists.
+    """
+    if month in get_partitions(connection):
+        return False
+
+    name, bounds = partition_name(month), [month, add_months(month, 1)]
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        columns = _insert_columns(cursor, TABLE)
+        cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING GENERATED INCLUDING STORAGE)")
+        cursor.execute(
+            f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds CHECK (created_date >= %s AND created_date < %s)",
+            bounds,
+        )
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE created_date >= %s AND created_date < %s "
+            f"RETURNING {columns}) INSERT INTO {name} ({columns}) SELECT {columns} FROM moved",
+            bounds,
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)", bounds)
+        cursor.execute(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds")
+    return True
+
+
+def detach_partition(connection, name, drop=False):
+    """
+    Detaches the partition ``name``, dropping it with ``drop``, and returns the number of entries it held.
+
+    Its entries leave the API like deleted entries would: the summaries of their users, the entry counter and the
+    cached pages are updated in the same transaction.
+    """
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f"SELECT count(*) FROM {name}")
+        (count,) = cursor.fetchone()
+        cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+
+        User.objects.using(connection.alias).filter(
+            pk__in=RawSQL(f"SELECT DISTINCT user_id FROM {name}", [])
+        ).refresh_entry_summary()
+        if is_counter_maintained():
+            EntryCounter.objects.using(connection.alias).add(-count)
+        bump_generation_on_commit("entry")
+
+        if drop:
+            cursor.execute(f"DROP TABLE {name}")
+    return count
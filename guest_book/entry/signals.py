@@ -1,13 +1,109 @@
-# Optional cache invalidation:
-# If count accuracy is important and entries do not change frequently,
-# this signal handler can be activated to invalidate the cached count.
-
-# CACHE_KEY_COUNT = "entry_count"
-#
-#
-# @receiver(post_save, sender=Entry)
-# @receiver(post_delete, sender=Entry)
-# def invalidate_entry_count_cache(sender, **kwargs):
-#     cache.delete(CACHE_KEY_COUNT)
-
-# NOTE
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from entry.models import Entry, EntryCounter, is_counter_maintained
+from libs.cache import bump_generation_on_commit
+from user.models import User, entry_summary, latest_entry_summary
+from user.summary import is_incremental
+
+# Sent after entries are inserted without going through Entry.save (e.g. bulk_create),
+# with ``user_ids`` holding the owners of the inserted entries and ``count`` the number of entries.
+entries_bulk_created = Signal()
+
+
+@receiver(pre_save, sender=Entry)
+def set_search_text(sender, instance, raw=False, **kwargs):
+    if not raw:
+        instance.set_search_text()
+
+
+@receiver(post_save, sender=Entry)
+@receiver(post_delete, sender=Entry)
+@receiver(entries_bulk_created, sender=Entry)
+def invalidate_entry_cache(sender, raw=False, **kwargs):
+    # Bumping the generation leaves the old cached values to expire instead of deleting them on every write.
+    if not raw:
+        bump_generation_on_commit("entry")
+
+
+@receiver(post_save, sender=Entry)
+def update_user_summary_on_save(sender, instance, created, raw=False, **kwargs):
+    # Incrementally refreshed summaries pick up the entry from its updated_date, see user.summary.
+    if raw or is_incremental():
+        return
+
+    users = User.objects.filter(pk=instance.user_id)
+    if created:
+        users.update(total_entries=F("total_entries") + 1, last_entry=entry_summary(instance.subject, instance.message))
+    else:
+        users.refresh_last_entry()
+
+
+def is_owner_deletion(origin):
+    """Returns whether the delete started from ``origin`` removes the entries along with their users."""
+    return isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User)
+
+
+def is_bulk_deletion(origin):
+    """Returns whether the delete started from ``origin`` can remove several entries at once."""
+    return isinstance(origin, QuerySet) or is_owner_deletion(origin)
+
+
+@receiver(post_delete, sender=Entry)
+def update_user_summary_on_delete(sender, instance, origin=None, **kwargs):
+    if is_owner_deletion(origin):
+        return
+
+    users = User.objects.filter(pk=instance.user_id)
+    if isinstance(origin, QuerySet):
+        # The entries of a queryset delete are all gone by the first post_delete, each owner is refreshed once.
+        refreshed = vars(origin).setdefault("_refreshed_user_ids", set())
+        if instance.user_id not in refreshed:
+            refreshed.add(instance.user_id)
+            users.refresh_entry_summary()
+        return
+
+    if is_incremental():
+        # The stored total may still miss creations the refresher hasn't counted, and it never sees deletions.
+        users.refresh_entry_summary()
+        return
+    users.update(total_entries=Greatest(F("total_entries") - 1, 0), last_entry=latest_entry_summary())
+
+
+@receiver(entries_bulk_created, sender=Entry)
+def update_user_summary_on_bulk_create(sender, user_ids, **kwargs):
+    if is_incremental():
+        return
+    User.objects.filter(pk__in=user_ids).refresh_entry_summary()
+
+
+@receiver(post_save, sender=Entry)
+def increment_entry_counter(sender, created, raw=False, **kwargs):
+    if created and not raw and is_counter_maintained():
+        EntryCounter.objects.add(1)
+
+
+@receiver(pre_delete, sender=Entry)
+def count_deleted_entry(sender, origin=None, **kwargs):
+    # pre_delete is sent for every entry of a bulk deletion before any post_delete.
+    if is_counter_maintained() and is_bulk_deletion(origin):
+        vars(origin)["_deleted_entries"] = vars(origin).get("_deleted_entries", 0) + 1
+
+
+@receiver(post_delete, sender=Entry)
+def decrement_entry_counter(sender, origin=None, **kwargs):
+    if not is_counter_maintained():
+        return
+    if not is_bulk_deletion(origin):
+        EntryCounter.objects.add(-1)
+    elif count := vars(origin).pop("_deleted_entries", 0):
+        # Subtracted at once from the first post_delete, the following ones find nothing left.
+        EntryCounter.objects.add(-count)
+
+
+@receiver(entries_bulk_created, sender=Entry)
+def increment_entry_counter_on_bulk_create(sender, count, **kwargs):
+    if is_counter_maintained():
+        EntryCounter.objects.add(count)
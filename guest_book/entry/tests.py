@@ -1,12 +1,41 @@
-from django.test import TestCase
+from django.test import AsyncClient, SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.conf import settings
+from django.db import DataError, OperationalError, connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 from unittest.mock import patch
 
-from entry.models import Entry
-from user.models import User
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+from datetime import datetime, timedelta, timezone
+from unittest import skipUnless
+import gzip
+import json
+import os
+import tempfile
+
+from api.v1.entry.ingest import RedisStreamEntryQueue, flush_batch, local_queue
+from api.v1.entry.serializers import EntryResponseSerializer
+from entry.management.commands import export_entries
+from entry.models import Entry, EntryCounter
+from entry.partitions import (
+    add_months,
+    convert_to_heap,
+    convert_to_partitioned,
+    get_partitions,
+    is_partitioned,
+    month_start,
+    months_between,
+    partition_name,
+)
+from libs.cache import LOCK_KEY, bump_generation
+from libs.normalize import fold_search
+from user.models import User, user_id_cache
 
 
 class TestEntryAPI(TestCase):
@@ -14,6 +43,7 @@ class TestEntryAPI(TestCase):
     def setUp(self):
         self.client = APIClient()
         cache.clear()
+        user_id_cache.clear()
 
     def test_create_entry_with_new_user(self):
         # Given
@@ -48,6 +78,53 @@ class TestEntryAPI(TestCase):
         self.assertEqual(User.objects.filter(name="Jane Smith").count(), 1)
         self.assertTrue(Entry.objects.filter(user=user, subject="Second message").exists())
 
+    def test_create_entry_resolves_returning_user_from_cache(self):
+        # Given
+        payload = {"name": "Jane Smith", "subject": "Subject", "message": "Message"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(any('INTO "user"' in query["sql"] for query in queries))
+        self.assertEqual(User.objects.get(name="Jane Smith").total_entries, 2)
+
+    def test_create_entry_after_user_deleted(self):
+        # Given
+        payload = {"name": "Jane Smith", "subject": "Subject", "message": "Message"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+        User.objects.get(name="Jane Smith").delete()
+
+        # When
+        response = self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Entry.objects.get().user.name, "Jane Smith")
+
+    def test_create_entry_after_user_deleted_by_another_process(self):
+        # Given - the id stays in this process' cache, as it does in the processes not running the delete
+        payload = {"name": "Jane Smith", "subject": "Subject", "message": "Message"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+        stale = user_id_cache.get("Jane Smith")
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(name="Jane Smith").delete()
+        user_id_cache.set("Jane Smith", stale)
+
+        # When
+        response = self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(Entry.objects.get().user_id, stale[0])
+        self.assertEqual(Entry.objects.get().user.name, "Jane Smith")
+
     def test_create_entry_validation_errors(self):
         # Given & When
         response = self.client.post(reverse("api:v1:entry:entry-list-create"), data={}, format="json")
@@ -104,6 +181,7 @@ class TestEntryAPI(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         data = response.json()
         self.assertEqual(data["count"], 5)
+        self.assertTrue(data["count_exact"])
         self.assertEqual(data["page_size"], 3)
         self.assertEqual(data["total_pages"], 2)
         self.assertEqual(data["current_page_number"], 1)
@@ -159,23 +237,210 @@ class TestEntryAPI(TestCase):
         self.assertEqual(entry["subject"], "Test Subject")
         self.assertEqual(entry["message"], "Test Message")
 
+    @override_settings(ENTRY_PAGE_CACHE_PAGES=0)
     def test_pagination_cache(self):
         # Given
         user = User.objects.create(name="Test User")
         Entry.objects.create(user=user, subject="Test", message="Test")
 
+        url = reverse("api:v1:entry:entry-list-create")
+
         # When & Then - First request should write to cache
-        with patch("api.v1.entry.pagination.cache.get", return_value=None) as mock_get:
-            with patch("api.v1.entry.pagination.cache.set") as mock_set:
-                response = self.client.get(reverse("api:v1:entry:entry-list-create"))
-                self.assertEqual(response.status_code, status.HTTP_200_OK)
-                mock_set.assert_called_once()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum("COUNT(*)" in query["sql"] for query in queries), 1)
+        self.assertEqual(cache.get("entry_count")[1], 1)
 
         # When & Then - Second request should read from cache
-        with patch("api.v1.entry.pagination.cache.get", return_value=1) as mock_get:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.json()["count"], 1)
+        self.assertFalse(any("COUNT(*)" in query["sql"] for query in queries))
+
+    @override_settings(ENTRY_PAGE_CACHE_PAGES=0)
+    def test_pagination_count_stale_while_refreshing(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        Entry.objects.create(user=user, subject="Test", message="Test")
+        url = reverse("api:v1:entry:entry-list-create")
+        self.client.get(url)
+        Entry.objects.create(user=user, subject="Test", message="Test")
+        bump_generation("entry")
+
+        # When - another worker holds the refresh lock of the new generation
+        cache.add(LOCK_KEY.format(key="entry_count"), "other", timeout=30)
+        with CaptureQueriesContext(connection) as queries:
+            stale = self.client.get(url)
+        cache.delete(LOCK_KEY.format(key="entry_count"))
+        fresh = self.client.get(url)
+
+        # Then - the previous count is served without a COUNT(*), until the lock is free
+        self.assertEqual(stale.json()["count"], 1)
+        self.assertFalse(any("COUNT(*)" in query["sql"] for query in queries))
+        self.assertEqual(fresh.json()["count"], 2)
+
+    def test_pagination_cache_invalidated_on_write(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        Entry.objects.create(user=user, subject="Test", message="Test")
+        self.assertEqual(self.client.get(reverse("api:v1:entry:entry-list-create")).json()["count"], 1)
+
+        # When
+        payload = {"name": "Test User", "subject": "Another", "message": "Another message"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(self.client.get(reverse("api:v1:entry:entry-list-create")).json()["count"], 2)
+
+    def test_entry_serializer_values_fast_path(self):
+        # Given
+        Entry.objects.create(user=User.objects.create(name="Ilık Irmak"), subject="Çay", message="Simit")
+        Entry.objects.create(user=User.objects.create(name="John Doe"), subject="Hello", message="World")
+        queryset = Entry.objects.select_related("user").order_by("pk")
+
+        # When & Then
+        self.assertEqual(
+            EntryResponseSerializer.serialize_values(queryset), EntryResponseSerializer(queryset, many=True).data
+        )
+
+    def test_list_entries_page_cache(self):
+        # Given
+        url = reverse("api:v1:entry:entry-list-create")
+        user = User.objects.create(name="Test User")
+        for i in range(4):
+            Entry.objects.create(user=user, subject=f"Subject {i}", message="Message")
+        first_page = self.client.get(url).content
+
+        # When & Then - Served from the cache, gzipped for clients accepting it
+        with self.assertNumQueries(0):
+            plain = self.client.get(url)
+            compressed = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(plain.content, first_page)
+        self.assertEqual(compressed["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(compressed.content), first_page)
+        self.assertIn("Accept-Encoding", compressed["Vary"])
+
+        # When & Then - Pages past ENTRY_PAGE_CACHE_PAGES and other parameters are not cached, only their count is
+        with override_settings(ENTRY_PAGE_CACHE_PAGES=1):
+            self.client.get(f"{url}?page=2")
+            with self.assertNumQueries(1):
+                self.client.get(f"{url}?page=2")
+        self.client.get(f"{url}?page=1&foo=bar")
+        with self.assertNumQueries(1):
+            self.client.get(f"{url}?page=1&foo=bar")
+
+        # When & Then - A new entry invalidates the cached pages
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data={"name": "Test User", "subject": "New", "message": "New"}, format="json")
+        self.assertEqual(self.client.get(url).json()["entries"][0]["subject"], "New")
+
+    def test_list_entries_conditional_get(self):
+        # Given
+        url = reverse("api:v1:entry:entry-list-create")
+        user = User.objects.create(name="Test User")
+        Entry.objects.create(user=user, subject="Test", message="Test")
+        etag = self.client.get(url)["ETag"]
+
+        # When & Then - Unchanged list, answered without querying the database
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # When & Then - Changed list
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, data={"name": "Test User", "subject": "New", "message": "New"}, format="json")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    @override_settings(ENTRY_COUNT_STRATEGY="counter")
+    def test_pagination_count_from_counter(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        entries = [Entry.objects.create(user=user, subject=f"S{i}", message="M") for i in range(4)]
+        payload = [{"name": "Test User", "subject": "Batch", "message": "Batch message"}] * 3
+        self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+        entries[0].delete()
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
             response = self.client.get(reverse("api:v1:entry:entry-list-create"))
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            mock_get.assert_called_once()
+
+        # Then
+        data = response.json()
+        self.assertEqual(data["count"], 6)
+        self.assertTrue(data["count_exact"])
+        self.assertEqual(data["total_pages"], 2)
+        self.assertFalse(any("COUNT(*)" in query["sql"] for query in queries))
+
+    @override_settings(ENTRY_COUNT_STRATEGY="counter")
+    def test_entry_counter_on_bulk_delete(self):
+        # Given
+        users = [User.objects.create(name=f"User {i}") for i in range(3)]
+        for user in users:
+            Entry.objects.bulk_create([Entry(user=user, subject=f"S{i}", message="M") for i in range(20)])
+        call_command("reconcile_entry_counter", stdout=StringIO())
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            users[0].delete()
+            User.objects.filter(pk=users[1].pk).delete()
+            Entry.objects.filter(user=users[2], subject__in=["S1", "S2"]).delete()
+
+        # Then - one counter update per delete instead of one per entry
+        self.assertEqual(len([query for query in queries if 'UPDATE "entry_entrycounter"' in query["sql"]]), 3)
+        self.assertEqual(EntryCounter.objects.total(), 18)
+
+    def test_entry_counter_is_left_alone_by_other_strategies(self):
+        # Given
+        user = User.objects.create(name="Test User")
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            Entry.objects.create(user=user, subject="Subject", message="Message").delete()
+            user.delete()
+
+        # Then
+        self.assertFalse(any("entry_entrycounter" in query["sql"] for query in queries))
+
+    def test_reconcile_entry_counter_command(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        Entry.objects.bulk_create([Entry(user=user, subject=f"S{i}", message="M") for i in range(3)])
+        EntryCounter.objects.add(10)
+
+        # When
+        out = StringIO()
+        call_command("reconcile_entry_counter", stdout=out)
+
+        # Then
+        self.assertIn("Entry counter set to 3.", out.getvalue())
+        self.assertEqual(EntryCounter.objects.total(), 3)
+
+    @override_settings(ENTRY_COUNT_STRATEGY="estimate", ENTRY_COUNT_ESTIMATE_THRESHOLD=1000, ENTRY_PAGE_CACHE_PAGES=0)
+    def test_pagination_count_from_estimate(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        Entry.objects.create(user=user, subject="Test", message="Test")
+
+        # When
+        with patch("api.v1.entry.pagination.estimate_row_count", return_value=5000):
+            data = self.client.get(reverse("api:v1:entry:entry-list-create")).json()
+
+        # Then
+        self.assertEqual(data["count"], 5000)
+        self.assertFalse(data["count_exact"])
+        self.assertEqual(data["total_pages"], 1667)
+
+        # When - Small tables are counted exactly
+        with patch("api.v1.entry.pagination.estimate_row_count", return_value=10):
+            data = self.client.get(reverse("api:v1:entry:entry-list-create")).json()
+
+        # Then
+        self.assertEqual(data["count"], 1)
+        self.assertTrue(data["count_exact"])
 
     def test_multiple_users_entries(self):
         # Given
@@ -230,3 +495,730 @@ class TestEntryAPI(TestCase):
         entry = Entry.objects.get(subject="Special characters: @#$%^&*()_+-=[]{}|;':\",./<>?`~")
         self.assertEqual(entry.user.name, "Test User 🎉")
         self.assertIn("special characters", entry.message)
+
+    def test_list_entries_with_cursor_pagination(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        for i in range(5):
+            Entry.objects.create(user=user, subject=f"Subject {i+1}", message=f"Message {i+1}")
+
+        # When
+        response = self.client.get(f"{reverse('api:v1:entry:entry-list-create')}?cursor=")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data["page_size"], 3)
+        self.assertEqual([entry["subject"] for entry in data["entries"]], ["Subject 5", "Subject 4", "Subject 3"])
+        self.assertIsNotNone(data["links"]["next"])
+        self.assertIsNone(data["links"]["previous"])
+
+        # When - Next page
+        response = self.client.get(data["links"]["next"])
+
+        # Then
+        data = response.json()
+        self.assertEqual([entry["subject"] for entry in data["entries"]], ["Subject 2", "Subject 1"])
+        self.assertIsNone(data["links"]["next"])
+        self.assertIsNotNone(data["links"]["previous"])
+
+        # When - Back to the first page
+        response = self.client.get(data["links"]["previous"])
+
+        # Then
+        data = response.json()
+        self.assertEqual([entry["subject"] for entry in data["entries"]], ["Subject 5", "Subject 4", "Subject 3"])
+        self.assertIsNone(data["links"]["previous"])
+
+    def test_cursor_pagination_breaks_ties_by_id(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        for i in range(4):
+            Entry.objects.create(user=user, subject=f"Subject {i+1}", message=f"Message {i+1}")
+        Entry.objects.update(created_date=Entry.objects.first().created_date)
+
+        # When
+        first_page = self.client.get(f"{reverse('api:v1:entry:entry-list-create')}?cursor=").json()
+        second_page = self.client.get(first_page["links"]["next"]).json()
+
+        # Then
+        subjects = [entry["subject"] for entry in first_page["entries"] + second_page["entries"]]
+        self.assertEqual(subjects, ["Subject 4", "Subject 3", "Subject 2", "Subject 1"])
+
+    def test_cursor_pagination_invalid_cursor(self):
+        # When
+        response = self.client.get(f"{reverse('api:v1:entry:entry-list-create')}?cursor=not-a-cursor")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_batch_create_entries(self):
+        # Given
+        User.objects.create(name="Jane Smith")
+        payload = [
+            {"name": "jane smith", "subject": "First", "message": "First message"},
+            {"name": "ılık ırmak", "subject": "Second", "message": "Second message"},
+            {"name": "Jane Smith", "subject": "Third", "message": "Third message"},
+        ]
+
+        # When
+        response = self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data["created"], 3)
+        self.assertEqual(data["failed"], 0)
+        self.assertEqual([result["entry"]["subject"] for result in data["results"]], ["First", "Second", "Third"])
+        self.assertEqual(User.objects.count(), 2)
+        self.assertTrue(User.objects.filter(name="Ilık Irmak").exists())
+
+        user = User.objects.get(name="Jane Smith")
+        self.assertEqual(user.total_entries, 2)
+        self.assertEqual(user.entries.count(), 2)
+
+    def test_batch_create_entries_query_count_is_constant(self):
+        # Given
+        def payload(size):
+            return [{"name": f"User {i}", "subject": f"Subject {i}", "message": "Message"} for i in range(size)]
+
+        # When & Then
+        with CaptureQueriesContext(connection) as small_batch:
+            self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload(2), format="json")
+        with CaptureQueriesContext(connection) as large_batch:
+            self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload(50), format="json")
+        self.assertEqual(len(small_batch), len(large_batch))
+        self.assertEqual(Entry.objects.count(), 52)
+
+    def test_batch_create_entries_partial_failure(self):
+        # Given
+        payload = [
+            {"name": "Test User", "subject": "Valid", "message": "Valid message"},
+            {"name": "Test User", "subject": "x" * 256, "message": "Invalid message"},
+            "not an entry",
+        ]
+
+        # When
+        response = self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        data = response.json()
+        self.assertEqual(data["created"], 1)
+        self.assertEqual(data["failed"], 2)
+        self.assertEqual([result["status"] for result in data["results"]], [201, 400, 400])
+        self.assertIn("subject", data["results"][1]["errors"])
+        self.assertEqual(Entry.objects.count(), 1)
+
+    @override_settings(ENTRY_BATCH_MAX_SIZE=2)
+    def test_batch_create_entries_validation_errors(self):
+        # When & Then - Not a list
+        response = self.client.post(reverse("api:v1:entry:entry-batch-create"), data={}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # When & Then - Too many entries
+        payload = [{"name": "Test User", "subject": "Subject", "message": "Message"}] * 3
+        response = self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # When & Then - No valid entry
+        payload = [{"name": "Test User"}]
+        response = self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Entry.objects.exists())
+
+
+class TestEntrySearchAPI(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("api:v1:entry:entry-search")
+        self.user = User.objects.create(name="Test User")
+
+    def search(self, query, cursor=None):
+        params = {"q": query} if cursor is None else {"q": query, "cursor": cursor}
+        return self.client.get(self.url, params)
+
+    def test_search_entries(self):
+        # Given
+        Entry.objects.create(user=self.user, subject="Işık", message="Çay ve simit")
+        Entry.objects.create(user=self.user, subject="Simit", message="Sıcak simit, simit ve çay")
+        Entry.objects.create(user=self.user, subject="Other", message="Nothing to see")
+
+        # When
+        response = self.search("SİMİT")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual([entry["subject"] for entry in data["entries"]], ["Simit", "Işık"])
+        self.assertIsNone(data["links"]["next"])
+
+    def test_search_folds_turkish_text(self):
+        # Given
+        Entry.objects.create(user=self.user, subject="ILIK IRMAK", message="Message")
+        Entry.objects.create(user=self.user, subject="Çiğdem", message="Şule")
+
+        # When & Then
+        self.assertEqual(len(self.search("ılık").json()["entries"]), 1)
+        self.assertEqual(len(self.search("ilik irmak").json()["entries"]), 1)
+        self.assertEqual(len(self.search("cigdem sule").json()["entries"]), 1)
+        self.assertEqual(len(self.search("ılık çiğdem").json()["entries"]), 0)
+
+    def test_search_includes_bulk_created_entries(self):
+        # Given
+        payload = [{"name": "Test User", "subject": "Toplu", "message": f"Mesaj {i}"} for i in range(2)]
+        self.client.post(reverse("api:v1:entry:entry-batch-create"), data=payload, format="json")
+
+        # When & Then
+        self.assertEqual(len(self.search("toplu").json()["entries"]), 2)
+
+    def test_search_reflects_updates_and_deletes(self):
+        # Given
+        entry = Entry.objects.create(user=self.user, subject="Before", message="Message")
+
+        # When
+        entry.subject = "After"
+        entry.save()
+
+        # Then
+        self.assertEqual(len(self.search("before").json()["entries"]), 0)
+        self.assertEqual(len(self.search("after").json()["entries"]), 1)
+
+        # When
+        entry.delete()
+
+        # Then
+        self.assertEqual(len(self.search("after").json()["entries"]), 0)
+
+    def test_search_keyset_pagination(self):
+        # Given - equal ranks, so the pages are only told apart by id
+        for i in range(7):
+            Entry.objects.create(user=self.user, subject=f"Konu {i}", message="Aynı mesaj")
+
+        # When
+        data = self.search("mesaj", cursor="").json()
+        subjects = [entry["subject"] for entry in data["entries"]]
+        while data["links"]["next"]:
+            data = self.client.get(data["links"]["next"]).json()
+            subjects += [entry["subject"] for entry in data["entries"]]
+
+        # Then
+        self.assertEqual(subjects, [f"Konu {i}" for i in reversed(range(7))])
+
+        # When - Back to the first page
+        previous = self.client.get(data["links"]["previous"]).json()
+        self.assertEqual([entry["subject"] for entry in previous["entries"]], ["Konu 3", "Konu 2", "Konu 1"])
+
+    def test_search_validation_errors(self):
+        # When & Then - Missing query
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search("!!").status_code, status.HTTP_400_BAD_REQUEST)
+
+        # When & Then - Invalid cursor
+        self.assertEqual(self.search("mesaj", cursor="bad").status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TestBenchCommand(TestCase):
+    def test_bench_reports_scenarios_and_rolls_back(self):
+        # Given
+        out = StringIO()
+
+        # When
+        call_command("bench", "--users", "5", "10", "--entries", "12", "--requests", "2", "--json", "-", stdout=out)
+
+        # Then
+        report = json.loads(out.getvalue()[out.getvalue().index("{") :])
+        scenarios = {result["scenario"]: result for result in report["results"]}
+        self.assertEqual(report["dataset"]["users"], [5, 10])
+        self.assertEqual(scenarios["entries page 1 (warm cache)"]["queries_per_request"], 0)
+        self.assertIn("users 10 (cold cache)", scenarios)
+        self.assertIn("POST batch of 100", scenarios)
+        self.assertTrue(all(result["p50_ms"] <= result["p99_ms"] for result in report["results"]))
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Entry.objects.exists())
+
+
+class TestGenerateFakeData(TestCase):
+    def generate(self, *args):
+        call_command("generate_fake_data", "--users", "4", "--entries", "25", "--batch", "10", *args, stdout=StringIO())
+        return list(Entry.objects.order_by("id").values_list("user__name", "subject", "message", "search_text"))
+
+    @override_settings(ENTRY_COUNT_STRATEGY="counter")
+    def test_generates_users_and_entries(self):
+        # When
+        entries = self.generate("--workers", "1")
+
+        # Then
+        self.assertEqual(User.objects.count(), 4)
+        self.assertEqual(len(entries), 25)
+        self.assertEqual(sum(User.objects.values_list("total_entries", flat=True)), 25)
+        self.assertEqual(EntryCounter.objects.total(), 25)
+        name, subject, message, search_text = entries[0]
+        self.assertEqual(search_text, fold_search(f"{subject}\n{message}"))
+
+    def test_seed_is_reproducible_across_worker_counts(self):
+        # Given
+        first = self.generate("--seed", "42", "--workers", "1")
+        Entry.objects.all().delete()
+        User.objects.all().delete()
+
+        # When
+        second = self.generate("--seed", "42", "--workers", "2")
+
+        # Then
+        self.assertEqual(first, second)
+
+
+class TestEntryTransfer(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        users = [User.objects.create(name=name) for name in ("Ayşe Işık", "John Doe")]
+        for i in range(5):
+            Entry.objects.create(user=users[i % 2], subject=f"Subject {i}", message=f'Line one\nline\t{i}, "quoted"')
+        self.exported = self.dump()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def dump(self):
+        return list(Entry.objects.order_by("id").values_list("user__name", "subject", "message", "created_date"))
+
+    def test_round_trip(self):
+        for name in ("entries.jsonl.gz", "entries.csv"):
+            with self.subTest(name):
+                # Given
+                call_command("export_entries", self.path(name), "--chunk", "2", stdout=StringIO())
+                Entry.objects.all().delete()
+                User.objects.all().delete()
+
+                # When
+                call_command("import_entries", self.path(name), "--batch", "2", stdout=StringIO())
+
+                # Then
+                self.assertEqual(self.dump(), self.exported)
+                self.assertEqual(
+                    dict(User.objects.values_list("name", "total_entries")), {"Ayşe Işık": 3, "John Doe": 2}
+                )
+                self.assertFalse(os.path.exists(self.path(f"{name}.checkpoint")))
+
+    def test_import_normalizes_names(self):
+        # Given
+        with open(self.path("entries.jsonl"), "w") as file:
+            file.write(json.dumps({"user": "ılık ırmak", "subject": "Hi", "message": "There"}) + "\n")
+
+        # When
+        call_command("import_entries", self.path("entries.jsonl"), stdout=StringIO())
+
+        # Then
+        entry = Entry.objects.get(subject="Hi")
+        self.assertEqual(entry.user.name, "Ilık Irmak")
+        self.assertEqual(entry.search_text, "hi\nthere")
+
+    def test_resume_interrupted_export_and_import(self):
+        # Given
+        path = self.path("entries.jsonl.gz")
+        save_checkpoint = export_entries.save_checkpoint
+        calls = []
+
+        def interrupt_after_two_chunks(*args):
+            calls.append(args)
+            if len(calls) > 2:
+                raise KeyboardInterrupt
+            save_checkpoint(*args)
+
+        with patch.object(export_entries, "save_checkpoint", interrupt_after_two_chunks):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("export_entries", path, "--chunk", "2", stdout=StringIO())
+
+        # When
+        call_command("export_entries", path, "--chunk", "2", "--resume", stdout=StringIO())
+        Entry.objects.all().delete()
+        with open(f"{path}.checkpoint", "w") as file:
+            json.dump({"rows": 3}, file)
+        call_command("import_entries", path, "--resume", stdout=StringIO())
+
+        # Then
+        self.assertEqual(self.dump(), self.exported[3:])
+
+
+class TestEntryPartitionMonths(SimpleTestCase):
+    databases = {"default"}
+
+    def test_month_helpers(self):
+        # Given
+        instant = datetime(2026, 12, 31, 23, 30, tzinfo=timezone(timedelta(hours=-3)))
+
+        # When & Then - 02:30 UTC on January 1st
+        self.assertEqual(month_start(instant), datetime(2027, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(
+            add_months(datetime(2026, 11, 1, tzinfo=timezone.utc), 3), datetime(2027, 2, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            add_months(datetime(2026, 1, 1, tzinfo=timezone.utc), -1), datetime(2025, 12, 1, tzinfo=timezone.utc)
+        )
+        self.assertEqual(
+            [
+                partition_name(month)
+                for month in months_between(
+                    datetime(2026, 11, 15, tzinfo=timezone.utc), datetime(2027, 1, 2, tzinfo=timezone.utc)
+                )
+            ],
+            ["entry_entry_p202611", "entry_entry_p202612", "entry_entry_p202701"],
+        )
+
+    def test_command_requires_partitioned_table(self):
+        if connection.vendor == "postgresql" and is_partitioned(connection):
+            self.skipTest("The test database is partitioned (ENTRY_PARTITIONING=1)")
+        with self.assertRaisesMessage(CommandError, "not partitioned"):
+            call_command("partition_entries", stdout=StringIO())
+
+
+@skipUnless(connection.vendor == "postgresql", "Partitioning needs PostgreSQL")
+class TestEntryPartitioning(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create(name="Partition User")
+        self.current = month_start(datetime.now(timezone.utc))
+        self.months = [add_months(self.current, -2), add_months(self.current, -1), self.current]
+        for month in self.months:
+            entry = Entry.objects.create(user=self.user, subject=f"{month:%Y-%m}", message="Message")
+            Entry.objects.filter(pk=entry.pk).update(created_date=month + timedelta(days=1))
+        User.objects.filter(pk=self.user.pk).refresh_entry_summary()
+        self.partition()
+
+    def partition(self):
+        with connection.cursor() as cursor:
+            # ALTER TABLE refuses to run while the deferred foreign key checks of the test's inserts are pending.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        if is_partitioned(connection):
+            # Already partitioned by migration 0006 (ENTRY_PARTITIONING=1), started over from the test's months.
+            convert_to_heap(connection)
+        convert_to_partitioned(connection, premake=1)
+
+    def partition_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT tableoid::regclass::text, subject FROM entry_entry ORDER BY id")
+            return cursor.fetchall()
+
+    def test_convert_keeps_entries_and_api(self):
+        # Then
+        self.assertTrue(is_partitioned(connection))
+        self.assertEqual(sorted(get_partitions(connection)), [*self.months, add_months(self.current, 1)])
+        self.assertEqual(self.partition_rows(), [(partition_name(month), f"{month:%Y-%m}") for month in self.months])
+
+        # When
+        response = self.client.post(
+            reverse("api:v1:entry:entry-list-create"),
+            {"name": "Partition User", "subject": "New", "message": "Message"},
+            format="json",
+        )
+        listed = self.client.get(reverse("api:v1:entry:entry-list-create")).json()
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.partition_rows()[-1], (partition_name(self.current), "New"))
+        self.assertEqual([entry["subject"] for entry in listed["entries"]][0], "New")
+        self.assertEqual(Entry.objects.search(["new"]).count(), 1)
+
+    def test_range_queries_are_pruned(self):
+        # Given
+        since = self.months[1]
+        url = reverse("api:v1:user:list-user-entries", kwargs={"name": "Partition User"})
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, {"since": since.isoformat(), "until": add_months(since, 1).isoformat()})
+        page_query = next(query["sql"] for query in queries if 'FROM "entry_entry"' in query["sql"])
+
+        # When
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN {page_query}")
+            plan = str(cursor.fetchall())
+
+        # Then
+        self.assertIn(partition_name(since), plan)
+        self.assertNotIn(partition_name(self.months[0]), plan)
+        self.assertNotIn(partition_name(self.current), plan)
+
+    @override_settings(ENTRY_COUNT_STRATEGY="counter")
+    def test_maintenance_command(self):
+        # Given - an entry dated past the premade partitions lands in the default partition
+        entry = Entry.objects.create(user=self.user, subject="Future", message="Message")
+        Entry.objects.filter(pk=entry.pk).update(created_date=add_months(self.current, 5))
+        counter = EntryCounter.objects.total()
+
+        # When
+        out = StringIO()
+        call_command("partition_entries", "--premake", "2", "--retention", "2", "--drop", stdout=out)
+
+        # Then
+        partitions = get_partitions(connection)
+        self.assertIn(add_months(self.current, 2), partitions)
+        self.assertIn(add_months(self.current, 5), partitions)
+        self.assertNotIn(self.months[0], partitions)
+        self.assertIn(f"Dropped {partition_name(self.months[0])} (1 entries)", out.getvalue())
+        self.assertIn((partition_name(add_months(self.current, 5)), "Future"), self.partition_rows())
+        self.assertNotIn(self.months[0].strftime("%Y-%m"), [subject for _, subject in self.partition_rows()])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.total_entries, 3)
+        self.assertEqual(EntryCounter.objects.total(), counter - 1)
+
+    def test_convert_back(self):
+        # When
+        convert_to_heap(connection)
+        entry = Entry.objects.create(user=self.user, subject="After", message="Message")
+
+        # Then
+        self.assertFalse(is_partitioned(connection))
+        self.assertEqual(Entry.objects.count(), 4)
+        self.assertGreater(entry.pk, max(Entry.objects.exclude(pk=entry.pk).values_list("pk", flat=True)))
+
+
+@override_settings(ENTRY_INGEST_MODE="buffered", ENTRY_INGEST_QUEUE="local", ENTRY_INGEST_MAX_LATENCY_MS=0)
+class TestEntryBufferedIngest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.url = reverse("api:v1:entry:entry-list-create")
+        cache.clear()
+        user_id_cache.clear()
+        local_queue.clear()
+
+    def flush(self):
+        out = StringIO()
+        call_command("flush_entries", "--once", stdout=out)
+        return out.getvalue()
+
+    def test_create_entry_is_accepted_and_saved_on_flush(self):
+        # Given
+        data = {"name": "ılık ırmak", "subject": "Buffered", "message": "Saved later"}
+
+        # When
+        response = self.client.post(self.url, data=data, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()["subject"], "Buffered")
+        self.assertTrue(response.json()["id"])
+        self.assertFalse(Entry.objects.exists())
+
+        # When
+        output = self.flush()
+
+        # Then
+        self.assertIn("1 entries saved.", output)
+        self.assertEqual(len(local_queue), 0)
+        entry = Entry.objects.get()
+        self.assertEqual(entry.user.name, "Ilık Irmak")
+        self.assertEqual(entry.user.total_entries, 1)
+        self.assertEqual(entry.user.last_entry, "Buffered | Saved later")
+
+    def test_flush_batches_entries(self):
+        # Given
+        for i in range(5):
+            self.client.post(self.url, data={"name": "Test User", "subject": f"S{i}", "message": "M"}, format="json")
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            call_command("flush_entries", "--once", "--batch", "5", stdout=StringIO())
+
+        # Then
+        self.assertEqual(Entry.objects.count(), 5)
+        self.assertEqual(User.objects.get().total_entries, 5)
+        self.assertLess(len(queries), 10)
+
+    def test_create_entry_validation_errors_are_not_queued(self):
+        # When
+        response = self.client.post(self.url, data={"name": "Test User"}, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(local_queue), 0)
+
+    @override_settings(ENTRY_INGEST_MAX_BACKLOG=1, ENTRY_INGEST_RETRY_AFTER=7)
+    def test_create_entry_rejected_when_backlog_is_full(self):
+        # Given
+        data = {"name": "Test User", "subject": "Subject", "message": "Message"}
+        self.client.post(self.url, data=data, format="json")
+
+        # When
+        response = self.client.post(self.url, data=data, format="json")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response["Retry-After"], "7")
+        self.assertEqual(len(local_queue), 1)
+
+    def test_failed_flush_is_redelivered(self):
+        # Given
+        self.client.post(self.url, data={"name": "Test User", "subject": "S", "message": "M"}, format="json")
+        messages = local_queue.read(10)
+
+        # When - the flusher dies before the batch is committed
+        with patch("api.v1.entry.serializers.Entry.objects.bulk_create", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                flush_batch(local_queue, messages)
+
+        # Then - the entry stays pending and the next flusher saves it
+        self.assertEqual(len(local_queue), 1)
+        self.flush()
+        self.assertEqual(Entry.objects.count(), 1)
+        self.assertEqual(len(local_queue), 0)
+
+    def test_refused_entry_is_dead_lettered(self):
+        # Given
+        for subject in ("First", "Refused", "Last"):
+            self.client.post(self.url, data={"name": "Test User", "subject": subject, "message": "M"}, format="json")
+        bulk_create = Entry.objects.bulk_create
+
+        def refuse(entries, *args, **kwargs):
+            if any(entry.subject == "Refused" for entry in entries):
+                raise DataError
+            return bulk_create(entries, *args, **kwargs)
+
+        with patch("api.v1.entry.serializers.Entry.objects.bulk_create", side_effect=refuse):
+            # When
+            with self.assertLogs("api.v1.entry.ingest", "ERROR"):
+                self.flush()
+
+            # Then - the other entries of the batch are saved
+            self.assertEqual(set(Entry.objects.values_list("subject", flat=True)), {"First", "Last"})
+            self.assertEqual(len(local_queue), 1)
+
+            # When - the entry is claimed again until its last delivery
+            with self.assertLogs("api.v1.entry.ingest", "ERROR"):
+                for _ in range(settings.ENTRY_INGEST_MAX_DELIVERIES - 1):
+                    call_command("flush_entries", "--once", "--claim-idle", "0", stdout=StringIO())
+
+        # Then
+        self.assertEqual(len(local_queue), 0)
+        self.assertEqual([item["subject"] for item in local_queue.dead_letters.values()], ["Refused"])
+        self.assertEqual(Entry.objects.count(), 2)
+
+    def test_flusher_takes_over_pending_entries_while_running(self):
+        # Given - another flusher reads an entry and dies while this one is running
+        calls = []
+
+        def collect_batch(queue, size, max_latency):
+            calls.append(max_latency)
+            if len(calls) == 1:
+                self.client.post(self.url, data={"name": "Test User", "subject": "S", "message": "M"}, format="json")
+                local_queue.read(10)
+                return []
+            raise KeyboardInterrupt
+
+        # When
+        with patch("entry.management.commands.flush_entries.collect_batch", side_effect=collect_batch):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command("flush_entries", "--claim-idle", "0", "--max-latency", "10", stdout=StringIO())
+
+        # Then
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Entry.objects.count(), 1)
+        self.assertEqual(len(local_queue), 0)
+
+    def test_redis_queue_read_without_waiting(self):
+        # Given
+        queue = RedisStreamEntryQueue("redis://localhost:6379/0", "entries:test", "entries:test:dead")
+        queue._group_created = True
+
+        # When
+        with patch.object(queue.redis, "xreadgroup", return_value=[]) as xreadgroup:
+            queue.read(10, block_ms=0)
+            queue.read(10, block_ms=5)
+
+        # Then - BLOCK 0 would wait forever
+        self.assertIsNone(xreadgroup.call_args_list[0].kwargs["block"])
+        self.assertEqual(xreadgroup.call_args_list[1].kwargs["block"], 5)
+
+    async def test_async_create_entry_is_accepted(self):
+        # When
+        response = await AsyncClient().post(
+            reverse("api:v1:entry:entry-list-create-async"),
+            data={"name": "Test User", "subject": "Async", "message": "Buffered"},
+            content_type="application/json",
+        )
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(local_queue), 1)
+        self.assertFalse(await Entry.objects.aexists())
+
+
+class TestEntryAsyncAPI(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.async_client = AsyncClient()
+        cache.clear()
+        user_id_cache.clear()
+
+    async def test_list_entries_matches_sync_view(self):
+        # Given
+        user = await User.objects.acreate(name="Test User")
+        for i in range(7):
+            await Entry.objects.acreate(user=user, subject=f"Subject {i+1}", message=f"Message {i+1}")
+        sync_url = reverse("api:v1:entry:entry-list-create")
+        async_url = reverse("api:v1:entry:entry-list-create-async")
+
+        for query in ("", "?page=2", "?page=3", "?page=last"):
+            # When
+            response = await self.async_client.get(f"{async_url}{query}")
+            expected = await sync_to_async(self.client.get)(f"{sync_url}{query}")
+
+            # Then
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content.replace(b"/entries", b"/entries/async"))
+
+    async def test_list_entries_with_cursor(self):
+        # Given
+        user = await User.objects.acreate(name="Test User")
+        for i in range(4):
+            await Entry.objects.acreate(user=user, subject=f"Subject {i+1}", message=f"Message {i+1}")
+
+        # When
+        first_page = (await self.async_client.get(f"{reverse('api:v1:entry:entry-list-create-async')}?cursor=")).json()
+        second_page = (await self.async_client.get(first_page["links"]["next"])).json()
+
+        # Then
+        subjects = [entry["subject"] for entry in first_page["entries"] + second_page["entries"]]
+        self.assertEqual(subjects, ["Subject 4", "Subject 3", "Subject 2", "Subject 1"])
+
+    async def test_list_entries_invalid_page(self):
+        # When
+        response = await self.async_client.get(f"{reverse('api:v1:entry:entry-list-create-async')}?page=2")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def test_create_entry(self):
+        # Given
+        payload = {"name": "john doe", "subject": "Async", "message": "Async message"}
+
+        # When
+        response = await self.async_client.post(
+            reverse("api:v1:entry:entry-list-create-async"), data=payload, content_type="application/json"
+        )
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {"subject": "Async", "message": "Async message"})
+        user = await User.objects.aget(name="John Doe")
+        self.assertEqual(user.total_entries, 1)
+
+    async def test_create_entry_validation_errors(self):
+        # When
+        response = await self.async_client.post(
+            reverse("api:v1:entry:entry-list-create-async"), data={"name": "Test User"}, content_type="application/json"
+        )
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("subject", response.json())
+
+        # When
+        response = await self.async_client.post(
+            reverse("api:v1:entry:entry-list-create-async"), data="{", content_type="application/json"
+        )
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
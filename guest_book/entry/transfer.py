@@ -0,0 +1,90 @@
+"""
+Entry dump files shared by the ``export_entries`` and ``import_entries`` commands.
+
+A dump holds one record per entry with the fields of ``FIELDS``, as JSON lines or CSV with a header, gzipped when
+the path ends with ``.gz``. Exports write the file as a series of independently gzipped chunks, so a resumed export
+can truncate the file back to the last complete chunk and append to it.
+"""
+
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+
+from django.core.management.base import CommandError
+
+FIELDS = ("user", "subject", "message", "created_date")
+FORMATS = ("jsonl", "csv")
+
+
+def is_gzip(path):
+    return str(path).endswith(".gz")
+
+
+def detect_format(path, format=None):
+    """Returns ``format`` or, when it is None, the format named by the extension of ``path`` (JSON lines by default)."""
+    if format is not None:
+        return format
+    path = str(path).removesuffix(".gz")
+    return "csv" if path.endswith(".csv") else "jsonl"
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+def encode_header(format):
+    if format == "csv":
+        return encode_records([FIELDS], format)
+    return b""
+
+
+def encode_records(rows, format):
+    """Encodes ``rows``, tuples of ``FIELDS`` values, as the lines of a dump."""
+    if format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(
+            [value.isoformat() if hasattr(value, "isoformat") else value for value in row] for row in rows
+        )
+        return buffer.getvalue().encode()
+
+    lines = (
+        json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False, default=lambda value: value.isoformat()) for row in rows
+    )
+    return "".join(f"{line}\n" for line in lines).encode()
+
+
+def read_records(path, format):
+    """Yields the records of a dump as dicts, streaming the file."""
+    opener = gzip.open if is_gzip(path) else open
+    with opener(path, "rt", encoding="utf-8", newline="") as file:
+        if format == "csv":
+            yield from csv.DictReader(file)
+            return
+
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f"{path}:{number}: invalid JSON: {exc}")
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        raise CommandError(f"No checkpoint to resume from at {path}.")
+
+
+def save_checkpoint(path, checkpoint):
+    # Replaced atomically, a crash leaves either the previous or the new checkpoint.
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(checkpoint, file)
+    os.replace(f"{path}.tmp", path)
@@ -48,8 +48,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "libs.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
+    "libs.routers.PrimaryStickinessMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -93,14 +95,115 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma separated host[:port] list, each added as a "replicaN" alias with the primary's credentials.
+# Views decorated with libs.routers.read_from_replica read from them, see libs/routers.py. In tests the replicas
+# mirror the test database.
+for index, replica in enumerate(filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+DATABASE_ROUTERS = ["libs.routers.PrimaryReplicaRouter"]
+# Seconds reads stay on the primary after a write, should exceed the replication lag
+DATABASE_REPLICA_LAG = int(os.getenv("DB_REPLICA_LAG", "5"))
+
 # settings.py
 CACHE_URL = os.getenv("CACHE_URL", "redis://127.0.0.1:6379/1")
+# Per-worker in-process tier in front of Redis for the small hot keys (libs/tiered_cache.py): entries kept, 0 disables
+# it, their lifetime in seconds and how often, in milliseconds, each worker checks whether another one wrote.
+CACHE_LOCAL_MAXSIZE = int(os.getenv("CACHE_LOCAL_MAXSIZE", "1000"))
+CACHE_LOCAL_TIMEOUT = int(os.getenv("CACHE_LOCAL_TIMEOUT", "5"))
+CACHE_LOCAL_CHECK_INTERVAL_MS = int(os.getenv("CACHE_LOCAL_CHECK_INTERVAL_MS", "100"))
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "BACKEND": "libs.tiered_cache.TieredRedisCache",
         "LOCATION": CACHE_URL,
+        "OPTIONS": {
+            "LOCAL_MAXSIZE": CACHE_LOCAL_MAXSIZE,
+            "LOCAL_TIMEOUT": CACHE_LOCAL_TIMEOUT,
+            "LOCAL_CHECK_INTERVAL": CACHE_LOCAL_CHECK_INTERVAL_MS / 1000,
+            "LOCAL_KEY_FAMILIES": ["generation", "entry_count"],
+        },
     }
 }
+# Values cached under a write generation (see libs.cache) are invalidated on write, so they can live for hours.
+CACHE_GENERATION_TIMEOUT = int(os.getenv("CACHE_GENERATION_TIMEOUT", str(6 * 60 * 60)))
+# Cached values recomputed by a single request at a time (libs.cache.get_or_refresh): seconds before expiry when
+# the first request refreshes a value early, lifetime of the refresh lock in seconds and how long, in milliseconds,
+# requests finding no value at all wait for the one computing it.
+CACHE_REFRESH_EARLY = int(os.getenv("CACHE_REFRESH_EARLY", "60"))
+CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", "30"))
+CACHE_LOCK_WAIT_MS = int(os.getenv("CACHE_LOCK_WAIT_MS", "2000"))
+
+# How User.total_entries and User.last_entry follow entry writes, see user/summary.py: "sync" updates them in the
+# transaction of each write, "incremental" leaves creations and edits to the refresh_user_summaries command, run
+# every USER_SUMMARY_REFRESH_INTERVAL seconds, which skips the entries of the last USER_SUMMARY_REFRESH_LAG seconds
+# and checks again those of the USER_SUMMARY_REFRESH_OVERLAP seconds before the previous run, committed late.
+USER_SUMMARY_MODE = os.getenv("USER_SUMMARY_MODE", "sync")
+USER_SUMMARY_REFRESH_INTERVAL = int(os.getenv("USER_SUMMARY_REFRESH_INTERVAL", "10"))
+USER_SUMMARY_REFRESH_LAG = int(os.getenv("USER_SUMMARY_REFRESH_LAG", "5"))
+USER_SUMMARY_REFRESH_OVERLAP = int(os.getenv("USER_SUMMARY_REFRESH_OVERLAP", "60"))
+# Characters of "subject | message" kept in User.last_entry, 0 keeps it whole. After changing it, run
+# reconcile_user_summary to cut (or restore) the stored summaries.
+USER_LAST_ENTRY_PREVIEW_LENGTH = int(os.getenv("USER_LAST_ENTRY_PREVIEW_LENGTH", "0"))
+
+# Number of normalized name -> user id pairs kept in memory by each worker
+USER_ID_CACHE_SIZE = int(os.getenv("USER_ID_CACHE_SIZE", "10000"))
+
+# Maximum number of entries accepted by POST /api/v1/entries/batch
+ENTRY_BATCH_MAX_SIZE = int(os.getenv("ENTRY_BATCH_MAX_SIZE", "1000"))
+
+# How EntryPagination gets the total number of entries: "exact" (COUNT(*) cached per entry generation),
+# "counter" (EntryCounter rows updated on every entry write while selected, run reconcile_entry_counter when
+# switching to it) or "estimate" (PostgreSQL planner statistics, falling back to "exact" below
+# ENTRY_COUNT_ESTIMATE_THRESHOLD rows)
+ENTRY_COUNT_STRATEGY = os.getenv("ENTRY_COUNT_STRATEGY", "exact")
+ENTRY_COUNT_ESTIMATE_THRESHOLD = int(os.getenv("ENTRY_COUNT_ESTIMATE_THRESHOLD", "100000"))
+# Number of EntryCounter rows concurrent entry writes are spread over
+ENTRY_COUNTER_SLOTS = int(os.getenv("ENTRY_COUNTER_SLOTS", "8"))
+
+# Number of leading page-number entry pages cached rendered, stored gzipped unless ENTRY_PAGE_CACHE_GZIP is 0
+ENTRY_PAGE_CACHE_PAGES = int(os.getenv("ENTRY_PAGE_CACHE_PAGES", "5"))
+ENTRY_PAGE_CACHE_GZIP = os.getenv("ENTRY_PAGE_CACHE_GZIP", "1") in ["1", "true", "True"]
+
+# Entry ingestion, see api/v1/entry/ingest.py: "sync" saves entries on POST, "buffered" queues them (202)
+# for the flush_entries command. ENTRY_INGEST_QUEUE is "redis" (a Redis stream) or "local" (in-process, tests only).
+ENTRY_INGEST_MODE = os.getenv("ENTRY_INGEST_MODE", "sync")
+ENTRY_INGEST_QUEUE = os.getenv("ENTRY_INGEST_QUEUE", "redis")
+ENTRY_INGEST_REDIS_URL = os.getenv("ENTRY_INGEST_REDIS_URL", CACHE_URL)
+ENTRY_INGEST_STREAM = os.getenv("ENTRY_INGEST_STREAM", "entries:ingest")
+ENTRY_INGEST_FLUSH_SIZE = int(os.getenv("ENTRY_INGEST_FLUSH_SIZE", "500"))
+ENTRY_INGEST_MAX_LATENCY_MS = int(os.getenv("ENTRY_INGEST_MAX_LATENCY_MS", "1000"))
+ENTRY_INGEST_MAX_BACKLOG = int(os.getenv("ENTRY_INGEST_MAX_BACKLOG", "100000"))
+ENTRY_INGEST_RETRY_AFTER = int(os.getenv("ENTRY_INGEST_RETRY_AFTER", "5"))
+# Deliveries after which an entry the database keeps refusing is moved to ENTRY_INGEST_DEAD_LETTER_STREAM
+ENTRY_INGEST_MAX_DELIVERIES = int(os.getenv("ENTRY_INGEST_MAX_DELIVERIES", "5"))
+ENTRY_INGEST_DEAD_LETTER_STREAM = os.getenv("ENTRY_INGEST_DEAD_LETTER_STREAM", f"{ENTRY_INGEST_STREAM}:dead")
+
+# Monthly range partitions of the entry table on PostgreSQL, see entry/partitions.py. Opt-in: applied by migration
+# 0006 when ENTRY_PARTITIONING is 1 at migrate time. partition_entries keeps ENTRY_PARTITION_PREMAKE months created
+# ahead and, when ENTRY_PARTITION_RETENTION_MONTHS is above 0, detaches the months older than that.
+ENTRY_PARTITIONING = os.getenv("ENTRY_PARTITIONING", "0") in ["1", "true", "True"]
+ENTRY_PARTITION_PREMAKE = int(os.getenv("ENTRY_PARTITION_PREMAKE", "3"))
+ENTRY_PARTITION_RETENTION_MONTHS = int(os.getenv("ENTRY_PARTITION_RETENTION_MONTHS", "0"))
+
+# Per-request Server-Timing header and per-route histograms served at /metrics, see libs/metrics.py.
+# Each worker publishes its histograms to the cache every METRICS_PUBLISH_INTERVAL seconds, a worker silent for
+# METRICS_WORKER_TTL seconds is dropped from the totals.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") in ["1", "true", "True"]
+METRICS_PUBLISH_INTERVAL = int(os.getenv("METRICS_PUBLISH_INTERVAL", "10"))
+METRICS_WORKER_TTL = int(os.getenv("METRICS_WORKER_TTL", "3600"))
+# GET /metrics answers requests from METRICS_ALLOWED_IPS (addresses or networks) or carrying
+# "Authorization: Bearer <METRICS_TOKEN>", anything else gets a 403
+METRICS_ALLOWED_IPS = [ip for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip]
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Number of users read and rendered per chunk by GET /api/v1/users?stream=true
+USER_STREAM_CHUNK_SIZE = int(os.getenv("USER_STREAM_CHUNK_SIZE", "2000"))
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -146,6 +249,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # REST Framework
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
+    # JSONRenderer compatible, encodes with orjson when installed
+    "DEFAULT_RENDERER_CLASSES": ("libs.renderers.FastJSONRenderer",),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
@@ -0,0 +1,394 @@
+"""
+Generation based cache invalidation.
+
+Writes bump a per-model generation counter instead of deleting cached values. Cached values are stored under keys
+that embed the current generations, so a bump makes every dependent key unreachable at once and the stale values
+simply expire. This keeps invalidation to a single INCR per write while cached values can live for hours.
+
+Values that are expensive to compute can rather be kept under a stable key along with the generations they were
+computed for (``get_or_refresh``, ``cache_page_by_generation(single_flight=True)``). When a bump or the end of their
+lifetime makes them stale, a single request recomputes them under a refresh lock while the others keep being served
+the previous value, instead of all of them missing and querying the database at once.
+"""
+
+import gzip
+import threading
+import time
+from uuid import uuid4
+from weakref import WeakValueDictionary
+from datetime import datetime, timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers, patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+from django.views.decorators.http import condition
+
+GENERATION_KEY = "generation:{namespace}"
+MODIFIED_KEY = "generation:{namespace}:modified"
+LOCK_KEY = "lock:{key}"
+
+# Same test as django.middleware.gzip.GZipMiddleware.
+ACCEPTS_GZIP = _lazy_re_compile(r"\bgzip\b")
+
+
+def _initial_generation():
+    # Starting from the clock instead of 1 keeps a generation lost on eviction from colliding with earlier values.
+    return int(time.time() * 1000)
+
+
+def get_generation(namespace):
+    """Returns the current generation of ``namespace``, initializing it when missing."""
+    key = GENERATION_KEY.format(namespace=namespace)
+    generation = cache.get(key)
+    if generation is None:
+        generation = _initial_generation()
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+async def aget_generation(namespace):
+    key = GENERATION_KEY.format(namespace=namespace)
+    generation = await cache.aget(key)
+    if generation is None:
+        generation = _initial_generation()
+        if not await cache.aadd(key, generation, timeout=None):
+            generation = await cache.aget(key, generation)
+    return generation
+
+
+def bump_generation(namespace):
+    """Invalidates every value cached under ``namespace``."""
+    key = GENERATION_KEY.format(namespace=namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial_generation(), timeout=None)
+    cache.set(MODIFIED_KEY.format(namespace=namespace), time.time(), timeout=None)
+
+
+def get_last_modified(*namespaces):
+    """Returns the timestamp of the latest bump of any of ``namespaces``, None when it is not known."""
+    modified = cache.get_many([MODIFIED_KEY.format(namespace=namespace) for namespace in namespaces])
+    modified = [timestamp for timestamp in modified.values() if timestamp is not None]
+    if len(modified) < len(namespaces):
+        return None
+    return max(modified)
+
+
+def bump_generation_on_commit(namespace):
+    """Bumps the generation once the current transaction commits, so readers never cache uncommitted state."""
+    transaction.on_commit(lambda: bump_generation(namespace))
+
+
+def get_generations(*namespaces):
+    """Returns the current generations of ``namespaces`` as a single string."""
+    return ".".join(str(get_generation(namespace)) for namespace in namespaces)
+
+
+def generation_key(key, *namespaces):
+    """Returns ``key`` suffixed with the current generation of each of ``namespaces``."""
+    return f"{key}:{get_generations(*namespaces)}"
+
+
+async def ageneration_key(key, *namespaces):
+    generations = ".".join([str(await aget_generation(namespace)) for namespace in namespaces])
+    return f"{key}:{generations}"
+
+
+# Per-process locks standing in for the cache lock, so the threads of a worker don't all race for it.
+_local_locks = WeakValueDictionary()
+_local_locks_guard = threading.Lock()
+
+
+def acquire_refresh_lock(key):
+    """
+    Takes the refresh lock of ``key`` without waiting, across the threads of this process and across workers.
+
+    Returns a function releasing it, or None when another thread or worker holds it. A lock that is never released
+    (e.g. its holder died) expires after ``CACHE_LOCK_TIMEOUT`` seconds.
+    """
+    with _local_locks_guard:
+        local_lock = _local_locks.get(key)
+        if local_lock is None:
+            local_lock = _local_locks[key] = threading.Lock()
+    if not local_lock.acquire(blocking=False):
+        return None
+
+    lock_key, token = LOCK_KEY.format(key=key), uuid4().hex
+    if not cache.add(lock_key, token, timeout=settings.CACHE_LOCK_TIMEOUT):
+        local_lock.release()
+        return None
+
+    released = False
+
+    def release():
+        nonlocal released
+        if released:
+            return
+        released = True
+        # Unless it expired and another worker took it meanwhile.
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+        local_lock.release()
+
+    return release
+
+
+def is_fresh(stored, generations, timeout):
+    """Whether a ``(generations, value, stored_at)`` envelope is current and not yet due for an early refresh."""
+    stored_generations, _, stored_at = stored
+    early = min(settings.CACHE_REFRESH_EARLY, timeout / 2)
+    return stored_generations == generations and time.time() < stored_at + timeout - early
+
+
+def wait_for_fresh(key, generations, timeout):
+    """Polls ``key`` for a fresh envelope for up to ``CACHE_LOCK_WAIT_MS``, returns None if none shows up."""
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT_MS / 1000
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        stored = cache.get(key)
+        if stored is not None and is_fresh(stored, generations, timeout):
+            return stored
+    return None
+
+
+def get_or_refresh(key, namespaces, compute, timeout=None):
+    """
+    Returns the value cached under the stable ``key`` for the current generations of ``namespaces``, computing it
+    with ``compute()`` in a single request at a time.
+
+    Values are kept for ``timeout`` seconds (``CACHE_GENERATION_TIMEOUT`` by default) and refreshed by the first
+    request of their last ``CACHE_REFRESH_EARLY`` seconds. While a value is refreshed, after a bump or early, the
+    other requests get the previous one; only when there is none do they wait up to ``CACHE_LOCK_WAIT_MS`` for it.
+    """
+    timeout = settings.CACHE_GENERATION_TIMEOUT if timeout is None else timeout
+    generations = get_generations(*namespaces)
+    stored = cache.get(key)
+    if stored is not None and is_fresh(stored, generations, timeout):
+        return stored[1]
+
+    release = acquire_refresh_lock(key)
+    if release is None:
+        stored = stored or wait_for_fresh(key, generations, timeout)
+        if stored is not None:
+            return stored[1]
+        # The refresh takes too long, compute it here too rather than failing the request.
+        return compute()
+
+    try:
+        # Refreshed by another worker between the first read and taking the lock.
+        stored = cache.get(key)
+        if stored is not None and is_fresh(stored, generations, timeout):
+            return stored[1]
+        value = compute()
+        cache.set(key, (generations, value, time.time()), timeout)
+        return value
+    finally:
+        release()
+
+
+def condition_by_generation(namespaces):
+    """
+    View decorator answering If-None-Match / If-Modified-Since with 304 until any of ``namespaces`` is bumped.
+
+    The validators are read from the cache only, so an unchanged resource costs neither the view's queries nor its
+    serialization. Responses marked ``outdated`` (see ``cache_page_by_generation``) are sent without them: they
+    describe the current generations, not the body.
+    """
+
+    def get_etag(request, *args, **kwargs):
+        # Weak, the representation may be sent gzipped or not.
+        return f'W/"{generation_key("v", *namespaces)}"'
+
+    def get_last_modified_date(request, *args, **kwargs):
+        modified = get_last_modified(*namespaces)
+        # HTTP dates have a one second resolution: while the second of the last bump lasts, a further bump would
+        # share the same date and If-Modified-Since would miss it, so Last-Modified is only sent once it is over.
+        if modified is None or int(time.time()) <= int(modified):
+            return None
+        return datetime.fromtimestamp(int(modified), tz=timezone.utc)
+
+    def strip_validators(response):
+        if getattr(response, "outdated", False):
+            del response["ETag"]
+            del response["Last-Modified"]
+        return response
+
+    def decorator(view_func):
+        conditional_view = condition(etag_func=get_etag, last_modified_func=get_last_modified_date)(view_func)
+
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                return strip_validators(await conditional_view(request, *args, **kwargs))
+
+            markcoroutinefunction(_wrapped_view)
+        else:
+
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                return strip_validators(conditional_view(request, *args, **kwargs))
+
+        return _wrapped_view
+
+    return decorator
+
+
+def cache_page_by_generation(namespaces, key_prefix, timeout=None, cache_if=None, compress=False, single_flight=False):
+    """
+    View decorator caching the rendered response per URL, invalidated by bumping any of ``namespaces``.
+
+    Unlike ``cache_page`` the TTL does not bound staleness, so ``timeout`` defaults to
+    ``settings.CACHE_GENERATION_TIMEOUT``. ``cache_if(request)`` restricts caching to some requests.
+    With ``compress`` the content is stored gzipped and served as stored to clients accepting gzip.
+
+    With ``single_flight`` the response is stored under a stable key and rendered again by one request at a time,
+    as ``get_or_refresh`` does; the previous response, served meanwhile, is marked as not to be cached by clients.
+    Async views are cached by generation only.
+    """
+
+    def decorator(view_func):
+        def get_cache_key(request):
+            return f"{key_prefix}:{request.build_absolute_uri()}"
+
+        def get_timeout():
+            return settings.CACHE_GENERATION_TIMEOUT if timeout is None else timeout
+
+        def is_cacheable_request(request):
+            return request.method in ("GET", "HEAD") and (cache_if is None or cache_if(request))
+
+        def is_cacheable(response):
+            return response.status_code == 200 and not response.streaming
+
+        def to_cache(response):
+            content = compress_string(response.content) if compress else response.content
+            return content, response["Content-Type"], compress
+
+        def from_cache(request, cached):
+            # Values cached before compression was supported hold no flag.
+            content, content_type, compressed = (*cached, False)[:3]
+            if not compressed:
+                return HttpResponse(content, content_type=content_type)
+
+            if ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")):
+                response = HttpResponse(content, content_type=content_type)
+                response["Content-Encoding"] = "gzip"
+            else:
+                response = HttpResponse(gzip.decompress(content), content_type=content_type)
+            patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+        def finalize(response):
+            if compress:
+                patch_vary_headers(response, ("Accept-Encoding",))
+            return response
+
+        if iscoroutinefunction(view_func):
+
+            @wraps(view_func)
+            async def _wrapped_view(request, *args, **kwargs):
+                if not is_cacheable_request(request):
+                    return await view_func(request, *args, **kwargs)
+
+                key = await ageneration_key(get_cache_key(request), *namespaces)
+                cached = await cache.aget(key)
+                if cached is not None:
+                    return from_cache(request, cached)
+
+                # Async views return rendered responses, the content can be stored right away.
+                response = await view_func(request, *args, **kwargs)
+                if is_cacheable(response):
+                    await cache.aset(key, to_cache(response), get_timeout())
+                return finalize(response)
+
+            markcoroutinefunction(_wrapped_view)
+        elif single_flight:
+
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                if not is_cacheable_request(request):
+                    return view_func(request, *args, **kwargs)
+
+                key, generations = get_cache_key(request), get_generations(*namespaces)
+                stored = cache.get(key)
+                if stored is not None and is_fresh(stored, generations, get_timeout()):
+                    return from_cache(request, stored[1])
+
+                release = acquire_refresh_lock(key)
+                if release is None:
+                    if stored is None:
+                        stored = wait_for_fresh(key, generations, get_timeout())
+                    if stored is not None:
+                        response = from_cache(request, stored[1])
+                        if stored[0] != generations:
+                            # Kept by no client, and stripped of the validators of condition_by_generation, which
+                            # would let a client revalidate the outdated body against the current generations.
+                            add_never_cache_headers(response)
+                            response.outdated = True
+                        return response
+                    release = lambda: None  # noqa: E731
+                else:
+                    # Rendered by another worker between the first read and taking the lock.
+                    stored = cache.get(key)
+                    if stored is not None and is_fresh(stored, generations, get_timeout()):
+                        release()
+                        return from_cache(request, stored[1])
+
+                try:
+                    response = view_func(request, *args, **kwargs)
+                except BaseException:
+                    release()
+                    raise
+                if not is_cacheable(response):
+                    release()
+                    return response
+
+                # Held until the response is rendered and stored.
+                def store(response):
+                    try:
+                        cache.set(key, (generations, to_cache(response), time.time()), get_timeout())
+                    finally:
+                        release()
+
+                if hasattr(response, "render") and callable(response.render):
+                    response.add_post_render_callback(store)
+                else:
+                    store(response)
+                return finalize(response)
+
+        else:
+
+            @wraps(view_func)
+            def _wrapped_view(request, *args, **kwargs):
+                if not is_cacheable_request(request):
+                    return view_func(request, *args, **kwargs)
+
+                key = generation_key(get_cache_key(request), *namespaces)
+                cached = cache.get(key)
+                if cached is not None:
+                    return from_cache(request, cached)
+
+                response = view_func(request, *args, **kwargs)
+                if not is_cacheable(response):
+                    return response
+
+                def store(response):
+                    cache.set(key, to_cache(response), get_timeout())
+
+                if hasattr(response, "render") and callable(response.render):
+                    response.add_post_render_callback(store)
+                else:
+                    store(response)
+                return finalize(response)
+
+        return _wrapped_view
+
+    return decorator
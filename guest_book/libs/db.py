@@ -0,0 +1,96 @@
+import io
+from datetime import datetime
+from itertools import chain
+
+from django.db import connections
+
+# Escapes of the COPY text format.
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def estimate_row_count(model, using="default"):
+    """
+    Returns the planner's estimate of the number of rows of ``model``'s table, or None when there is none.
+
+    Like the planner, the tuple density recorded by the last ANALYZE is scaled to the current size of the table,
+    so the estimate follows inserts made since. A partitioned table is estimated as the sum of its partitions.
+    Only PostgreSQL is supported.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT sum(CASE
+                -- reltuples is -1 for tables never vacuumed or analyzed.
+                WHEN reltuples < 0 THEN NULL
+                WHEN relpages > 0 THEN reltuples / relpages * (pg_relation_size(oid) / current_setting('block_size')::int)
+                ELSE reltuples
+            END)
+            FROM pg_class
+            WHERE relkind = 'r' AND (
+                oid = %s::regclass OR oid IN (SELECT relid FROM pg_partition_tree(%s::regclass) WHERE isleaf)
+            )
+            """,
+            [connection.ops.quote_name(model._meta.db_table)] * 2,
+        )
+        row = cursor.fetchone()
+
+    if row is None or row[0] is None:
+        return None
+    return int(row[0])
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
+
+
+def _columns(connection, model, fields):
+    return ", ".join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+
+
+def copy_rows(model, fields, rows, using="default"):
+    """
+    Loads ``rows``, tuples of values of ``fields``, into ``model``'s table with PostgreSQL's COPY FROM STDIN.
+
+    Skips the ORM and SQL parsing altogether, so no signals are sent and no ``auto_now`` field is filled.
+    Returns the number of rows loaded.
+    """
+    connection = connections[using]
+    buffer = io.StringIO()
+    count = 0
+    for count, row in enumerate(rows, 1):
+        buffer.write("\t".join(map(_copy_value, row)) + "\n")
+    buffer.seek(0)
+
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({_columns(connection, model, fields)}) FROM STDIN", buffer)
+    return count
+
+
+def insert_rows(model, fields, rows, using="default"):
+    """
+    Loads ``rows`` like ``copy_rows`` with multi-row INSERT statements, for backends without COPY. Each statement
+    holds as many rows as the backend accepts query parameters for.
+    """
+    connection = connections[using]
+    model_fields = [model._meta.get_field(field) for field in fields]
+    rows = [[field.get_db_prep_save(value, connection) for field, value in zip(model_fields, row)] for row in rows]
+
+    insert = f"INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({_columns(connection, model, fields)})"
+    placeholders = f"({', '.join(['%s'] * len(fields))})"
+    batch_size = max(connection.ops.bulk_batch_size(model_fields, rows), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start : start + batch_size]
+            cursor.execute(
+                f"{insert} VALUES {', '.join([placeholders] * len(batch))}", list(chain.from_iterable(batch))
+            )
+    return len(rows)
@@ -0,0 +1,403 @@
+"""
+Per-request instrumentation.
+
+``MetricsMiddleware`` measures every request: SQL queries and their time (through a connection execute wrapper),
+cache hits, misses and time (through the ``Instrumented*Cache`` backends, per tier with ``libs.tiered_cache``) and
+the time spent rendering the response (``FastJSONRenderer``). They are sent back in a ``Server-Timing`` header and
+aggregated per route into histograms, exposed in the Prometheus text format by ``metrics_view``.
+
+Each worker aggregates in memory and publishes a snapshot to the cache every ``METRICS_PUBLISH_INTERVAL`` seconds,
+``/metrics`` sums the snapshots of all workers, so any worker can answer the scrape.
+"""
+
+import hmac
+import ipaddress
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+WORKERS_KEY = "metrics:workers"
+WORKER_KEY = "metrics:worker:{worker}"
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HISTOGRAMS = {
+    "guestbook_request_duration_seconds": ("Time spent handling the request.", SECONDS_BUCKETS),
+    "guestbook_db_queries": ("SQL queries run by the request.", QUERIES_BUCKETS),
+    "guestbook_db_duration_seconds": ("Time spent in SQL queries.", SECONDS_BUCKETS),
+    "guestbook_cache_duration_seconds": ("Time spent in cache calls.", SECONDS_BUCKETS),
+    "guestbook_render_duration_seconds": ("Time spent rendering the response body.", SECONDS_BUCKETS),
+}
+CACHE_COUNTER = "guestbook_cache_requests_total"
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Measurements of the current request, shared by the threads serving it (contextvars follow sync_to_async)."""
+
+    __slots__ = (
+        "db_queries",
+        "db_time",
+        "cache_hits",
+        "cache_misses",
+        "local_hits",
+        "local_misses",
+        "cache_time",
+        "cache_keys",
+        "render_time",
+        "in_cache",
+    )
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        # Reads answered by the shared cache (Redis)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # Reads answered by the in-process tier of libs.tiered_cache, its misses fall through to the shared cache
+        self.local_hits = 0
+        self.local_misses = 0
+        self.cache_time = 0.0
+        # (key family, tier) -> [hits, misses], the family is the key up to its first colon, e.g. "entry_count"
+        self.cache_keys = {}
+        self.render_time = 0.0
+        self.in_cache = False
+
+    def count_cache(self, key, hit, tier="shared"):
+        counts = self.cache_keys.setdefault((str(key).split(":", 1)[0], tier), [0, 0])
+        counts[0 if hit else 1] += 1
+        if tier == "local":
+            self.local_hits += hit
+            self.local_misses += not hit
+        else:
+            self.cache_hits += hit
+            self.cache_misses += not hit
+
+
+@contextmanager
+def measure_render():
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.render_time += time.perf_counter() - started
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_db_execute_wrapper(connection, **kwargs):
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    """
+    Cache backend mixin timing calls and counting hits and misses for the current request.
+
+    Calls made by another cache method (e.g. ``get_many`` falling back to ``get``) are only measured and counted once.
+    """
+
+    def _measure(self, method, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics.in_cache:
+            return method(*args, **kwargs)
+        metrics.in_cache = True
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.cache_time += time.perf_counter() - started
+            metrics.in_cache = False
+
+    def _count(self, keys, hit, tier="shared"):
+        metrics = _current.get()
+        if metrics is not None and not metrics.in_cache:
+            for key in keys:
+                metrics.count_cache(key, hit(key), tier)
+
+    def get(self, key, default=None, version=None):
+        value = self._measure(super().get, key, _MISSING, version)
+        self._count([key], lambda key: value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self._measure(super().get_many, keys, version)
+        self._count(keys, lambda key: key in values)
+        return values
+
+    def set(self, *args, **kwargs):
+        return self._measure(super().set, *args, **kwargs)
+
+    def add(self, *args, **kwargs):
+        return self._measure(super().add, *args, **kwargs)
+
+    def incr(self, *args, **kwargs):
+        return self._measure(super().incr, *args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._measure(super().delete, *args, **kwargs)
+
+    def set_many(self, *args, **kwargs):
+        return self._measure(super().set_many, *args, **kwargs)
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    pass
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket plus +Inf, not cumulative.
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Per-route histograms and cache counters of one worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.published = 0.0
+
+    def observe(self, route, metrics, duration):
+        values = {
+            "guestbook_request_duration_seconds": duration,
+            "guestbook_db_queries": metrics.db_queries,
+            "guestbook_db_duration_seconds": metrics.db_time,
+            "guestbook_cache_duration_seconds": metrics.cache_time,
+            "guestbook_render_duration_seconds": metrics.render_time,
+        }
+        with self.lock:
+            for name, value in values.items():
+                key = (name, route)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+            for (family, tier), (hits, misses) in metrics.cache_keys.items():
+                for result, count in (("hit", hits), ("miss", misses)):
+                    if count:
+                        key = (route, family, tier, result)
+                        self.counters[key] = self.counters.get(key, 0) + count
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "histograms": {key: (list(h.counts), h.sum) for key, h in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+
+    def clear(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.published = 0.0
+
+
+registry = Registry()
+worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def is_publish_due():
+    return time.time() - registry.published >= settings.METRICS_PUBLISH_INTERVAL
+
+
+def publish(force=False):
+    """Stores this worker's snapshot in the cache, at most every ``METRICS_PUBLISH_INTERVAL`` seconds."""
+    if not force and not is_publish_due():
+        return
+    now = registry.published = time.time()
+
+    ttl = settings.METRICS_WORKER_TTL
+    cache.set(WORKER_KEY.format(worker=worker_id), registry.snapshot(), timeout=ttl)
+    # Concurrent publishers may drop each other from the index, they add themselves back on their next publish.
+    workers = {worker: seen for worker, seen in (cache.get(WORKERS_KEY) or {}).items() if now - seen < ttl}
+    workers[worker_id] = now
+    cache.set(WORKERS_KEY, workers, timeout=ttl)
+
+
+def collect():
+    """Sums the published snapshots of all live workers."""
+    publish(force=True)
+    workers = cache.get(WORKERS_KEY) or {}
+    snapshots = cache.get_many([WORKER_KEY.format(worker=worker) for worker in workers])
+
+    histograms, counters = {}, {}
+    for snapshot in snapshots.values():
+        for key, (counts, total) in snapshot["histograms"].items():
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+        for key, count in snapshot["counters"].items():
+            counters[key] = counters.get(key, 0) + count
+    return histograms, counters
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def render_prometheus(histograms, counters):
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (histogram_name, route), (counts, total) in sorted(histograms.items()):
+            if histogram_name != name:
+                continue
+            route = _label(route)
+            cumulative = 0
+            for bound, count in zip((*map(_format_bound, buckets), "+Inf"), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_sum{{route="{route}"}} {total!r}')
+            lines.append(f'{name}_count{{route="{route}"}} {cumulative}')
+
+    lines += [f"# HELP {CACHE_COUNTER} Cache reads by key family and tier.", f"# TYPE {CACHE_COUNTER} counter"]
+    for (route, family, tier, result), count in sorted(counters.items()):
+        labels = f'route="{_label(route)}",key="{_label(family)}",tier="{tier}",result="{result}"'
+        lines.append(f"{CACHE_COUNTER}{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def is_scraper(request):
+    """Returns whether ``request`` carries the ``METRICS_TOKEN`` bearer token or comes from ``METRICS_ALLOWED_IPS``."""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if hmac.compare_digest(request.headers.get("Authorization", "").encode(), expected.encode()):
+            return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(allowed, strict=False) for allowed in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """Serves the aggregated metrics of all workers in the Prometheus text format."""
+    if not is_scraper(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(*collect()), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def server_timing(metrics, duration):
+    timings = [
+        f'db;dur={metrics.db_time * 1000:.2f};desc="{metrics.db_queries} queries"',
+        f'cache;dur={metrics.cache_time * 1000:.2f};desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+    ]
+    if metrics.local_hits or metrics.local_misses:
+        # Its time is part of the cache duration above.
+        timings.append(f'cache-local;desc="{metrics.local_hits} hits, {metrics.local_misses} misses"')
+    timings += [f"render;dur={metrics.render_time * 1000:.2f}", f"total;dur={duration * 1000:.2f}"]
+    return ", ".join(timings)
+
+
+class MetricsMiddleware:
+    """
+    Measures each request, adds the ``Server-Timing`` header and records the measurements under the route.
+
+    Place it first in MIDDLEWARE so the total covers the other middlewares. Streamed bodies are produced after the
+    response leaves the middleware, their queries are not counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+        connection_created.connect(install_db_execute_wrapper, dispatch_uid="metrics_execute_wrapper")
+        for connection in connections.all(initialized_only=True):
+            install_db_execute_wrapper(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            _current.reset(token)
+
+        self.record(request, response, metrics, duration)
+        publish()
+        return response
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            duration = time.perf_counter() - started
+            _current.reset(token)
+
+        self.record(request, response, metrics, duration)
+        # The cache is written from a thread, only when the snapshot is due.
+        if is_publish_due():
+            await sync_to_async(publish)()
+        return response
+
+    def record(self, request, response, metrics, duration):
+        response["Server-Timing"] = server_timing(metrics, duration)
+        match = request.resolver_match
+        registry.observe(match.route if match is not None else "<unmatched>", metrics, duration)
@@ -1,3 +1,10 @@
+import re
+from functools import lru_cache
+
+# Turkish letters mapped to their base letter for search, so "ılık", "ilik" and "ILIK" all match.
+SEARCH_FOLD_TABLE = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+
+
 class turkish_str(str):  # noqa
     CHARMAP = {
         "to_upper": {
@@ -9,22 +16,51 @@ class turkish_str(str):  # noqa
             "İ": "i",
         },
     }
+    # Precomputed once; for two code points chained str.replace is faster than str.translate in CPython.
+    UPPER_PAIRS = tuple(CHARMAP["to_upper"].items())
+    LOWER_PAIRS = tuple(CHARMAP["to_lower"].items())
 
     def lower(self):
-        for key, value in self.CHARMAP.get("to_lower").items():
-            self = self.replace(key, value)
-
-        return self.lower()
+        return _lower(self)
 
     def upper(self):
-        for key, value in self.CHARMAP.get("to_upper").items():
-            self = self.replace(key, value)
-
-        return self.upper()
+        return _upper(self)
 
     def capitalize(self):
-        first, rest = self[0], self[1:]
-        return turkish_str(first).upper() + turkish_str(rest).lower()
+        return _upper(self[:1]) + _lower(self[1:])
 
     def title(self):
-        return " ".join(map(lambda x: turkish_str(x).capitalize(), self.split()))
+        return _title(str(self))
+
+
+def _lower(value):
+    for key, replacement in turkish_str.LOWER_PAIRS:
+        value = value.replace(key, replacement)
+    return str.lower(value)
+
+
+def _upper(value):
+    for key, replacement in turkish_str.UPPER_PAIRS:
+        value = value.replace(key, replacement)
+    return str.upper(value)
+
+
+@lru_cache(maxsize=8192)
+def _title(value):
+    # Memoized, guest names repeat a lot.
+    return " ".join([_upper(word[:1]) + _lower(word[1:]) for word in value.split()])
+
+
+def normalize_many(names):
+    """Returns the Turkish title-cased form of each of ``names``, as ``turkish_str(name).title()`` would."""
+    return [_title(str(name)) for name in names]
+
+
+def fold_search(text):
+    """Lower-cases ``text`` with Turkish rules and drops Turkish diacritics, the form entries are indexed in."""
+    return _lower(str(text)).translate(SEARCH_FOLD_TABLE)
+
+
+def search_terms(query):
+    """Splits a search query into folded words."""
+    return re.findall(r"\w+", fold_search(query))
@@ -0,0 +1,32 @@
+import time
+
+
+class Progress:
+    """Counts processed rows and prints ``done/total label (rate/s)`` to ``stdout`` at most every ``interval`` s."""
+
+    def __init__(self, stdout, label, total=None, interval=1):
+        self.stdout = stdout
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.started = self.reported = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        return self.done / (self.elapsed or 1)
+
+    def update(self, count):
+        self.done += count
+        now = time.monotonic()
+        if now - self.reported >= self.interval or self.done == self.total:
+            self.reported = now
+            total = "" if self.total is None else f"/{self.total}"
+            self.stdout.write(f"{self.done}{total} {self.label} ({self.rate:.0f}/s)")
+
+    def summary(self):
+        return f"{self.done} {self.label} in {self.elapsed:.1f}s ({self.rate:.0f}/s)"
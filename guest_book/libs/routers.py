@@ -0,0 +1,127 @@
+"""
+Primary/replica database routing.
+
+Every query goes to the primary (``default``) unless it runs inside ``replica_reads()``, in which case reads go to
+one of ``settings.DATABASE_REPLICAS``. Views opt in with ``read_from_replica``, which keeps reads on the primary
+for ``DATABASE_REPLICA_LAG`` seconds after a write:
+
+- to the client that made it, through the cookie set by ``PrimaryStickinessMiddleware``, so its own writes don't
+  seem to vanish;
+- to everyone, from the last generation bump of the view's namespaces, so a page cached by generation is never
+  rendered from a replica still missing the write that bumped it.
+"""
+
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from libs.cache import get_last_modified
+
+PRIMARY = "default"
+STICKY_COOKIE = "primary_until"
+
+_replica_reads = ContextVar("replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Sends the reads made inside the block to a replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and _replica_reads.get():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # Explicit, as Django would otherwise write an instance back to the replica it was read from.
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas follow the primary's schema through replication.
+        return db not in settings.DATABASE_REPLICAS
+
+
+def can_read_from_replica(request, namespaces):
+    if not settings.DATABASE_REPLICAS or getattr(request, "pinned_to_primary", False):
+        return False
+    # Unknown when the namespaces were last written: stay on the primary.
+    modified = get_last_modified(*namespaces)
+    return modified is not None and time.time() - modified >= settings.DATABASE_REPLICA_LAG
+
+
+def read_from_replica(namespaces):
+    """
+    View decorator serving GET and HEAD requests from a replica, unless ``namespaces`` or the client wrote recently.
+
+    Place it below the cache decorators, so responses served from the cache don't check anything. Queries made
+    after the view returns (streamed bodies) run on the primary.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD") or not can_read_from_replica(request, namespaces):
+                return view_func(request, *args, **kwargs)
+            with replica_reads():
+                return view_func(request, *args, **kwargs)
+
+        return _wrapped_view
+
+    return decorator
+
+
+class PrimaryStickinessMiddleware:
+    """Pins a client to the primary for ``DATABASE_REPLICA_LAG`` seconds after each of its successful writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Runs in the handler's mode, so async views are not moved to a thread for this middleware.
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        self.process_request(request)
+        return self.process_response(request, await self.get_response(request))
+
+    def process_request(self, request):
+        try:
+            pinned_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        request.pinned_to_primary = pinned_until > time.time()
+
+    def process_response(self, request, response):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and response.status_code < 400
+        ):
+            lag = settings.DATABASE_REPLICA_LAG
+            # Only tells which database this client reads from, there is nothing to gain by forging it.
+            response.set_cookie(STICKY_COOKIE, str(time.time() + lag), max_age=lag, httponly=True, samesite="Lax")
+        return response
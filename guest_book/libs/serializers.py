@@ -0,0 +1,34 @@
+from functools import cache
+
+
+class ValuesSerializerMixin:
+    """
+    Read fast path for flat, read only serializers whose fields are plain model columns.
+
+    ``serialize_values`` fetches the ``source`` of each field with ``values_list`` and zips the rows into dicts,
+    skipping model instantiation and the per field ``to_representation`` calls. The output equals ``.data`` as
+    long as every field represents its column value unchanged (CharField of a text column, IntegerField of an
+    integer column, ...).
+    """
+
+    @classmethod
+    @cache
+    def get_values_fields(cls):
+        """Returns the field names and the matching ``values_list`` lookups."""
+        fields = cls()._readable_fields
+        names, lookups = zip(*[(field.field_name, field.source.replace(".", "__")) for field in fields])
+        return names, lookups
+
+    @classmethod
+    def values_queryset(cls, queryset, *extra):
+        """Returns ``queryset`` as ``values_list`` rows of the ``extra`` lookups followed by the fields."""
+        return queryset.values_list(*extra, *cls.get_values_fields()[1])
+
+    @classmethod
+    def from_values(cls, rows):
+        names = cls.get_values_fields()[0]
+        return [dict(zip(names, row)) for row in rows]
+
+    @classmethod
+    def serialize_values(cls, queryset):
+        return cls.from_values(cls.values_queryset(queryset))
@@ -0,0 +1,477 @@
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from asgiref.sync import iscoroutinefunction
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from entry.models import Entry
+from libs.cache import LOCK_KEY, MODIFIED_KEY, acquire_refresh_lock, bump_generation, get_or_refresh
+from libs.db import insert_rows
+from libs.metrics import RequestMetrics, _current, registry
+from libs.normalize import fold_search, normalize_many, search_terms, turkish_str
+from libs.renderers import FastJSONRenderer
+from libs.tiered_cache import TieredLocMemCache
+from libs.routers import (
+    STICKY_COOKIE,
+    PrimaryReplicaRouter,
+    PrimaryStickinessMiddleware,
+    can_read_from_replica,
+    replica_reads,
+)
+from user.models import User
+
+
+class TestTurkishStr(SimpleTestCase):
+    def test_lower(self):
+        self.assertEqual(turkish_str("IĞDIR").lower(), "ığdır")
+        self.assertEqual(turkish_str("İSTANBUL").lower(), "istanbul")
+        self.assertEqual(turkish_str("Iİiı").lower(), "ıiiı")
+
+    def test_upper(self):
+        self.assertEqual(turkish_str("ığdır").upper(), "IĞDIR")
+        self.assertEqual(turkish_str("istanbul").upper(), "İSTANBUL")
+        self.assertEqual(turkish_str("Iİiı").upper(), "IİİI")
+
+    def test_capitalize(self):
+        self.assertEqual(turkish_str("ılık").capitalize(), "Ilık")
+        self.assertEqual(turkish_str("iNCİ").capitalize(), "İnci")
+        self.assertEqual(turkish_str("").capitalize(), "")
+
+    def test_title(self):
+        # Given
+        names = ["ılık ırmak", "İSMAİL IŞIK", "john  doe", "Test User 🎉", " çiğdem   şule "]
+        expected = ["Ilık Irmak", "İsmail Işık", "John Doe", "Test User 🎉", "Çiğdem Şule"]
+
+        # When & Then
+        self.assertEqual([turkish_str(name).title() for name in names], expected)
+        self.assertEqual([turkish_str(name).title() for name in names], expected)  # served from the memo
+
+    def test_normalize_many(self):
+        # Given
+        names = ["ılık ırmak", turkish_str("İSMAİL IŞIK"), "ılık ırmak"]
+
+        # When & Then
+        self.assertEqual(normalize_many(names), [turkish_str(name).title() for name in names])
+        self.assertEqual(normalize_many(iter([])), [])
+
+    def test_fold_search(self):
+        self.assertEqual(fold_search("ILIK IRMAK"), "ilik irmak")
+        self.assertEqual(fold_search("İSTANBUL"), "istanbul")
+        self.assertEqual(fold_search("Çiğdem Şule Öğüt"), "cigdem sule ogut")
+        self.assertEqual(fold_search(turkish_str("ılık").upper()), fold_search("ılık"))
+
+    def test_search_terms(self):
+        self.assertEqual(search_terms("  Işık, ÇAY & simit! "), ["isik", "cay", "simit"])
+        self.assertEqual(search_terms("-- !"), [])
+
+
+class TestFastJSONRenderer(SimpleTestCase):
+    data = {
+        "users": ReturnList(
+            [
+                {"username": turkish_str("Ilık Irmak"), "total_entries": 3, "last_entry": "Çay | \u2028line\u2029"},
+                {"username": 'John 🎉 "Doe"', "total_entries": 0, "last_entry": None},
+            ],
+            serializer=None,
+        ),
+        "created": datetime(2026, 1, 2, 3, 4, 5, 600, tzinfo=timezone.utc),
+        "price": Decimal("1.50"),
+        "lazy": gettext_lazy("Not found."),
+        "ratio": 0.1,
+        "flags": [True, False],
+    }
+
+    def test_render_matches_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_render_without_orjson(self):
+        with patch("libs.renderers.orjson", None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_render_indented(self):
+        media_type = "application/json; indent=2"
+        self.assertEqual(FastJSONRenderer().render(self.data, media_type), JSONRenderer().render(self.data, media_type))
+
+
+@override_settings(CACHES={"default": {"BACKEND": "libs.metrics.InstrumentedLocMemCache"}})
+class TestMetrics(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        user = User.objects.create(name="Metrics User")
+        Entry.objects.create(user=user, subject="Subject", message="Message")
+
+    def test_server_timing(self):
+        # Given
+        url = reverse("api:v1:user:list-users")
+
+        # When
+        cold = self.client.get(url)
+        warm = self.client.get(url)
+
+        # Then
+        self.assertRegex(cold["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(cold["Server-Timing"], r'cache;dur=[\d.]+;desc="\d+ hits, [1-9]\d* misses"')
+        self.assertRegex(cold["Server-Timing"], r"render;dur=[\d.]+, total;dur=[\d.]+$")
+        # The warm request is served from the page cache.
+        self.assertIn('desc="0 queries"', warm["Server-Timing"])
+
+    def test_metrics_endpoint(self):
+        # Given
+        self.client.get(reverse("api:v1:user:list-users"))
+        self.client.get(reverse("api:v1:entry:entry-list-create"))
+
+        # When
+        response = self.client.get(reverse("metrics"))
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        content = response.content.decode()
+        self.assertIn("# TYPE guestbook_request_duration_seconds histogram", content)
+        self.assertIn('guestbook_request_duration_seconds_count{route="api/v1/users"} 1', content)
+        self.assertIn('guestbook_db_queries_bucket{route="api/v1/entries",le="+Inf"} 1', content)
+        self.assertIn(
+            # Read again under the refresh lock.
+            'guestbook_cache_requests_total{route="api/v1/entries",key="entry_count",tier="shared",result="miss"} 2',
+            content,
+        )
+        self.assertIn(
+            'guestbook_cache_requests_total{route="api/v1/users",key="users",tier="shared",result="miss"} 2', content
+        )
+
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1", "10.0.0.0/8"], METRICS_TOKEN="scrape-token")
+    def test_metrics_endpoint_access(self):
+        # When & Then
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3").status_code, 200)
+        self.assertEqual(self.client.get(reverse("metrics"), REMOTE_ADDR="203.0.113.5").status_code, 403)
+        response = self.client.get(
+            reverse("metrics"), REMOTE_ADDR="203.0.113.5", headers={"Authorization": "Bearer scrape-token"}
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse("metrics"), REMOTE_ADDR="203.0.113.5", headers={"Authorization": "Bearer wrong"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(DEBUG=True)
+    async def test_server_timing_async(self):
+        # When - no middleware is adapted, which Django logs in DEBUG, so the async view is not moved to a thread
+        with self.assertNoLogs("django.request", "DEBUG"):
+            response = await AsyncClient().get(reverse("api:v1:user:list-users-async"))
+
+        # Then
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        self.assertRegex(response["Server-Timing"], r"render;dur=[\d.]+, total;dur=[\d.]+$")
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "libs.tiered_cache.TieredLocMemCache", "OPTIONS": {"LOCAL_CHECK_INTERVAL": 60}}}
+    )
+    def test_server_timing_local_tier(self):
+        # Given
+        url = reverse("api:v1:user:list-users")
+        self.client.get(url)
+
+        # When
+        response = self.client.get(url)
+
+        # Then - the generations are read from the worker's memory
+        self.assertRegex(response["Server-Timing"], r'cache-local;desc="[1-9]\d* hits, \d+ misses"')
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        # When
+        response = self.client.get(reverse("api:v1:user:list-users"))
+
+        # Then
+        self.assertNotIn("Server-Timing", response)
+
+
+class TestRefreshLock(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_single_holder(self):
+        # When
+        release = acquire_refresh_lock("key")
+
+        # Then - the other threads of the process are turned away before reaching the cache
+        with patch("libs.cache.cache.add") as add:
+            self.assertIsNone(acquire_refresh_lock("key"))
+        add.assert_not_called()
+        release()
+        release()
+        self.assertIsNone(cache.get(LOCK_KEY.format(key="key")))
+        self.assertIsNotNone(acquire_refresh_lock("key"))
+
+    def test_held_by_another_worker(self):
+        # Given
+        cache.add(LOCK_KEY.format(key="key"), "other")
+
+        # When & Then
+        self.assertIsNone(acquire_refresh_lock("key"))
+        cache.clear()
+        self.assertIsNotNone(acquire_refresh_lock("key"))
+
+    @override_settings(CACHE_REFRESH_EARLY=60)
+    def test_get_or_refresh(self):
+        # Given
+        computed = []
+
+        def compute():
+            computed.append(len(computed) + 1)
+            return computed[-1]
+
+        # When & Then - computed once per generation
+        self.assertEqual(get_or_refresh("value", ("test",), compute, timeout=600), 1)
+        self.assertEqual(get_or_refresh("value", ("test",), compute, timeout=600), 1)
+        bump_generation("test")
+        self.assertEqual(get_or_refresh("value", ("test",), compute, timeout=600), 2)
+
+        # When & Then - in its last minute, the value is refreshed by the request taking the lock, the others get it
+        # as it is meanwhile
+        with patch("libs.cache.time.time", return_value=time.time() + 550):
+            cache.add(LOCK_KEY.format(key="value"), "other")
+            self.assertEqual(get_or_refresh("value", ("test",), compute, timeout=600), 2)
+            cache.delete(LOCK_KEY.format(key="value"))
+            self.assertEqual(get_or_refresh("value", ("test",), compute, timeout=600), 3)
+        self.assertEqual(computed, [1, 2, 3])
+
+    @override_settings(CACHE_LOCK_WAIT_MS=100)
+    def test_get_or_refresh_without_value(self):
+        # Given - no value at all and another worker computing it
+        cache.add(LOCK_KEY.format(key="value"), "other")
+
+        # When & Then - waits for it, then computes it without storing it
+        self.assertEqual(get_or_refresh("value", ("test",), lambda: 1), 1)
+        self.assertIsNone(cache.get("value"))
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], DATABASE_REPLICA_LAG=5)
+class TestPrimaryReplicaRouter(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = PrimaryReplicaRouter()
+        self.request = RequestFactory().get("/api/v1/entries")
+
+    def settle(self, *namespaces, seconds=60):
+        for namespace in namespaces:
+            cache.set(MODIFIED_KEY.format(namespace=namespace), time.time() - seconds)
+
+    def test_routing(self):
+        # When & Then
+        self.assertEqual(self.router.db_for_read(Entry), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Entry), "replica1")
+            self.assertEqual(self.router.db_for_write(Entry), "default")
+        self.assertFalse(self.router.allow_migrate("replica1", "entry"))
+        self.assertTrue(self.router.allow_migrate("default", "entry"))
+
+    def test_can_read_from_replica(self):
+        # When & Then - never written, or written within the lag
+        self.assertFalse(can_read_from_replica(self.request, ("entry", "user")))
+        bump_generation("entry")
+        self.settle("user")
+        self.assertFalse(can_read_from_replica(self.request, ("entry", "user")))
+
+        # When & Then - settled
+        self.settle("entry", "user")
+        self.assertTrue(can_read_from_replica(self.request, ("entry", "user")))
+
+        # When & Then - the client wrote recently
+        self.request.pinned_to_primary = True
+        self.assertFalse(can_read_from_replica(self.request, ("entry", "user")))
+
+    def test_write_pins_client_to_primary(self):
+        # Given
+        url = reverse("api:v1:entry:entry-list-create")
+        self.settle("entry", "user")
+
+        # When
+        response = self.client.post(url, {"name": "Sticky", "subject": "S", "message": "M"}, "application/json")
+
+        # Then - the cookie outlives the lag by no more than the write took
+        self.assertEqual(response.status_code, 201)
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+        self.assertAlmostEqual(float(cookie.value), time.time() + 5, delta=1)
+
+        # When - reads right after the write stay on the primary, whatever the write generation says
+        self.settle("entry", "user")
+        with CaptureQueriesContext(connections["default"]) as queries:
+            listed = self.client.get(url, {"page": 9})
+
+        # Then
+        self.assertEqual(listed.status_code, 404)
+        self.assertTrue(queries)
+
+    async def test_stickiness_middleware_async(self):
+        # Given
+        async def get_response(request):
+            return HttpResponse(status=201)
+
+        middleware = PrimaryStickinessMiddleware(get_response)
+        request = RequestFactory().post("/api/v1/entries")
+        request.COOKIES[STICKY_COOKIE] = str(time.time() + 5)
+
+        # When
+        response = await middleware(request)
+
+        # Then - called as a coroutine, without a thread in between
+        self.assertTrue(iscoroutinefunction(middleware))
+        self.assertTrue(request.pinned_to_primary)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_list_views_read_from_replica(self):
+        # Given - the primary stands in for the replica, whose choice tells the reads were routed
+        User.objects.create(name="Replica User")
+        self.settle("entry", "user")
+
+        for url in (reverse("api:v1:entry:entry-list-create"), reverse("api:v1:user:list-users")):
+            with self.subTest(url), override_settings(DATABASE_REPLICAS=["default"]):
+                # When
+                with patch("libs.routers.random.choice", return_value="default") as choice:
+                    response = self.client.get(url)
+
+                # Then
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(choice.called)
+
+
+class TestTieredCache(SimpleTestCase):
+    def setUp(self):
+        # Two workers sharing a cache: local memory caches of the same LOCATION share their storage.
+        options = {"LOCAL_MAXSIZE": 10, "LOCAL_TIMEOUT": 5, "LOCAL_CHECK_INTERVAL": 60, "LOCAL_KEY_FAMILIES": ["hot"]}
+        self.worker1 = TieredLocMemCache("tiered", {"OPTIONS": options})
+        self.worker2 = TieredLocMemCache("tiered", {"OPTIONS": options})
+        self.worker1.clear()
+        self.metrics = RequestMetrics()
+        token = _current.set(self.metrics)
+        self.addCleanup(_current.reset, token)
+
+    def test_local_hits(self):
+        # Given
+        self.worker1.set("hot:1", "a")
+        self.worker1.set("cold:1", "b")
+
+        # When
+        values = [self.worker2.get("hot:1"), self.worker2.get("hot:1"), self.worker2.get("cold:1")]
+
+        # Then - the second read of the hot key never reaches the shared cache
+        self.assertEqual(values, ["a", "a", "b"])
+        self.assertEqual(self.metrics.cache_keys[("hot", "local")], [1, 1])
+        self.assertEqual(self.metrics.cache_keys[("hot", "shared")], [1, 0])
+        self.assertEqual(self.metrics.cache_keys[("cold", "shared")], [1, 0])
+        self.assertNotIn(("cold", "local"), self.metrics.cache_keys)
+        self.assertEqual((self.metrics.local_hits, self.metrics.local_misses), (1, 1))
+
+    def test_get_many(self):
+        # Given
+        self.worker1.set_many({"hot:1": 1, "hot:2": 2, "cold:1": 3})
+        self.worker2.get("hot:1")
+
+        # When
+        values = self.worker2.get_many(["hot:1", "hot:2", "hot:3", "cold:1"])
+
+        # Then
+        self.assertEqual(values, {"hot:1": 1, "hot:2": 2, "cold:1": 3})
+        self.assertEqual(self.metrics.cache_keys[("hot", "local")], [1, 3])
+        self.assertEqual(self.worker2.get_many(["hot:2"]), {"hot:2": 2})
+        self.assertEqual(self.metrics.cache_keys[("hot", "local")], [2, 3])
+
+    def test_write_invalidates(self):
+        # Given
+        self.worker1.set("hot:1", 1)
+        self.worker1.get("hot:1")
+        self.worker2.get("hot:1")
+
+        # When
+        self.worker1.incr("hot:1")
+
+        # Then - the writer drops its copy at once, the other worker on its next version check
+        self.assertEqual(self.worker1.get("hot:1"), 2)
+        self.assertEqual(self.worker2.get("hot:1"), 1)
+        with patch("libs.tiered_cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertEqual(self.worker2.get("hot:1"), 2)
+
+    def test_write_keeps_other_families(self):
+        # Given
+        worker1 = TieredLocMemCache(
+            "tiered", {"OPTIONS": {"LOCAL_CHECK_INTERVAL": 0, "LOCAL_KEY_FAMILIES": ["hot", "warm"]}}
+        )
+        worker2 = TieredLocMemCache(
+            "tiered", {"OPTIONS": {"LOCAL_CHECK_INTERVAL": 0, "LOCAL_KEY_FAMILIES": ["hot", "warm"]}}
+        )
+        worker1.set_many({"hot:1": 1, "warm:1": 1})
+        worker2.get_many(["hot:1", "warm:1"])
+
+        # When
+        worker1.set("warm:1", 2)
+        values = worker2.get_many(["hot:1", "warm:1"])
+
+        # Then - only the written family is read again from the shared cache
+        self.assertEqual(values, {"hot:1": 1, "warm:1": 2})
+        self.assertEqual(self.metrics.cache_keys[("hot", "local")], [1, 1])
+        self.assertEqual(self.metrics.cache_keys[("warm", "local")], [0, 2])
+
+    def test_local_timeout(self):
+        # Given
+        self.worker1.set("hot:1", 1, timeout=None)
+        self.worker2.get("hot:1")
+        self.worker1.delete("hot:1")
+
+        # When & Then - the local copy expires even without a version check
+        self.assertEqual(self.worker2.get("hot:1"), 1)
+        with patch("libs.tiered_cache.time.monotonic", return_value=time.monotonic() + 6):
+            self.worker2._local_checked = time.monotonic() + 6
+            self.assertIsNone(self.worker2.get("hot:1"))
+
+    def test_disabled(self):
+        # Given
+        worker = TieredLocMemCache("tiered", {"OPTIONS": {"LOCAL_MAXSIZE": 0, "LOCAL_KEY_FAMILIES": ["hot"]}})
+        self.worker1.set("hot:1", 1)
+
+        # When
+        worker.get("hot:1")
+        worker.get("hot:1")
+
+        # Then
+        self.assertEqual(self.metrics.cache_keys, {("hot", "shared"): [2, 0]})
+
+
+class TestInsertRows(TestCase):
+    def test_insert_rows(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        date = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        fields = ["user", "subject", "message", "search_text", "created_date", "updated_date"]
+        rows = [(user.pk, f"Subject {i}", "Message", "", date, date) for i in range(5)]
+
+        # When
+        with CaptureQueriesContext(connections["default"]) as queries:
+            count = insert_rows(Entry, fields, rows)
+
+        # Then - a single multi-row INSERT
+        self.assertEqual(count, 5)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(list(Entry.objects.order_by("id").values_list("subject", flat=True)), [r[1] for r in rows])
+
+        # When - more rows than a statement takes
+        with patch.object(connections["default"].ops, "bulk_batch_size", return_value=2):
+            with CaptureQueriesContext(connections["default"]) as queries:
+                insert_rows(Entry, fields, rows)
+
+        # Then
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(Entry.objects.count(), 10)
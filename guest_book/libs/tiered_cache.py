@@ -0,0 +1,199 @@
+"""
+Two-tier cache: a per-worker in-process LRU in front of the shared cache (Redis).
+
+Reads of the configured key families are answered from the worker's memory for ``LOCAL_TIMEOUT`` seconds, sparing
+the network round trip of the tiny, hot values every request reads (write generations, entry counts). Misses fall
+through to the shared cache and are kept locally.
+
+Writes through any worker drop that worker's copy and increment the shared version key of the key's family. Each
+worker reads the versions at most every ``LOCAL_CHECK_INTERVAL`` seconds and empties the families whose version
+changed, so a value changed by another worker is served stale for at most that long while the other families stay
+cached. Local values are shared by the worker's threads and must not be mutated.
+
+Only keep small values overwritten under a stable key here: a family written on every request would keep emptying
+itself everywhere, and ``LOCAL_MAXSIZE`` bounds each family's entry count, not its size.
+
+Configured through ``OPTIONS`` (the other options go to the shared backend)::
+
+    "OPTIONS": {
+        "LOCAL_MAXSIZE": 1000,  # per family, 0 disables the local tier
+        "LOCAL_TIMEOUT": 5,
+        "LOCAL_CHECK_INTERVAL": 0.1,
+        "LOCAL_KEY_FAMILIES": ["generation", "entry_count"],
+    }
+"""
+
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from libs.lru import LRUCache
+from libs.metrics import InstrumentedLocMemCache, InstrumentedRedisCache
+
+VERSION_KEY = "local_tier:version:{family}"
+
+LOCAL_OPTIONS = {
+    "LOCAL_MAXSIZE": 1000,
+    "LOCAL_TIMEOUT": 5,
+    "LOCAL_CHECK_INTERVAL": 0.1,
+    "LOCAL_KEY_FAMILIES": ("generation", "entry_count"),
+}
+
+_MISSING = object()
+
+
+class LocalTierMixin:
+    """
+    Cache backend mixin adding the in-process tier, place it before the instrumented shared backend's class.
+
+    Reads are counted per tier: a local miss is also counted as a shared hit or miss. Version checks are timed but
+    not counted.
+    """
+
+    def __init__(self, server, params):
+        options = dict(params.get("OPTIONS", {}))
+        local = {name: options.pop(name, default) for name, default in LOCAL_OPTIONS.items()}
+        super().__init__(server, {**params, "OPTIONS": options})
+
+        self.local_timeout = local["LOCAL_TIMEOUT"]
+        self.local_check_interval = local["LOCAL_CHECK_INTERVAL"]
+        self.local_key_families = frozenset(local["LOCAL_KEY_FAMILIES"]) if local["LOCAL_MAXSIZE"] > 0 else frozenset()
+        self._local = {family: LRUCache(max(local["LOCAL_MAXSIZE"], 1)) for family in self.local_key_families}
+        self._local_versions = dict.fromkeys(self.local_key_families)
+        self._local_checked = float("-inf")
+
+    @staticmethod
+    def _family(key):
+        return str(key).split(":", 1)[0]
+
+    def _is_local(self, key):
+        return self._family(key) in self.local_key_families
+
+    def _check_version(self):
+        now = time.monotonic()
+        if now - self._local_checked < self.local_check_interval:
+            return
+        self._local_checked = now
+        version_keys = {VERSION_KEY.format(family=family): family for family in self.local_key_families}
+        versions = super().get_many(list(version_keys))
+        for version_key, family in version_keys.items():
+            version = versions.get(version_key)
+            if version != self._local_versions[family]:
+                self._local[family].clear()
+                self._local_versions[family] = version
+
+    def _local_get(self, key, version):
+        self._check_version()
+        local = self._local[self._family(key)]
+        cached = local.get(self.make_key(key, version))
+        if cached is None:
+            return _MISSING
+        value, expires = cached
+        if expires <= time.monotonic():
+            local.delete(self.make_key(key, version))
+            return _MISSING
+        return value
+
+    def _local_set(self, key, value, version):
+        self._local[self._family(key)].set(self.make_key(key, version), (value, time.monotonic() + self.local_timeout))
+
+    def _invalidate(self, keys, version=None):
+        """Drops the local copies of ``keys`` and makes the other workers drop their copies of the keys' families."""
+        families = set()
+        for key in filter(self._is_local, keys):
+            family = self._family(key)
+            self._local[family].delete(self.make_key(key, version))
+            families.add(family)
+        for family in families:
+            try:
+                super().incr(VERSION_KEY.format(family=family))
+            except ValueError:
+                super().add(VERSION_KEY.format(family=family), 1, timeout=None)
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return super().get(key, default, version)
+        value, local_hit = self._measure(self._tiered_get, key, version)
+        self._count([key], lambda key: local_hit, tier="local")
+        if not local_hit:
+            self._count([key], lambda key: value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def _tiered_get(self, key, version):
+        value = self._local_get(key, version)
+        if value is not _MISSING:
+            return value, True
+        value = super().get(key, _MISSING, version)
+        if value is not _MISSING:
+            self._local_set(key, value, version)
+        return value, False
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not any(self._is_local(key) for key in keys):
+            return super().get_many(keys, version)
+        values, remote = self._measure(self._tiered_get_many, keys, version)
+        self._count(filter(self._is_local, keys), lambda key: key not in remote, tier="local")
+        self._count(remote, lambda key: key in values)
+        return values
+
+    def _tiered_get_many(self, keys, version):
+        values = {}
+        for key in filter(self._is_local, keys):
+            value = self._local_get(key, version)
+            if value is not _MISSING:
+                values[key] = value
+
+        remote = [key for key in keys if key not in values]
+        if remote:
+            fetched = super().get_many(remote, version)
+            for key, value in fetched.items():
+                if self._is_local(key):
+                    self._local_set(key, value, version)
+            values.update(fetched)
+        return values, remote
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set(key, value, timeout, version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        added = super().add(key, value, timeout, version, **kwargs)
+        if added:
+            self._invalidate([key], version)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        value = super().incr(key, delta, version)
+        self._invalidate([key], version)
+        return value
+
+    def delete(self, key, version=None):
+        deleted = super().delete(key, version)
+        self._invalidate([key], version)
+        return deleted
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = super().set_many(data, timeout, version)
+        self._invalidate(list(data), version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        super().delete_many(keys, version)
+        self._invalidate(keys, version)
+
+    def clear(self):
+        # Removes the version keys too, the other workers see them change.
+        super().clear()
+        for local in self._local.values():
+            local.clear()
+
+
+class TieredRedisCache(LocalTierMixin, InstrumentedRedisCache):
+    pass
+
+
+class TieredLocMemCache(LocalTierMixin, InstrumentedLocMemCache):
+    pass
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = "Repair drift between the stored user entry summary and the entries table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Number of users checked per query")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch"]
+        bounds = User.objects.aggregate(first=Min("pk"), last=Max("pk"))
+        if bounds["first"] is None:
+            self.stdout.write(self.style.SUCCESS("No users to reconcile."))
+            return
+
+        checked = repaired = 0
+        for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+            rows = (
+                User.objects.filter(pk__gte=start, pk__lt=start + batch_size)
+                .with_live_entry_summary()
+                .values_list("pk", "total_entries", "last_entry", "live_total_entries", "live_last_entry")
+            )
+            drifted = [pk for pk, *stored_and_live in rows if stored_and_live[:2] != stored_and_live[2:]]
+            if drifted:
+                # Recomputed in the UPDATE itself, so entries written since the check are not lost.
+                repaired += User.objects.filter(pk__in=drifted).refresh_entry_summary()
+            checked += len(rows)
+
+        self.stdout.write(self.style.SUCCESS(f"{checked} users checked, {repaired} repaired."))
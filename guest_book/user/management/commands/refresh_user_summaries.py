@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from user.summary import refresh_touched_summaries
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the stored entry summary of the users whose entries were created or edited since the last run "
+        "(USER_SUMMARY_MODE=incremental)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="Number of users refreshed per UPDATE")
+        parser.add_argument(
+            "--interval",
+            type=int,
+            default=settings.USER_SUMMARY_REFRESH_INTERVAL,
+            help="Seconds between two refreshes",
+        )
+        parser.add_argument("--once", action="store_true", help="Refresh once and exit")
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed, watermark = refresh_touched_summaries(batch_size=options["batch"])
+            if options["once"]:
+                break
+            if refreshed:
+                self.stdout.write(f"{refreshed} users refreshed, entries up to {watermark.isoformat()}.")
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS(f"{refreshed} users refreshed, entries up to {watermark.isoformat()}."))
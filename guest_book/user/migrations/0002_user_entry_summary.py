@@ -0,0 +1,51 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:40
+
+from django.db import migrations, models
+from django.db.models import CharField, Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Concat
+
+
+def backfill_entry_summary(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    Entry = apps.get_model("entry", "Entry")
+
+    entries = Entry.objects.filter(user_id=OuterRef("pk"))
+    User.objects.update(
+        total_entries=Coalesce(
+            Subquery(entries.order_by().values("user_id").annotate(total=Count("id")).values("total")), 0
+        ),
+        last_entry=Subquery(
+            entries.order_by("-created_date", "-id")
+            .annotate(subject_message=Concat("subject", Value(" | "), "message", output_field=CharField()))
+            .values("subject_message")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0001_initial"),
+        ("entry", "0003_entry_idx_entry_date_id_desc"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="last_entry",
+            field=models.TextField(
+                blank=True,
+                help_text="Subject and message of the latest entry, maintained on entry write",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="total_entries",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Number of entries of the guest, maintained on entry write",
+            ),
+        ),
+        migrations.RunPython(backfill_entry_summary, migrations.RunPython.noop),
+    ]
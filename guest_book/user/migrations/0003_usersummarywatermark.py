@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0002_user_entry_summary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserSummaryWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "refreshed_until",
+                    models.DateTimeField(help_text="Null until the first refresh", null=True),
+                ),
+            ],
+            options={
+                "db_table": "user_summary_watermark",
+            },
+        ),
+    ]
@@ -1,28 +1,136 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.db.models import QuerySet, Value, CharField, OuterRef, Count, Subquery
-from django.db.models.functions import Concat
+from django.db.models.functions import Coalesce, Concat, Left
 
 from entry.models import Entry
+from libs.cache import get_generation
+from libs.lru import LRUCache
 from libs.models.abstract import TimestampedModel
 
+# Per-process normalized name -> (user id, "user_names" generation) map, so returning guests are resolved without a
+# query. The generation is bumped when a user is deleted or edited (see user.signals), which drops the ids cached
+# by every process.
+user_id_cache = LRUCache(maxsize=settings.USER_ID_CACHE_SIZE)
+
+
+def cached_user_id(name, generation):
+    """Returns the id cached for ``name`` under the current ``generation`` of "user_names", or None."""
+    cached = user_id_cache.get(name)
+    if cached is None or cached[1] != generation:
+        return None
+    return cached[0]
+
+
+def entry_summary(subject, message):
+    """Returns ``"subject | message"``, cut to ``USER_LAST_ENTRY_PREVIEW_LENGTH`` characters when it is above 0."""
+    summary = f"{subject} | {message}"
+    length = settings.USER_LAST_ENTRY_PREVIEW_LENGTH
+    return summary[:length] if length > 0 else summary
+
+
+def entry_summary_expression():
+    """Database counterpart of ``entry_summary`` over the ``subject`` and ``message`` columns."""
+    length = settings.USER_LAST_ENTRY_PREVIEW_LENGTH
+    if length <= 0:
+        return Concat("subject", Value(" | "), "message", output_field=CharField())
+    # The message is cut before the concatenation, so a long one is never copied whole.
+    return Left(Concat("subject", Value(" | "), Left("message", length), output_field=CharField()), length)
+
+
+def latest_entry_summary():
+    """Subquery selecting the ``entry_summary`` of the outer user's most recent entry."""
+    return Subquery(
+        Entry.objects.filter(user_id=OuterRef("pk"))
+        .order_by("-created_date", "-id")
+        .annotate(subject_message=entry_summary_expression())
+        .values("subject_message")[:1]
+    )
+
+
+def entry_count():
+    """Subquery counting the outer user's entries."""
+    return Subquery(
+        Entry.objects.filter(user_id=OuterRef("pk"))
+        .order_by()
+        .values("user_id")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
 
 class UserQuerySet(QuerySet):
     def with_entry_summary(self):
-        """Annotates users with their total entry count and the last entry's subject and message."""
-        latest_entry_subquery = (
-            Entry.objects.filter(user_id=OuterRef("pk"))
-            .order_by("-created_date")
-            .annotate(subject_message=Concat("subject", Value(" | "), "message", output_field=CharField()))
-            .values("subject_message")[:1]
+        """Selects users with their stored entry count and last entry, no aggregation over entries is done."""
+        return self.only("name", "total_entries", "last_entry")
+
+    def with_live_entry_summary(self):
+        """Annotates users with their entry count and last entry computed from the entries table."""
+        return self.annotate(live_total_entries=Coalesce(entry_count(), 0), live_last_entry=latest_entry_summary())
+
+    def refresh_entry_summary(self):
+        """Recomputes the stored entry summary of the selected users in a single UPDATE."""
+        return self.update(total_entries=Coalesce(entry_count(), 0), last_entry=latest_entry_summary())
+
+    def upsert_names(self, names):
+        """
+        Creates the missing users among ``names`` and returns a ``{name: id}`` mapping for all of them.
+
+        Runs as a single ``INSERT ... ON CONFLICT (name) DO UPDATE ... RETURNING id`` statement where supported.
+        """
+        users = self.bulk_create(
+            # Sorted so concurrent batches lock the same users in the same order.
+            [self.model(name=name) for name in sorted(set(names))],
+            update_conflicts=True,
+            unique_fields=["name"],
+            update_fields=["name"],
         )
+        if any(user.pk is None for user in users):
+            # Backends that can't return rows from an upsert need a second query for the ids.
+            return dict(self.filter(name__in=[user.name for user in users]).values_list("name", "pk"))
+        return {user.name: user.pk for user in users}
+
+    def resolve_id(self, name):
+        """
+        Returns the id of the user named ``name``, creating the user when missing.
 
-        return self.annotate(total_entries=Count("entries"), last_entry=Subquery(latest_entry_subquery))
+        Unlike ``get_or_create`` this can't fail on the unique constraint when the same name is submitted
+        concurrently, and ids already resolved by this process are served from ``user_id_cache``.
+        """
+        # Read before the query, so an id resolved while its user is being deleted is cached as already stale.
+        generation = get_generation("user_names")
+        user_id = cached_user_id(name, generation)
+        if user_id is None:
+            user_id = self.upsert_names([name])[name]
+            # Cached only once committed, a rolled back user must not be handed out to later requests.
+            transaction.on_commit(lambda: user_id_cache.set(name, (user_id, generation)), using=self.db)
+        return user_id
+
+    def find_id(self, name):
+        """Returns the id of the user named ``name``, or None when there is none, without creating it."""
+        generation = get_generation("user_names")
+        user_id = cached_user_id(name, generation)
+        if user_id is None:
+            user_id = self.filter(name=name).values_list("pk", flat=True).first()
+            if user_id is not None:
+                user_id_cache.set(name, (user_id, generation))
+        return user_id
+
+    def refresh_last_entry(self):
+        """Recomputes only the stored last entry, e.g. after an entry was edited."""
+        return self.update(last_entry=latest_entry_summary())
 
 
 class User(TimestampedModel):
     name = models.CharField(
         max_length=255, unique=True, help_text="Unique name of the guest"  # unique true already indexed from django
     )
+    total_entries = models.PositiveIntegerField(
+        default=0, help_text="Number of entries of the guest, maintained on entry write"
+    )
+    last_entry = models.TextField(
+        null=True, blank=True, help_text="Subject and message of the latest entry, maintained on entry write"
+    )
 
     objects = UserQuerySet.as_manager()
 
@@ -31,3 +139,15 @@ class User(TimestampedModel):
 
     def __str__(self):
         return f"{self.name}"
+
+
+class UserSummaryWatermark(models.Model):
+    """
+    Single row recording up to which ``Entry.updated_date`` the stored user summaries are up to date, when they are
+    refreshed incrementally (``USER_SUMMARY_MODE=incremental``, see ``user.summary``).
+    """
+
+    refreshed_until = models.DateTimeField(null=True, help_text="Null until the first refresh")
+
+    class Meta:
+        db_table = "user_summary_watermark"
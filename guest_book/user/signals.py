@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from libs.cache import bump_generation_on_commit
+from user.models import User, user_id_cache
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, raw=False, **kwargs):
+    if not raw:
+        bump_generation_on_commit("user")
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_ids(sender, instance, created=False, raw=False, **kwargs):
+    # A deleted or renamed user's name no longer points to its id, in this process nor in the others.
+    if not raw and not created:
+        user_id_cache.delete(instance.name)
+        bump_generation_on_commit("user_names")
@@ -0,0 +1,72 @@
+"""
+Incremental refresh of the stored user entry summaries.
+
+By default ``entry.signals`` updates ``User.total_entries`` and ``User.last_entry`` in the transaction of every
+entry write. With ``USER_SUMMARY_MODE=incremental`` entry creations and edits leave them alone, and the
+``refresh_user_summaries`` command periodically recomputes the summaries of the users whose entries were created or
+edited since the previous run, found by ``Entry.updated_date`` from a watermark. Deleted entries are still accounted
+for at once, by recounting their user's entries (which also counts the creations not refreshed yet).
+
+``Entry.updated_date`` is taken when the row is written, not when it commits, so a transaction open for a while
+commits rows already behind the watermark. Entries updated within the last ``USER_SUMMARY_REFRESH_LAG`` seconds are
+left for the next run, and each run also re-scans the ``USER_SUMMARY_REFRESH_OVERLAP`` seconds before the watermark,
+only rewriting the summaries found to differ. ``reconcile_user_summary`` repairs anything a transaction open longer
+than both would still slip past.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from entry.models import Entry
+from libs.cache import bump_generation_on_commit
+from user.models import User, UserSummaryWatermark
+
+
+def is_incremental():
+    return settings.USER_SUMMARY_MODE == "incremental"
+
+
+def refresh_touched_summaries(batch_size=1000):
+    """
+    Recomputes the summaries of the users with entries updated since the watermark, less the overlap, and moves it
+    forward.
+
+    Returns ``(refreshed, watermark)``, ``refreshed`` counting the summaries that changed. The first run checks every
+    user with entries.
+    """
+    until = timezone.now() - timedelta(seconds=settings.USER_SUMMARY_REFRESH_LAG)
+    UserSummaryWatermark.objects.get_or_create(pk=1)
+
+    with transaction.atomic():
+        # Also keeps concurrent runs from refreshing the same range.
+        watermark = UserSummaryWatermark.objects.select_for_update().get(pk=1)
+        if watermark.refreshed_until is not None and watermark.refreshed_until >= until:
+            return 0, watermark.refreshed_until
+
+        entries = Entry.objects.filter(updated_date__lte=until)
+        if watermark.refreshed_until is not None:
+            overlap = timedelta(seconds=settings.USER_SUMMARY_REFRESH_OVERLAP)
+            entries = entries.filter(updated_date__gt=watermark.refreshed_until - overlap)
+        user_ids = sorted(set(entries.order_by().values_list("user_id", flat=True).distinct()))
+
+        refreshed = 0
+        for start in range(0, len(user_ids), batch_size):
+            rows = (
+                User.objects.filter(pk__in=user_ids[start : start + batch_size])
+                .with_live_entry_summary()
+                .values_list("pk", "total_entries", "last_entry", "live_total_entries", "live_last_entry")
+            )
+            # Users re-scanned for the overlap mostly have their summary already, they are neither rewritten nor
+            # counted, so the users page isn't invalidated on every run.
+            changed = [pk for pk, *stored_and_live in rows if stored_and_live[:2] != stored_and_live[2:]]
+            if changed:
+                refreshed += User.objects.filter(pk__in=changed).refresh_entry_summary()
+        if refreshed:
+            bump_generation_on_commit("user")
+
+        watermark.refreshed_until = until
+        watermark.save(update_fields=["refreshed_until"])
+    return refreshed, until
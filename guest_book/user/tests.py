@@ -1,11 +1,23 @@
-from django.test import TestCase
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, override_settings
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from api.v1.user.serializers import UserSerializer
 from entry.models import Entry
-from user.models import User
+from libs.cache import LOCK_KEY, bump_generation, generation_key
+from user.models import User, UserSummaryWatermark, user_id_cache
+from user.summary import refresh_touched_summaries
 
 
 class TestUserAPI(TestCase):
@@ -13,6 +25,7 @@ class TestUserAPI(TestCase):
     def setUp(self):
         self.client = APIClient()
         cache.clear()
+        user_id_cache.clear()
 
     def test_get_users_empty_list(self):
         # When
@@ -125,6 +138,68 @@ class TestUserAPI(TestCase):
         self.assertEqual(response2.status_code, status.HTTP_200_OK)
         self.assertEqual(response1.json(), response2.json())
 
+    def test_get_users_cache_invalidated_on_new_entry(self):
+        # Given
+        User.objects.create(name="Test User")
+        response = self.client.get(reverse("api:v1:user:list-users"))
+        self.assertEqual(response.json()["users"][0]["total_entries"], 0)
+
+        # When
+        payload = {"name": "Test User", "subject": "Test Subject", "message": "Test Message"}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("api:v1:entry:entry-list-create"), data=payload, format="json")
+        response = self.client.get(reverse("api:v1:user:list-users"))
+
+        # Then
+        user_data = response.json()["users"][0]
+        self.assertEqual(user_data["total_entries"], 1)
+        self.assertEqual(user_data["last_entry"], "Test Subject | Test Message")
+
+    def test_get_users_stale_while_refreshing(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        url = reverse("api:v1:user:list-users")
+        self.client.get(url)
+        Entry.objects.create(user=user, subject="Test Subject", message="Test Message")
+        bump_generation("entry")
+
+        # When - another worker holds the refresh lock of the new generation
+        cache.add(LOCK_KEY.format(key=f"users:http://testserver{url}"), "other", timeout=30)
+        with self.assertNumQueries(0):
+            stale = self.client.get(url)
+        cache.clear()
+        fresh = self.client.get(url)
+
+        # Then - the previous list is served meanwhile, not to be kept by clients
+        self.assertEqual(stale.json()["users"][0]["total_entries"], 0)
+        self.assertIn("no-store", stale["Cache-Control"])
+        self.assertEqual(fresh.json()["users"][0]["total_entries"], 1)
+        self.assertFalse(fresh.has_header("Cache-Control"))
+
+    def test_get_users_stale_not_revalidated(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        url = reverse("api:v1:user:list-users")
+        etag = self.client.get(url)["ETag"]
+        Entry.objects.create(user=user, subject="Test Subject", message="Test Message")
+        bump_generation("entry")
+
+        # When - the previous list is served while another worker refreshes it, then the refresh lands
+        lock_key = LOCK_KEY.format(key=f"users:http://testserver{url}")
+        cache.add(lock_key, "other", timeout=30)
+        stale = self.client.get(url, headers={"If-None-Match": etag})
+        cache.delete(lock_key)
+        fresh = self.client.get(url, headers={"If-None-Match": etag})
+        revalidated = self.client.get(url, headers={"If-None-Match": fresh["ETag"]})
+
+        # Then - the outdated body carries no validators a client could confirm it with later
+        self.assertEqual(stale.status_code, 200)
+        self.assertFalse(stale.has_header("ETag"))
+        self.assertFalse(stale.has_header("Last-Modified"))
+        self.assertEqual(fresh.json()["users"][0]["total_entries"], 1)
+        self.assertNotEqual(fresh["ETag"], etag)
+        self.assertEqual(revalidated.status_code, 304)
+
     def test_get_users_response_structure(self):
         # Given
         user = User.objects.create(name="John Doe")
@@ -205,8 +280,187 @@ class TestUserAPI(TestCase):
         self.assertEqual(active_user["last_entry"], "Entry 3 | Message 3")
         self.assertEqual(inactive_user["last_entry"], "Single Entry | Single Message")
 
+    @override_settings(USER_STREAM_CHUNK_SIZE=2)
+    def test_get_users_stream(self):
+        # Given
+        for i in range(5):
+            user = User.objects.create(name=f"User {i}")
+            Entry.objects.create(user=user, subject=f"Subject {i}", message=f"Message {i}")
+        expected = self.client.get(reverse("api:v1:user:list-users")).content
+
+        # When
+        response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(b"".join(response.streaming_content), expected)
+
+        # When - Second stream is replayed from the cache
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+            content = b"".join(response.streaming_content)
+
+        # Then
+        self.assertEqual(content, expected)
+
+    @override_settings(USER_STREAM_CHUNK_SIZE=2)
+    def test_get_users_stream_recovers_evicted_chunk(self):
+        # Given
+        for i in range(5):
+            User.objects.create(name=f"User {i}")
+        response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+        expected = b"".join(response.streaming_content)
+        cache.delete(f"{generation_key('users:stream', 'user', 'entry')}:1")
+
+        # When
+        with self.assertNumQueries(1):
+            response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+            content = b"".join(response.streaming_content)
+
+        # Then
+        self.assertEqual(content, expected)
+
+        # When - The re-rendered chunk is cached again
+        with self.assertNumQueries(0):
+            response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+            content = b"".join(response.streaming_content)
+
+        # Then
+        self.assertEqual(content, expected)
+
+    def test_get_users_stream_empty_list(self):
+        # When
+        response = self.client.get(f"{reverse('api:v1:user:list-users')}?stream=true")
+
+        # Then
+        self.assertEqual(b"".join(response.streaming_content), b'{"users":[]}')
+
+    def test_get_users_conditional_get(self):
+        # Given
+        url = reverse("api:v1:user:list-users")
+        with patch("libs.cache.time.time", return_value=1_700_000_000.5):
+            bump_generation("user")
+            bump_generation("entry")
+        response = self.client.get(url)
+        self.assertEqual(response["Last-Modified"], "Tue, 14 Nov 2023 22:13:20 GMT")
+
+        # When & Then
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, status.HTTP_304_NOT_MODIFIED
+            )
+            self.assertEqual(
+                self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code,
+                status.HTTP_304_NOT_MODIFIED,
+            )
+
+        # When & Then - Bumped within the current second, Last-Modified is withheld
+        bump_generation("entry")
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header("Last-Modified"))
+
+    async def test_get_users_async_matches_sync_view(self):
+        # Given
+        user = await User.objects.acreate(name="John Doe")
+        await Entry.objects.acreate(user=user, subject="Test Subject", message="Test Message")
+        await User.objects.acreate(name="Jane Smith")
+
+        # When
+        response = await AsyncClient().get(reverse("api:v1:user:list-users-async"))
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = await sync_to_async(self.client.get)(reverse("api:v1:user:list-users"))
+        self.assertEqual(response.content, expected.content)
+
+
+class TestUserEntryAPI(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        user_id_cache.clear()
+        self.user = User.objects.create(name="Ilık Irmak")
+        other = User.objects.create(name="Jane Smith")
+        for day in range(1, 6):
+            Entry.objects.create(user=self.user, subject=f"Day {day}", message="Message")
+            Entry.objects.create(user=other, subject=f"Other {day}", message="Message")
+        for day, entry in enumerate(Entry.objects.filter(user=self.user).order_by("id"), start=1):
+            Entry.objects.filter(pk=entry.pk).update(created_date=datetime(2026, 1, day, tzinfo=timezone.utc))
+
+    def url(self, name="Ilık Irmak"):
+        return reverse("api:v1:user:list-user-entries", kwargs={"name": name})
+
+    def test_list_user_entries(self):
+        # When
+        data = self.client.get(self.url("ılık ırmak")).json()
+        subjects = [entry["subject"] for entry in data["entries"]]
+        while data["links"]["next"]:
+            data = self.client.get(data["links"]["next"]).json()
+            subjects += [entry["subject"] for entry in data["entries"]]
+
+        # Then
+        self.assertEqual(subjects, ["Day 5", "Day 4", "Day 3", "Day 2", "Day 1"])
+
+    def test_list_user_entries_since_until(self):
+        # When
+        response = self.client.get(self.url(), {"since": "2026-01-02", "until": "2026-01-04T00:00:00Z"})
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([entry["subject"] for entry in response.json()["entries"]], ["Day 3", "Day 2"])
+
+    def test_list_user_entries_validation_errors(self):
+        # When & Then - Unknown user
+        response = self.client.get(self.url("Nobody"))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # When & Then - Invalid bounds
+        response = self.client.get(self.url(), {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url(), {"since": "2026-01-04", "until": "2026-01-02"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_user_entries_after_user_deleted_by_another_process(self):
+        # Given - the id stays in this process' cache, as it does in the processes not running the delete
+        self.client.get(self.url())
+        stale = user_id_cache.get("Ilık Irmak")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        user_id_cache.set("Ilık Irmak", stale)
+
+        # When
+        response = self.client.get(self.url())
+
+        # Then
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_user_entries_uses_user_date_index(self):
+        # Given
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url(), {"since": "2026-01-02"})
+        page_query = next(query["sql"] for query in queries if 'FROM "entry_entry"' in query["sql"])
+
+        # When
+        with connection.cursor() as cursor:
+            cursor.execute(f"{connection.ops.explain_query_prefix()} {page_query}")
+            plan = str(cursor.fetchall())
+
+        # Then - on a partitioned table, through the partitions' copies of the index
+        self.assertRegex(plan, r"idx_entry_user_date_desc|entry_entry_\w+_user_id_created_date_idx")
+
 
 class TestUserModel(TestCase):
+    def test_user_serializer_values_fast_path(self):
+        # Given
+        user = User.objects.create(name="Ilık Irmak")
+        Entry.objects.create(user=user, subject="Çay", message="Simit")
+        User.objects.create(name="John Doe")
+        queryset = User.objects.with_entry_summary().order_by("pk")
+
+        # When & Then
+        self.assertEqual(UserSerializer.serialize_values(queryset), UserSerializer(queryset, many=True).data)
+
     def test_user_with_entry_summary(self):
         # Given
         user = User.objects.create(name="Test User")
@@ -220,3 +474,188 @@ class TestUserModel(TestCase):
         user_with_summary = users_with_summary.first()
         self.assertEqual(user_with_summary.total_entries, 2)
         self.assertEqual(user_with_summary.last_entry, "user last subject | user last message")
+
+    def test_entry_summary_is_maintained_on_write(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        first = Entry.objects.create(user=user, subject="first subject", message="first message")
+        last = Entry.objects.create(user=user, subject="last subject", message="last message")
+
+        # Then
+        user.refresh_from_db()
+        self.assertEqual(user.total_entries, 2)
+        self.assertEqual(user.last_entry, "last subject | last message")
+
+        # When - Latest entry is edited
+        last.message = "edited message"
+        last.save()
+
+        # Then
+        user.refresh_from_db()
+        self.assertEqual(user.last_entry, "last subject | edited message")
+
+        # When - Latest entry is deleted
+        last.delete()
+
+        # Then
+        user.refresh_from_db()
+        self.assertEqual(user.total_entries, 1)
+        self.assertEqual(user.last_entry, "first subject | first message")
+
+        # When - Last remaining entry is deleted
+        first.delete()
+
+        # Then
+        user.refresh_from_db()
+        self.assertEqual(user.total_entries, 0)
+        self.assertIsNone(user.last_entry)
+
+    def test_entry_summary_on_bulk_delete(self):
+        # Given
+        users = [User.objects.create(name=f"User {i}") for i in range(2)]
+        for user in users:
+            for i in range(3):
+                Entry.objects.create(user=user, subject=f"S{i}", message="M")
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            Entry.objects.filter(subject__in=["S1", "S2"]).delete()
+
+        # Then - one UPDATE per owner instead of one per entry
+        self.assertEqual(len([query for query in queries if query["sql"].startswith('UPDATE "user"')]), 2)
+        for user in users:
+            user.refresh_from_db()
+            self.assertEqual(user.total_entries, 1)
+            self.assertEqual(user.last_entry, "S0 | M")
+
+    def test_deleting_user_skips_entry_summary(self):
+        # Given
+        user = User.objects.create(name="Leaving User")
+        Entry.objects.bulk_create([Entry(user=user, subject=f"S{i}", message="M") for i in range(50)])
+
+        # When
+        with CaptureQueriesContext(connection) as queries:
+            user.delete()
+
+        # Then
+        self.assertFalse(any(query["sql"].startswith('UPDATE "user"') for query in queries))
+        self.assertFalse(Entry.objects.exists())
+
+    def test_reconcile_user_summary_command(self):
+        # Given
+        drifted = User.objects.create(name="Drifted User")
+        healthy = User.objects.create(name="Healthy User")
+        Entry.objects.bulk_create(
+            [
+                Entry(user=drifted, subject="bulk subject", message="bulk message"),
+                Entry(user=drifted, subject="bulk subject", message="bulk message"),
+            ]
+        )
+        Entry.objects.create(user=healthy, subject="subject", message="message")
+        out = StringIO()
+
+        # When
+        call_command("reconcile_user_summary", stdout=out)
+
+        # Then
+        drifted.refresh_from_db()
+        self.assertEqual(drifted.total_entries, 2)
+        self.assertEqual(drifted.last_entry, "bulk subject | bulk message")
+        self.assertIn("2 users checked, 1 repaired.", out.getvalue())
+
+    @override_settings(USER_SUMMARY_MODE="incremental", USER_SUMMARY_REFRESH_LAG=0, USER_SUMMARY_REFRESH_OVERLAP=0)
+    def test_refresh_user_summaries_command(self):
+        # Given
+        touched = User.objects.create(name="Touched User")
+        untouched = User.objects.create(name="Untouched User")
+        Entry.objects.create(user=untouched, subject="old subject", message="old message")
+        call_command("refresh_user_summaries", "--once", stdout=StringIO())
+        User.objects.filter(pk=untouched.pk).update(last_entry="left alone")
+
+        # When - entries are written, the summaries don't move until the next refresh
+        Entry.objects.create(user=touched, subject="subject", message="message")
+        touched.refresh_from_db()
+        self.assertEqual(touched.total_entries, 0)
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("refresh_user_summaries", "--once", stdout=out)
+
+        # Then - only the users with entries updated since the watermark are refreshed
+        touched.refresh_from_db()
+        self.assertEqual((touched.total_entries, touched.last_entry), (1, "subject | message"))
+        self.assertEqual(User.objects.get(pk=untouched.pk).last_entry, "left alone")
+        self.assertIn("1 users refreshed", out.getvalue())
+        self.assertIsNotNone(UserSummaryWatermark.objects.get().refreshed_until)
+
+    @override_settings(USER_SUMMARY_MODE="incremental", USER_SUMMARY_REFRESH_LAG=60)
+    def test_refresh_user_summaries_skips_recent_entries(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        Entry.objects.create(user=user, subject="subject", message="message")
+
+        # When
+        refreshed, watermark = refresh_touched_summaries()
+
+        # Then - left for a run after the lag
+        self.assertEqual(refreshed, 0)
+        with patch("user.summary.timezone.now", return_value=watermark + timedelta(seconds=120)):
+            self.assertEqual(refresh_touched_summaries(), (1, watermark + timedelta(seconds=60)))
+        self.assertEqual(User.objects.get(pk=user.pk).total_entries, 1)
+
+    @override_settings(USER_SUMMARY_MODE="incremental", USER_SUMMARY_REFRESH_LAG=5, USER_SUMMARY_REFRESH_OVERLAP=60)
+    def test_refresh_user_summaries_late_commit(self):
+        # Given - a run, then an entry from a transaction that started 30 seconds before it
+        user = User.objects.create(name="Test User")
+        refreshed, watermark = refresh_touched_summaries()
+        entry = Entry.objects.create(user=user, subject="subject", message="message")
+        Entry.objects.filter(pk=entry.pk).update(updated_date=watermark - timedelta(seconds=30))
+
+        # When
+        with patch("user.summary.timezone.now", return_value=watermark + timedelta(seconds=15)):
+            late = refresh_touched_summaries()
+        with patch("user.summary.timezone.now", return_value=watermark + timedelta(seconds=25)):
+            again = refresh_touched_summaries()
+
+        # Then - picked up from the overlap, and left alone once up to date
+        self.assertEqual(late, (1, watermark + timedelta(seconds=10)))
+        self.assertEqual(again, (0, watermark + timedelta(seconds=20)))
+        self.assertEqual(User.objects.get(pk=user.pk).total_entries, 1)
+
+    @override_settings(USER_SUMMARY_MODE="incremental", USER_SUMMARY_REFRESH_LAG=0, USER_SUMMARY_REFRESH_OVERLAP=60)
+    def test_refresh_user_summaries_after_delete(self):
+        # Given - two entries counted by a run long ago, then a new entry and a deletion before the next run
+        user = User.objects.create(name="Test User")
+        old = [Entry.objects.create(user=user, subject=f"old {i}", message="message") for i in range(2)]
+        Entry.objects.filter(user=user).update(updated_date=datetime.now(timezone.utc) - timedelta(hours=1))
+        refresh_touched_summaries()
+        Entry.objects.create(user=user, subject="new", message="message")
+
+        # When
+        old[0].delete()
+        refreshed, _ = refresh_touched_summaries()
+
+        # Then - the deletion recounted the user, new entry included
+        user.refresh_from_db()
+        self.assertEqual((user.total_entries, user.last_entry), (2, "new | message"))
+        self.assertEqual(refreshed, 0)
+
+    @override_settings(USER_LAST_ENTRY_PREVIEW_LENGTH=20)
+    def test_last_entry_preview(self):
+        # Given
+        user = User.objects.create(name="Test User")
+        long_message = "çok uzun mesaj " * 500
+
+        # When & Then - cut the same way when written by the entry signals and recomputed by the database
+        first = Entry.objects.create(user=user, subject="İlk", message=long_message)
+        self.assertEqual(User.objects.get(pk=user.pk).last_entry, "İlk | çok uzun mesaj")
+        Entry.objects.create(user=user, subject="Son", message="kısa")
+        self.assertEqual(User.objects.get(pk=user.pk).last_entry, "Son | kısa")
+        Entry.objects.filter(subject="Son").delete()
+        self.assertEqual(User.objects.get(pk=user.pk).last_entry, "İlk | çok uzun mesaj")
+
+        # When & Then - summaries stored with another length are repaired
+        with override_settings(USER_LAST_ENTRY_PREVIEW_LENGTH=0):
+            User.objects.filter(pk=user.pk).refresh_entry_summary()
+        self.assertEqual(User.objects.get(pk=user.pk).last_entry, f"İlk | {first.message}")
+        call_command("reconcile_user_summary", stdout=StringIO())
+        self.assertEqual(User.objects.get(pk=user.pk).last_entry, "İlk | çok uzun mesaj")